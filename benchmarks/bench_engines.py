@@ -0,0 +1,197 @@
+"""
+benchmark suite for the market data and Black-Litterman engines
+on synthetic data - run from the repository root with
+
+    python -m benchmarks.bench_engines --output results.json
+
+and use --assets/--years/--views to pick the grid (the default
+grid goes up to 5,000 assets over 30 years, which needs several
+GB of memory and a good few minutes)
+"""
+import sys
+import json
+import time
+import platform
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+from black_litterman.constants import MarketData
+from black_litterman.domain.engine import BLEngine, CalculationSettings
+from black_litterman.domain.views import View, ViewAllocation, ViewCollection
+from black_litterman.market_data.data_readers import BaseDataReader
+
+DEFAULT_ASSETS = [10, 100, 1000, 5000]
+DEFAULT_YEARS = [5, 10, 30]
+DEFAULT_VIEWS = [1, 10, 50, 200]
+BUSINESS_DAYS_PER_YEAR = 250
+FIRST_DATE = "1990-01-01"
+
+
+class SyntheticDataReader(BaseDataReader):
+    """
+    serve pre-generated synthetic frames through the
+    usual data reader pipeline
+    """
+
+    def __init__(self,
+                 price_data: pd.DataFrame,
+                 market_cap_data: pd.DataFrame):
+
+        self._data = {MarketData.PRICE_DATA: price_data, MarketData.MARKET_CAP_DATA: market_cap_data}
+
+    def _read_raw_data(self,
+                       start_date: str,
+                       end_date: str) -> Dict[str, pd.DataFrame]:
+
+        return dict(self._data)
+
+    def _validate_data(self, raw_data: Dict[str, pd.DataFrame]) -> None:
+
+        pass
+
+    def _get_formatted_data(self, raw_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+
+        return raw_data
+
+
+def get_synthetic_market_data(n_assets: int,
+                              n_years: int,
+                              seed: int = 0) -> Dict[str, pd.DataFrame]:
+    """
+    simulate prices from a three factor model so the covariance
+    is realistic and well defined, with market caps proportional
+    to price
+    """
+
+    random_state = np.random.RandomState(seed)
+    n_dates = n_years * BUSINESS_DAYS_PER_YEAR
+    dates = pd.bdate_range(start=FIRST_DATE, periods=n_dates)
+    assets = [f"asset_{i}" for i in range(n_assets)]
+
+    loadings = random_state.normal(0, 1, (n_assets, 3))
+    factor_returns = random_state.normal(0, 0.005, (n_dates, 3))
+    specific_returns = random_state.normal(0, 0.01, (n_dates, n_assets))
+    returns = factor_returns.dot(loadings.T) + specific_returns
+
+    price_data = pd.DataFrame(100 * np.exp(np.cumsum(returns, axis=0)), index=dates, columns=assets)
+    shares = random_state.lognormal(10, 1, n_assets)
+    market_cap_data = price_data * shares
+    return {MarketData.PRICE_DATA: price_data, MarketData.MARKET_CAP_DATA: market_cap_data}
+
+
+def get_synthetic_views(assets: List[str],
+                        n_views: int,
+                        seed: int = 0) -> ViewCollection:
+    """
+    build a mix of absolute and relative views
+    on randomly chosen assets
+    """
+
+    random_state = np.random.RandomState(seed)
+    view_collection = ViewCollection()
+    for i in range(n_views):
+        long_asset, short_asset = random_state.choice(assets, 2, replace=False)
+        if i % 2 == 0 or len(assets) < 2:
+            short_asset = None
+        view_collection.add_view(View(f"view_{i}", f"view_{i}", random_state.uniform(-0.05, 0.05),
+                                      random_state.uniform(0.1, 0.9), ViewAllocation(long_asset, short_asset)))
+
+    return view_collection
+
+
+def time_call(function: Callable[[], Any],
+              repeats: int) -> Dict[str, float]:
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    return {"min_s": min(timings), "median_s": float(np.median(timings)), "repeats": repeats}
+
+
+def run_benchmarks(asset_counts: List[int],
+                   year_counts: List[int],
+                   view_counts: List[int],
+                   repeats: int) -> List[Dict[str, Any]]:
+
+    results = []
+    for n_assets in asset_counts:
+        for n_years in year_counts:
+            market_data = get_synthetic_market_data(n_assets, n_years)
+            price_data = market_data[MarketData.PRICE_DATA]
+            assets = list(price_data.columns)
+            start_date = price_data.index[0].strftime("%Y-%m-%d")
+            end_date = price_data.index[-1].strftime("%Y-%m-%d")
+            window_start = price_data.index[-5 * BUSINESS_DAYS_PER_YEAR // 2].strftime("%Y-%m-%d")
+
+            data_reader = SyntheticDataReader(price_data, market_data[MarketData.MARKET_CAP_DATA])
+            calc_settings = CalculationSettings(0.05, 3, start_date, end_date, {asset: asset for asset in assets},
+                                                cov_cache_size=0)
+            bl_engine = BLEngine(data_reader, calc_settings)
+            market_data_engine = bl_engine._market_data_engine
+            market_weights = market_data_engine.get_market_weights(end_date)
+            market_cov = market_data_engine.get_annualised_cov_matrix(window_start, end_date)
+
+            timings = {
+                "get_market_data_engine": lambda: data_reader.get_market_data_engine(start_date, end_date,
+                                                                                     cov_cache_size=0),
+                "get_annualised_cov_matrix": lambda: market_data_engine.get_annualised_cov_matrix(window_start,
+                                                                                                  end_date),
+                "get_market_weights": lambda: market_data_engine.get_market_weights(end_date),
+            }
+            for benchmark, function in timings.items():
+                results.append(dict(benchmark=benchmark, n_assets=n_assets, n_years=n_years, n_views=0,
+                                    **time_call(function, repeats)))
+
+            for n_views in view_counts:
+                view_collection = get_synthetic_views(assets, n_views)
+                timings = {
+                    "get_view_covariances_from_confidences":
+                        lambda: bl_engine.get_view_covariances_from_confidences(market_weights, market_cov,
+                                                                                view_collection),
+                    "get_black_litterman_weights":
+                        lambda: bl_engine.get_black_litterman_weights(view_collection, window_start, end_date),
+                }
+                for benchmark, function in timings.items():
+                    results.append(dict(benchmark=benchmark, n_assets=n_assets, n_years=n_years, n_views=n_views,
+                                        **time_call(function, repeats)))
+
+            print(f"finished {n_assets} assets over {n_years} years", file=sys.stderr)
+
+    return results
+
+
+def get_metadata() -> Dict[str, str]:
+
+    return {"timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__}
+
+
+def main(args: List[str] = None) -> None:
+
+    parser = argparse.ArgumentParser(description="Benchmark the market data and Black-Litterman engines")
+    parser.add_argument("--assets", type=int, nargs="+", default=DEFAULT_ASSETS)
+    parser.add_argument("--years", type=int, nargs="+", default=DEFAULT_YEARS)
+    parser.add_argument("--views", type=int, nargs="+", default=DEFAULT_VIEWS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="file to write the JSON results to (default stdout)")
+    parsed_args = parser.parse_args(args)
+
+    results = run_benchmarks(parsed_args.assets, parsed_args.years, parsed_args.views, parsed_args.repeats)
+    report = json.dumps({"metadata": get_metadata(), "results": results}, indent=2)
+    if parsed_args.output:
+        with open(parsed_args.output, "w") as output_file:
+            output_file.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+benchmark the import time of the engine modules - each import
+is timed in a fresh interpreter, and the heavy or optional
+dependencies it pulls in are listed. Run from the repository
+root with
+
+    python -m benchmarks.bench_imports --output results.json
+"""
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+from typing import Any, Dict, List
+from benchmarks.bench_engines import get_metadata
+
+DEFAULT_MODULES = ["black_litterman.market_data.engine",
+                   "black_litterman.market_data.data_readers",
+                   "black_litterman.domain.engine",
+                   "black_litterman.domain.config_handling"]
+HEAVY_MODULES = ["numpy", "pandas", "scipy", "scipy.optimize", "cardano", "PySide2"]
+
+IMPORT_SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed_s": elapsed, "loaded": [m for m in {heavy_modules!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(module: str,
+                repeats: int) -> Dict[str, Any]:
+
+    script = IMPORT_SCRIPT.format(module=module, heavy_modules=HEAVY_MODULES)
+    timings = []
+    loaded = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", script], stdout=subprocess.PIPE, check=True,
+                                universal_newlines=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result["elapsed_s"])
+        loaded = result["loaded"]
+
+    return {"module": module, "min_s": min(timings), "median_s": float(np.median(timings)),
+            "repeats": repeats, "loaded": loaded}
+
+
+def main(args: List[str] = None) -> None:
+
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the engine modules")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="file to write the JSON results to (default stdout)")
+    parsed_args = parser.parse_args(args)
+
+    results = [time_import(module, parsed_args.repeats) for module in parsed_args.modules]
+    report = json.dumps({"metadata": get_metadata(), "results": results}, indent=2)
+    if parsed_args.output:
+        with open(parsed_args.output, "w") as output_file:
+            output_file.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,14 +6,38 @@ class Configuration:
     MARKET_DATA = "market_data"
     MARKET_DATA_SOURCE = "source"
     MARKET_DATA_FILE_PATH = "file_path"
+    USE_CACHE = "use_cache"
+    PUSHDOWN = "pushdown"
+    SQL_DRIVER = "driver"
+    SQL_CONNECTION_STRING = "connection_string"
+    SQL_TABLE = "table"
+    STORE_PATH = "store_path"
+    STORAGE_DTYPE = "storage_dtype"
+    LAZY_RETURNS = "lazy_returns"
+    VALIDATION_FIX = "validation_fix"
+    STALE_RUN_LENGTH = "stale_run_length"
+    MAX_DAILY_MOVE = "max_daily_move"
     FIRST_DATE = "first_date"
     LAST_DATE = "last_date"
     ASSET_UNIVERSE = "asset_universe"
     CREDENTIALS = "credentials"
+    COV_CACHE_SIZE = "cov_cache_size"
+    PREFIX_SUM_STRIDE = "prefix_sum_stride"
 
     PARAMETERS = "parameters"
     TAU = "tau"
     RISK_AVERSION = "risk_aversion"
+    CALIBRATION_METHOD = "calibration_method"
+    INCREMENTAL_UPDATES = "incremental_updates"
+    CALIBRATION_WORKERS = "calibration_workers"
+    CALIBRATION_EXECUTOR = "calibration_executor"
+    RETURN_TYPE = "return_type"
+    ANNUALISATION_FACTOR = "annualisation_factor"
+    COV_ESTIMATOR = "cov_estimator"
+    EWMA_DECAY = "ewma_decay"
+    N_FACTORS = "n_factors"
+    PSD_PROJECTION = "psd_projection"
+    FREQUENCY = "frequency"
 
 
 class MarketData:
@@ -31,3 +55,74 @@ class Weights:
 
     MARKET = "Market Weights"
     BLACK_LITTERMAN = "Black-Litterman Weights"
+
+
+class CalibrationMethod:
+
+    ANALYTIC = "analytic"
+    ITERATIVE = "iterative"
+
+    @classmethod
+    def get_all_methods(cls) -> List[str]:
+
+        return [cls.ANALYTIC, cls.ITERATIVE]
+
+
+class ExecutorType:
+
+    THREAD = "thread"
+    PROCESS = "process"
+
+    @classmethod
+    def get_all_executor_types(cls) -> List[str]:
+
+        return [cls.THREAD, cls.PROCESS]
+
+
+class CovarianceEstimator:
+
+    SAMPLE = "sample"
+    LEDOIT_WOLF = "ledoit_wolf"
+    OAS = "oas"
+    EWMA = "ewma"
+    FACTOR = "factor"
+
+    @classmethod
+    def get_all_estimators(cls) -> List[str]:
+
+        return [cls.SAMPLE, cls.LEDOIT_WOLF, cls.OAS, cls.EWMA, cls.FACTOR]
+
+
+class Frequency:
+
+    DAILY = "daily"
+    WEEKLY = "weekly"
+    MONTHLY = "monthly"
+
+    @classmethod
+    def get_all_frequencies(cls) -> List[str]:
+
+        return [cls.DAILY, cls.WEEKLY, cls.MONTHLY]
+
+
+class DataFix:
+
+    NONE = "none"
+    FORWARD_FILL = "ffill"
+    DROP = "drop"
+
+    @classmethod
+    def get_all_fixes(cls) -> List[str]:
+
+        return [cls.NONE, cls.FORWARD_FILL, cls.DROP]
+
+
+class ReturnType:
+
+    SIMPLE = "simple"
+    LOG = "log"
+
+    @classmethod
+    def get_all_return_types(cls) -> List[str]:
+
+        return [cls.SIMPLE, cls.LOG]
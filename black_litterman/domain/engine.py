@@ -1,11 +1,16 @@
 import numpy as np
 import pandas as pd
-from scipy import optimize
-from typing import List, Dict, Any, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import repeat
+from typing import Callable, List, Dict, Any, Tuple, Optional
 from dataclasses import dataclass
 from black_litterman.market_data.data_readers import BaseDataReader
+from black_litterman.market_data.covariance import FactorCovariance
 from black_litterman.domain.views import ViewCollection, View
-from black_litterman.constants import Configuration, Weights
+from black_litterman.domain import kernels
+from black_litterman.domain.incremental import IncrementalBLSolver, IncrementalSession
+from black_litterman.constants import Configuration, Weights, CalibrationMethod, ExecutorType, ReturnType, \
+    CovarianceEstimator, Frequency
 
 
 @dataclass(frozen=True)
@@ -15,6 +20,21 @@ class CalculationSettings:
     start_date: str
     calculation_date: str
     asset_universe: Dict[str, str]
+    calibration_method: str = CalibrationMethod.ANALYTIC
+    cov_cache_size: int = 32
+    prefix_sum_stride: Optional[int] = None
+    incremental_updates: bool = False
+    calibration_workers: int = 1
+    calibration_executor: str = ExecutorType.THREAD
+    storage_dtype: str = "float64"
+    lazy_returns: bool = False
+    return_type: str = ReturnType.SIMPLE
+    annualisation_factor: float = 250
+    cov_estimator: str = CovarianceEstimator.SAMPLE
+    ewma_decay: float = 0.94
+    n_factors: int = 5
+    psd_projection: bool = False
+    frequency: str = Frequency.DAILY
 
     @staticmethod
     def parse_from_config(config: Dict[str, Any]) -> "CalculationSettings":
@@ -26,9 +46,45 @@ class CalculationSettings:
                                             config_params[Configuration.RISK_AVERSION],
                                             config_data[Configuration.FIRST_DATE],
                                             config_data[Configuration.LAST_DATE],
-                                            config_data[Configuration.ASSET_UNIVERSE])
+                                            config_data[Configuration.ASSET_UNIVERSE],
+                                            config_params.get(Configuration.CALIBRATION_METHOD,
+                                                              CalibrationMethod.ANALYTIC),
+                                            config_data.get(Configuration.COV_CACHE_SIZE, 32),
+                                            config_data.get(Configuration.PREFIX_SUM_STRIDE),
+                                            config_params.get(Configuration.INCREMENTAL_UPDATES, False),
+                                            config_params.get(Configuration.CALIBRATION_WORKERS, 1),
+                                            config_params.get(Configuration.CALIBRATION_EXECUTOR,
+                                                              ExecutorType.THREAD),
+                                            config_data.get(Configuration.STORAGE_DTYPE, "float64"),
+                                            config_data.get(Configuration.LAZY_RETURNS, False),
+                                            config_params.get(Configuration.RETURN_TYPE, ReturnType.SIMPLE),
+                                            config_params.get(Configuration.ANNUALISATION_FACTOR, 250),
+                                            config_params.get(Configuration.COV_ESTIMATOR,
+                                                              CovarianceEstimator.SAMPLE),
+                                            config_params.get(Configuration.EWMA_DECAY, 0.94),
+                                            config_params.get(Configuration.N_FACTORS, 5),
+                                            config_params.get(Configuration.PSD_PROJECTION, False),
+                                            config_params.get(Configuration.FREQUENCY, Frequency.DAILY))
         return calc_settings
 
+    def get_engine_options(self) -> Dict[str, Any]:
+        """
+        get the options used to build the market
+        data engine
+        """
+
+        return {"cov_cache_size": self.cov_cache_size,
+                "prefix_sum_stride": self.prefix_sum_stride,
+                "dtype": self.storage_dtype,
+                "lazy_returns": self.lazy_returns,
+                "return_type": self.return_type,
+                "annualisation_factor": self.annualisation_factor,
+                "cov_estimator": self.cov_estimator,
+                "ewma_decay": self.ewma_decay,
+                "n_factors": self.n_factors,
+                "psd_projection": self.psd_projection,
+                "frequency": self.frequency}
+
 
 class BLEngine:
 
@@ -36,9 +92,19 @@ class BLEngine:
                  data_reader: BaseDataReader,
                  calc_settings: CalculationSettings):
 
+        if calc_settings.calibration_method not in CalibrationMethod.get_all_methods():
+            raise ValueError(f"Calibration method '{calc_settings.calibration_method}' is not recognised - valid "
+                             f"methods are {', '.join(CalibrationMethod.get_all_methods())}")
+
+        if calc_settings.incremental_updates and calc_settings.cov_estimator == CovarianceEstimator.FACTOR:
+            raise ValueError("Incremental updates need the full market covariance, so can't be used with the "
+                             "factor model covariance estimator")
+
         self._market_data_engine = data_reader.get_market_data_engine(calc_settings.start_date,
-                                                                      calc_settings.calculation_date)
+                                                                      calc_settings.calculation_date,
+                                                                      **calc_settings.get_engine_options())
         self._calc_settings = calc_settings
+        self._incremental_session = None
 
     def get_market_weights(self,
                            end_date: Optional[str] = None) -> pd.Series:
@@ -77,6 +143,18 @@ class BLEngine:
 
         return self._calc_settings.start_date, self._calc_settings.calculation_date
 
+    def refresh_market_data(self,
+                            data_reader: BaseDataReader,
+                            end_date: str) -> None:
+        """
+        append market data up to the end date from the data
+        reader, without rebuilding the market data engine
+        """
+
+        data_reader.refresh_market_data_engine(self._market_data_engine, end_date)
+        # the incremental solver holds the old market data
+        self._incremental_session = None
+
     def get_black_litterman_weights(self,
                                     view_collection: ViewCollection,
                                     start_date: str,
@@ -86,114 +164,475 @@ class BLEngine:
         portfolio optimisation model
         """
 
+        if self._calc_settings.incremental_updates:
+            return self._get_black_litterman_weights_incremental(view_collection, start_date, end_date)
+
+        if self._calc_settings.cov_estimator == CovarianceEstimator.FACTOR:
+            return self._get_black_litterman_weights_factor(view_collection, start_date, end_date)
+
         # get the market data
         market_weights = self._market_data_engine.get_market_weights(end_date)
         market_cov = self._market_data_engine.get_annualised_cov_matrix(start_date, end_date)
 
-        # get the view specific data
-        view_mat = view_collection.get_view_matrix(list(self._calc_settings.asset_universe))
-        view_out_performance = view_collection.get_view_out_performances()
-        view_cov = self.get_view_covariances_from_confidences(market_weights, market_cov, view_collection)
+        bl_weights = self._get_black_litterman_weights_for_market(view_collection, market_weights, market_cov)
+        bl_weights.name = Weights.BLACK_LITTERMAN
+        return bl_weights
+
+    def _get_black_litterman_weights_factor(self,
+                                            view_collection: ViewCollection,
+                                            start_date: str,
+                                            end_date: str) -> pd.Series:
+        """
+        derive Black-Litterman weights through the factor model
+        covariance, so the N x N market covariance is never built
+        """
 
-        # calc BL weights
-        bl_weights = self._get_weights(market_weights, market_cov, view_mat, view_cov, view_out_performance)
+        market_cov = self._market_data_engine.get_annualised_factor_covariance(start_date, end_date)
+        market_weights = self._market_data_engine.get_market_weights(end_date)
+
+        bl_weights = self._get_black_litterman_weights_for_factor_market(view_collection, market_weights, market_cov)
         bl_weights.name = Weights.BLACK_LITTERMAN
         return bl_weights
 
-    def get_view_covariances_from_confidences(self,
-                                              market_weights: pd.Series,
-                                              market_covariance: pd.DataFrame,
-                                              view_collection: ViewCollection) -> pd.DataFrame:
+    def _get_black_litterman_weights_for_factor_market(self,
+                                                       view_collection: ViewCollection,
+                                                       market_weights: pd.Series,
+                                                       market_cov: FactorCovariance) -> pd.Series:
         """
-        build a diagonal covariance matrix from the views
-        based on the confidence in each view
+        derive Black-Litterman weights from the views for the
+        given market weights and factor model covariance
         """
 
-        cov_by_view = dict()
-        all_views = view_collection.get_all_views()
+        assets = market_cov.assets
+        market_weights = market_weights.loc[assets]
+        market_weights_values = market_weights.values.astype(float)
 
-        for view in all_views:
-            var = self._confidence_to_variance(view, market_weights, market_covariance)
-            cov_by_view.update({view.id: var})
+        def _calibrate_views_iteratively(views: List[View]) -> List[float]:
+            return [kernels.get_view_variance_iterative(market_weights_values, market_cov,
+                                                        view.get_view_vector(list(assets)), view.out_performance,
+                                                        view.confidence, self._calc_settings.tau,
+                                                        self._calc_settings.risk_aversion) for view in views]
 
-        var_series = pd.Series(cov_by_view)
-        cov_matrix = pd.DataFrame(np.diag(var_series), index=var_series.index, columns=var_series.index)
-        return cov_matrix
+        return self._get_weights_sparse(view_collection, market_weights, market_cov, _calibrate_views_iteratively)
+
+    def _get_weights_sparse(self,
+                            view_collection: ViewCollection,
+                            market_weights: pd.Series,
+                            market_cov: kernels.Covariance,
+                            calibrate_views: Callable[[List[View]], List[float]]) -> pd.Series:
+        """
+        Black-Litterman calculation with the view matrix in
+        compact form - views touch one or two assets, so the
+        view matrix is never built in full. Views the closed
+        form calibration can't handle are passed to
+        calibrate_views
+        """
 
-    def _get_weights(self,
-                     market_weights: pd.Series,
-                     market_cov: pd.DataFrame,
-                     view_matrix: pd.DataFrame,
-                     view_cov: pd.DataFrame,
-                     view_out_performance: pd.Series) -> pd.Series:
+        all_views = view_collection.get_all_views()
+        if not all_views:
+            return market_weights.copy()
+
+        assets = list(market_weights.index)
+        view_columns, view_weights = view_collection.get_view_columns(assets)
+        confidences = np.array([view.confidence for view in all_views], dtype=float)
+        view_out_performance = np.array([view.out_performance for view in all_views], dtype=float)
+        if self._calc_settings.calibration_method == CalibrationMethod.ANALYTIC:
+            view_variances = kernels.get_view_variances_from_confidences_sparse(market_cov, view_columns,
+                                                                                view_weights, confidences,
+                                                                                self._calc_settings.tau)
+        else:
+            view_variances = np.full(len(all_views), np.nan)
+
+        pending = np.flatnonzero(np.isnan(view_variances))
+        if len(pending):
+            view_variances[pending] = calibrate_views([all_views[i] for i in pending])
+
+        bl_weights = kernels.get_black_litterman_weights_sparse(market_weights.values.astype(float), market_cov,
+                                                                view_columns, view_weights, np.diag(view_variances),
+                                                                view_out_performance, self._calc_settings.tau,
+                                                                self._calc_settings.risk_aversion)
+        return pd.Series(bl_weights, index=market_weights.index)
+
+    def _get_black_litterman_weights_for_market(self,
+                                                view_collection: ViewCollection,
+                                                market_weights: pd.Series,
+                                                market_cov: pd.DataFrame) -> pd.Series:
         """
-        Black-Litterman calculation to derive target weights
+        derive Black-Litterman weights from the views for
+        the given market weights and covariance
         """
 
+        assets = market_weights.index
         try:
-            mat_1 = (view_cov.divide(self._calc_settings.tau) +
-                     view_matrix.dot(market_cov).dot(view_matrix.T))
-        except ValueError:
-            print("matrix not aligned?")
-        mat_1_inv = pd.DataFrame(np.linalg.inv(mat_1.values),
-                                 index=mat_1.index, columns=mat_1.index)
-        mat_2 = (view_out_performance.divide(self._calc_settings.risk_aversion)
-                 - view_matrix.dot(market_cov).dot(market_weights))
-
-        bl_weights = market_weights + view_matrix.T.dot(mat_1_inv).dot(mat_2)
+            market_cov = market_cov.loc[assets, assets]
+        except KeyError as err:
+            raise ValueError(f"Black-Litterman inputs are not aligned: {err}") from err
+
+        def _calibrate_views(views: List[View]) -> List[float]:
+            return self._calibrate_views(views, market_weights, market_cov)
+
+        return self._get_weights_sparse(view_collection, market_weights, market_cov.values.astype(float),
+                                        _calibrate_views)
+
+    def get_rolling_black_litterman_weights(self,
+                                            view_collection: ViewCollection,
+                                            rebalance_dates: List[str],
+                                            window_length: Optional[int] = None,
+                                            start_date: Optional[str] = None,
+                                            n_processes: int = 1) -> pd.DataFrame:
+        """
+        derive walk-forward Black-Litterman weights at each
+        rebalance date, estimating the covariance over the last
+        `window_length` returns or, if no length is given, over an
+        expanding window from the start date (by default the one
+        in the calculation settings). Rebalance dates can be split
+        into contiguous blocks and run across a process pool
+        """
+
+        if window_length is None and start_date is None:
+            start_date = self._calc_settings.start_date
+
+        rebalance_dates = list(rebalance_dates)
+        if n_processes <= 1 or len(rebalance_dates) <= 1:
+            return self._get_rolling_black_litterman_weights(view_collection, rebalance_dates,
+                                                             window_length, start_date)
+
+        block_size = -(-len(rebalance_dates) // n_processes)
+        date_blocks = [rebalance_dates[i:i + block_size] for i in range(0, len(rebalance_dates), block_size)]
+        with ProcessPoolExecutor(n_processes) as executor:
+            weights_by_block = executor.map(_get_rolling_black_litterman_weights, repeat(self),
+                                            repeat(view_collection), date_blocks, repeat(window_length),
+                                            repeat(start_date))
+            return pd.concat(list(weights_by_block))
+
+    def _get_rolling_black_litterman_weights(self,
+                                             view_collection: ViewCollection,
+                                             rebalance_dates: List[str],
+                                             window_length: Optional[int],
+                                             start_date: Optional[str]) -> pd.DataFrame:
+
+        weights_by_date = dict()
+        if self._calc_settings.cov_estimator == CovarianceEstimator.FACTOR:
+            rolling_covariances = self._market_data_engine.get_rolling_factor_covariances(rebalance_dates,
+                                                                                          window_length, start_date)
+            get_weights_for_market = self._get_black_litterman_weights_for_factor_market
+        else:
+            rolling_covariances = self._market_data_engine.get_rolling_cov_matrices(rebalance_dates, window_length,
+                                                                                    start_date)
+            get_weights_for_market = self._get_black_litterman_weights_for_market
+
+        for rebalance_date, market_cov in rolling_covariances:
+            market_weights = self._market_data_engine.get_market_weights(rebalance_date)
+            weights_by_date[pd.Timestamp(rebalance_date)] = get_weights_for_market(view_collection, market_weights,
+                                                                                   market_cov)
+
+        return pd.DataFrame.from_dict(weights_by_date, orient="index")
+
+    def _get_black_litterman_weights_incremental(self,
+                                                 view_collection: ViewCollection,
+                                                 start_date: str,
+                                                 end_date: str) -> pd.Series:
+        """
+        update the Black-Litterman weights from the previous
+        solve for the same window, only re-calibrating and
+        re-solving for the views that have changed
+        """
+
+        session = self._get_incremental_session(start_date, end_date)
+        current_views = {view.id: view for view in view_collection.get_all_views()}
+
+        for view_id in set(session.views) - set(current_views):
+            session.solver.remove_view(view_id)
+            del session.views[view_id]
+
+        for view_id, view in current_views.items():
+            previous_view = session.views.get(view_id)
+            if previous_view == view:
+                continue
+
+            variance = self._get_incremental_view_variance(session, view)
+            if previous_view is None or previous_view.allocation != view.allocation:
+                if previous_view is not None:
+                    session.solver.remove_view(view_id)
+                view_vector = view.get_view_vector(list(session.market_weights.index))
+                session.solver.add_view(view_id, view_vector, view.out_performance, variance)
+            else:
+                if previous_view.confidence != view.confidence:
+                    session.solver.update_view_variance(view_id, variance)
+                if previous_view.out_performance != view.out_performance:
+                    session.solver.update_view_out_performance(view_id, view.out_performance)
+
+            session.views[view_id] = view
+
+        bl_weights = pd.Series(session.solver.get_weights(), index=session.market_weights.index)
+        bl_weights.name = Weights.BLACK_LITTERMAN
         return bl_weights
 
-    def _get_view_target_weights(self,
-                                 view: View,
-                                 market_weights: pd.Series,
-                                 market_covariance: pd.DataFrame,
-                                 view_matrix: pd.DataFrame,
-                                 view_out_performance: pd.Series) -> pd.Series:
+    def _get_incremental_session(self,
+                                 start_date: str,
+                                 end_date: str) -> IncrementalSession:
         """
-        get target weights based on the view allocation and
-        stated confidence in the view
+        get the incremental solver state for the window,
+        starting afresh if the window has changed
         """
 
-        zero_view_cov = pd.DataFrame([0], index=[view.id], columns=[view.id])
-        full_confidence_weights = self._get_weights(market_weights, market_covariance, view_matrix, zero_view_cov,
-                                                    view_out_performance)
-        max_weight_difference = full_confidence_weights - market_weights
-        target_weights = market_weights.add(view.confidence * max_weight_difference)
+        window = (start_date, end_date)
+        if self._incremental_session is None or self._incremental_session.window != window:
+            market_weights = self._market_data_engine.get_market_weights(end_date)
+            assets = market_weights.index
+            market_cov = self._market_data_engine.get_annualised_cov_matrix(start_date, end_date).loc[assets, assets]
+            solver = IncrementalBLSolver(market_weights.values.astype(float), market_cov.values.astype(float),
+                                         self._calc_settings.tau, self._calc_settings.risk_aversion)
+            self._incremental_session = IncrementalSession(window, market_weights, market_cov, solver)
 
-        return target_weights
+        return self._incremental_session
 
-    @staticmethod
-    def _get_sum_squares_error(series_1: pd.Series,
-                               series_2: pd.Series) -> float:
+    def _get_incremental_view_variance(self,
+                                       session: IncrementalSession,
+                                       view: View) -> float:
         """
-        get the sum squared errors between two
-        series
+        calibrate a view's variance, reusing earlier calibrations
+        for the same allocation and confidence
         """
 
-        diff = series_1.subtract(series_2)
-        sum_square = sum([x ** 2 for x in diff])
-        return sum_square
+        calibration_key = (view.allocation, view.confidence)
+        if calibration_key not in session.calibrated_variances:
+            session.calibrated_variances[calibration_key] = self._confidence_to_variance(view,
+                                                                                         session.market_weights,
+                                                                                         session.market_cov)
+
+        return session.calibrated_variances[calibration_key]
+
+    def get_black_litterman_weights_batch(self,
+                                          view_collections: List[ViewCollection],
+                                          start_date: str,
+                                          end_date: str) -> pd.DataFrame:
+        """
+        derive Black-Litterman weights for many sets of views
+        against the same market data in one batched solve,
+        returning one column of weights per view collection.
+        Under the factor model estimator the solve goes through
+        the factor structure rather than the full cov matrix
+        """
+
+        market_weights = self._market_data_engine.get_market_weights(end_date)
+        if self._calc_settings.cov_estimator == CovarianceEstimator.FACTOR:
+            market_cov = self._market_data_engine.get_annualised_factor_covariance(start_date, end_date)
+            market_weights = market_weights.loc[market_cov.assets]
+        else:
+            market_cov = self._market_data_engine.get_annualised_cov_matrix(start_date, end_date)
+            market_cov = market_cov.loc[market_weights.index, market_weights.index].values.astype(float)
+
+        assets = market_weights.index
+        market_weights_values = market_weights.values.astype(float)
+
+        # stack the views into padded arrays - padding views have
+        # infinite variance so the kernel treats them as inert
+        n_scenarios = len(view_collections)
+        max_views = max([len(collection.get_all_views()) for collection in view_collections], default=0)
+        if max_views == 0:
+            return pd.DataFrame({i: market_weights_values for i in range(n_scenarios)}, index=assets)
+
+        view_matrix = np.zeros((n_scenarios, max_views, len(assets)))
+        view_out_performance = np.zeros((n_scenarios, max_views))
+        confidences = np.zeros((n_scenarios, max_views))
+        is_view = np.zeros((n_scenarios, max_views), dtype=bool)
+        for i, collection in enumerate(view_collections):
+            all_views = collection.get_all_views()
+            n_views = len(all_views)
+            if n_views:
+                view_matrix[i, :n_views] = collection.get_view_array(list(assets))
+                view_out_performance[i, :n_views] = [view.out_performance for view in all_views]
+                confidences[i, :n_views] = [view.confidence for view in all_views]
+                is_view[i, :n_views] = True
+
+        view_variances = self._get_view_variances_batch(market_weights_values, market_cov, view_collections,
+                                                        view_matrix, view_out_performance, confidences)
+        view_variances[~is_view] = np.inf
+        view_cov = np.zeros((n_scenarios, max_views, max_views))
+        diagonal = np.arange(max_views)
+        view_cov[:, diagonal, diagonal] = view_variances
+
+        bl_weights = kernels.get_black_litterman_weights(market_weights_values, market_cov, view_matrix,
+                                                         view_cov, view_out_performance,
+                                                         self._calc_settings.tau,
+                                                         self._calc_settings.risk_aversion)
+        return pd.DataFrame(bl_weights.T, index=assets, columns=range(n_scenarios))
+
+    def _get_view_variances_batch(self,
+                                  market_weights: np.ndarray,
+                                  market_cov: kernels.Covariance,
+                                  view_collections: List[ViewCollection],
+                                  view_matrix: np.ndarray,
+                                  view_out_performance: np.ndarray,
+                                  confidences: np.ndarray) -> np.ndarray:
+        """
+        calibrate the variances of all views in a stacked view
+        matrix, falling back to the iterative search for any view
+        the closed form can't handle
+        """
+
+        if self._calc_settings.calibration_method == CalibrationMethod.ANALYTIC:
+            view_variances = kernels.get_view_variances_from_confidences(market_cov, view_matrix, confidences,
+                                                                         self._calc_settings.tau)
+        else:
+            view_variances = np.full(confidences.shape, np.nan)
+
+        for i, collection in enumerate(view_collections):
+            for j in range(len(collection.get_all_views())):
+                if np.isnan(view_variances[i, j]):
+                    view_variances[i, j] = kernels.get_view_variance_iterative(market_weights, market_cov,
+                                                                               view_matrix[i, j],
+                                                                               view_out_performance[i, j],
+                                                                               confidences[i, j],
+                                                                               self._calc_settings.tau,
+                                                                               self._calc_settings.risk_aversion)
+
+        return view_variances
+
+    def get_view_covariances_from_confidences(self,
+                                              market_weights: pd.Series,
+                                              market_covariance: pd.DataFrame,
+                                              view_collection: ViewCollection) -> pd.DataFrame:
+        """
+        build a diagonal covariance matrix from the views
+        based on the confidence in each view
+        """
+
+        all_views = view_collection.get_all_views()
+        variances = self._calibrate_views(all_views, market_weights, market_covariance)
+
+        var_series = pd.Series({view.id: var for view, var in zip(all_views, variances)})
+        cov_matrix = pd.DataFrame(np.diag(var_series), index=var_series.index, columns=var_series.index)
+        return cov_matrix
+
+    def _calibrate_views(self,
+                         views: List[View],
+                         market_weights: pd.Series,
+                         market_covariance: pd.DataFrame) -> List[float]:
+        """
+        calibrate the variance of each view, spreading the
+        work over a thread or process pool if configured
+        """
+
+        n_workers = self._calc_settings.calibration_workers
+        if n_workers <= 1 or len(views) <= 1:
+            return [self._confidence_to_variance(view, market_weights, market_covariance) for view in views]
+
+        executor_type = self._calc_settings.calibration_executor
+        if executor_type == ExecutorType.THREAD:
+            with ThreadPoolExecutor(n_workers) as executor:
+                variances = executor.map(self._confidence_to_variance, views, repeat(market_weights),
+                                         repeat(market_covariance))
+                return list(variances)
+        elif executor_type == ExecutorType.PROCESS:
+            return self._calibrate_views_in_processes(views, market_weights, market_covariance)
+        else:
+            raise ValueError(f"Executor type '{executor_type}' is not recognised - valid types "
+                             f"are {', '.join(ExecutorType.get_all_executor_types())}")
+
+    def _calibrate_views_in_processes(self,
+                                      views: List[View],
+                                      market_weights: pd.Series,
+                                      market_covariance: pd.DataFrame) -> List[float]:
+        """
+        calibrate views in closed form where possible and
+        farm the iterative searches out to a process pool
+        """
+
+        if self._calc_settings.calibration_method == CalibrationMethod.ANALYTIC:
+            variances = [self._confidence_to_variance_analytic(view, market_covariance) for view in views]
+        else:
+            variances = [None] * len(views)
+
+        pending_views = [(i, view) for i, view in enumerate(views) if variances[i] is None]
+        if not pending_views:
+            return variances
+
+        assets = market_weights.index
+        market_weights_values = market_weights.values.astype(float)
+        market_cov_values = market_covariance.loc[assets, assets].values.astype(float)
+        view_vectors = [view.get_view_vector(list(assets)) for _, view in pending_views]
+
+        with ProcessPoolExecutor(self._calc_settings.calibration_workers) as executor:
+            pending_variances = executor.map(kernels.get_view_variance_iterative,
+                                             repeat(market_weights_values),
+                                             repeat(market_cov_values),
+                                             view_vectors,
+                                             [view.out_performance for _, view in pending_views],
+                                             [view.confidence for _, view in pending_views],
+                                             repeat(self._calc_settings.tau),
+                                             repeat(self._calc_settings.risk_aversion))
+            for (i, _), variance in zip(pending_views, pending_variances):
+                variances[i] = variance
+
+        return variances
 
     def _confidence_to_variance(self,
                                 view: View,
                                 market_weights: pd.Series,
-                                market_covariance: pd.DataFrame,):
+                                market_covariance: pd.DataFrame) -> float:
         """
         convert a view confidence level to a variance for
-        that view
+        that view, using the closed form calibration where
+        possible and the iterative search otherwise
+        """
+
+        if self._calc_settings.calibration_method == CalibrationMethod.ANALYTIC:
+            variance = self._confidence_to_variance_analytic(view, market_covariance)
+            if variance is not None:
+                return variance
+
+        return self._confidence_to_variance_iterative(view, market_weights, market_covariance)
+
+    def _confidence_to_variance_analytic(self,
+                                         view: View,
+                                         market_covariance: pd.DataFrame) -> Optional[float]:
+        """
+        closed form version of the Idzorek calibration - returns
+        None if the view has no variance under the market
+        covariance, in which case the iterative search is needed
         """
 
-        view_matrix = view.get_view_data_frame(list(self._calc_settings.asset_universe))
-        view_out_performance = pd.Series([view.out_performance], index=[view.id])
-        target_weights = self._get_view_target_weights(view, market_weights, market_covariance,
-                                                       view_matrix, view_out_performance)
+        view_vector = view.get_view_vector(list(market_covariance.index))[None, :]
+        variance = kernels.get_view_variances_from_confidences(market_covariance.values, view_vector,
+                                                               np.array([view.confidence]),
+                                                               self._calc_settings.tau)[0]
+        if np.isnan(variance):
+            return None
 
-        def _error_vs_target_weights(var) -> float:
-            view_cov = pd.DataFrame(var, index=[view.id], columns=[view.id])
-            weights_for_cov = self._get_weights(market_weights, market_covariance, view_matrix, view_cov,
-                                                view_out_performance)
+        return variance
 
-            return self._get_sum_squares_error(weights_for_cov, target_weights)
+    def _confidence_to_variance_iterative(self,
+                                          view: View,
+                                          market_weights: pd.Series,
+                                          market_covariance: pd.DataFrame) -> float:
+        """
+        convert a view confidence level to a variance for
+        that view by searching for the variance that reproduces
+        the target weights
+        """
 
-        variance = optimize.minimize(_error_vs_target_weights, np.array(0.1), method="BFGS")
-        return variance.x[0]
+        assets = market_weights.index
+        view_vector = view.get_view_vector(list(assets))
+        variance = kernels.get_view_variance_iterative(market_weights.values.astype(float),
+                                                       market_covariance.loc[assets, assets].values,
+                                                       view_vector,
+                                                       view.out_performance,
+                                                       view.confidence,
+                                                       self._calc_settings.tau,
+                                                       self._calc_settings.risk_aversion)
+        return variance
+
+
+def _get_rolling_black_litterman_weights(engine: BLEngine,
+                                         view_collection: ViewCollection,
+                                         rebalance_dates: List[str],
+                                         window_length: Optional[int],
+                                         start_date: Optional[str]) -> pd.DataFrame:
+    """
+    module level entry point so blocks of rebalance
+    dates can be sent to worker processes
+    """
+
+    return engine._get_rolling_black_litterman_weights(view_collection, rebalance_dates, window_length, start_date)
@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from black_litterman.domain.views import View, ViewAllocation
+
+
+class IncrementalBLSolver:
+    """
+    Black-Litterman solve that keeps the inverse of the K x K
+    view system (Omega / tau + P S P') up to date as single views
+    are added, removed or re-weighted, using bordering and
+    Sherman-Morrison updates rather than a fresh solve - each
+    change costs O(K^2 + K N) after one O(N^2) product for a new
+    view. Views with infinite variance are held outside the
+    system as they carry no information. If a change leaves the
+    system (close to) singular, e.g. duplicate views at full
+    confidence, no inverse is kept and the weights are solved for
+    directly until the system is well conditioned again
+    """
+
+    PIVOT_TOLERANCE = 1e-10
+
+    def __init__(self,
+                 market_weights: np.ndarray,
+                 market_cov: np.ndarray,
+                 tau: float,
+                 risk_aversion: float,
+                 refactor_interval: int = 50):
+
+        n_assets = len(market_weights)
+        self._market_weights = market_weights
+        self._market_cov = market_cov
+        self._tau = tau
+        self._risk_aversion = risk_aversion
+        self._refactor_interval = refactor_interval
+        self._cov_dot_weights = market_cov.dot(market_weights)
+
+        self._views = dict()
+        self._active_view_ids = []
+        self._view_matrix = np.zeros((0, n_assets))
+        self._cov_dot_views = np.zeros((n_assets, 0))
+        self._view_target = np.zeros(0)
+        self._view_variances = np.zeros(0)
+        self._system_inverse = np.zeros((0, 0))
+        self._n_updates = 0
+
+    def get_view_ids(self) -> List[str]:
+
+        return list(self._views)
+
+    def add_view(self,
+                 view_id: str,
+                 view_vector: np.ndarray,
+                 out_performance: float,
+                 variance: float) -> None:
+
+        if view_id in self._views:
+            raise ValueError(f"View '{view_id}' has already been added")
+
+        self._views[view_id] = (view_vector, out_performance, variance)
+        if np.isfinite(variance):
+            self._activate_view(view_id)
+
+    def remove_view(self,
+                    view_id: str) -> None:
+
+        _, _, variance = self._views.pop(view_id)
+        if np.isfinite(variance):
+            self._deactivate_view(view_id)
+
+    def update_view_variance(self,
+                             view_id: str,
+                             variance: float) -> None:
+
+        view_vector, out_performance, old_variance = self._views[view_id]
+        self._views[view_id] = (view_vector, out_performance, variance)
+
+        if not np.isfinite(old_variance):
+            if np.isfinite(variance):
+                self._activate_view(view_id)
+        elif not np.isfinite(variance):
+            self._deactivate_view(view_id)
+        else:
+            k = self._active_view_ids.index(view_id)
+            self._view_variances[k] = variance
+            self._system_inverse = self._get_rank_one_updated_inverse(k, (variance - old_variance) / self._tau)
+            self._count_update()
+
+    def update_view_out_performance(self,
+                                    view_id: str,
+                                    out_performance: float) -> None:
+
+        view_vector, _, variance = self._views[view_id]
+        self._views[view_id] = (view_vector, out_performance, variance)
+        if np.isfinite(variance):
+            k = self._active_view_ids.index(view_id)
+            self._view_target[k] = out_performance / self._risk_aversion - view_vector.dot(self._cov_dot_weights)
+
+    def get_weights(self) -> np.ndarray:
+
+        if self._system_inverse is None:
+            view_tilt = np.linalg.solve(self._get_view_system(), self._view_target)
+        else:
+            view_tilt = self._system_inverse.dot(self._view_target)
+
+        return self._market_weights + self._view_matrix.T.dot(view_tilt)
+
+    def _activate_view(self,
+                       view_id: str) -> None:
+        """
+        border the inverse of the view system with a new
+        row and column for the view
+        """
+
+        view_vector, out_performance, variance = self._views[view_id]
+        cov_dot_view = self._market_cov.dot(view_vector)
+        cross_terms = self._view_matrix.dot(cov_dot_view)
+        diagonal_term = variance / self._tau + view_vector.dot(cov_dot_view)
+
+        self._system_inverse = self._get_bordered_inverse(cross_terms, diagonal_term)
+        self._active_view_ids.append(view_id)
+        self._view_matrix = np.vstack([self._view_matrix, view_vector])
+        self._cov_dot_views = np.column_stack([self._cov_dot_views, cov_dot_view])
+        self._view_target = np.append(self._view_target, out_performance / self._risk_aversion
+                                      - view_vector.dot(self._cov_dot_weights))
+        self._view_variances = np.append(self._view_variances, variance)
+        self._count_update()
+
+    def _deactivate_view(self,
+                         view_id: str) -> None:
+        """
+        remove a view's row and column from the inverse
+        of the view system
+        """
+
+        k = self._active_view_ids.index(view_id)
+        keep = np.arange(len(self._active_view_ids)) != k
+
+        if self._system_inverse is not None:
+            system_inverse = self._system_inverse[np.ix_(keep, keep)]
+            system_inverse -= np.outer(self._system_inverse[keep, k],
+                                       self._system_inverse[k, keep]) / self._system_inverse[k, k]
+            self._system_inverse = system_inverse
+
+        self._active_view_ids.pop(k)
+        self._view_matrix = self._view_matrix[keep]
+        self._cov_dot_views = self._cov_dot_views[:, keep]
+        self._view_target = self._view_target[keep]
+        self._view_variances = self._view_variances[keep]
+        self._count_update()
+
+    def _get_bordered_inverse(self,
+                              cross_terms: np.ndarray,
+                              diagonal_term: float) -> Optional[np.ndarray]:
+        """
+        border the inverse of the view system with a new row
+        and column, or return None if the new view is (close
+        to) a combination of the active views
+        """
+
+        if self._system_inverse is None:
+            return None
+
+        projected = self._system_inverse.dot(cross_terms)
+        schur_complement = diagonal_term - cross_terms.dot(projected)
+        if abs(schur_complement) <= self.PIVOT_TOLERANCE * abs(diagonal_term):
+            return None
+
+        n_views = len(self._active_view_ids)
+        system_inverse = np.empty((n_views + 1, n_views + 1))
+        system_inverse[:n_views, :n_views] = self._system_inverse + np.outer(projected, projected) / schur_complement
+        system_inverse[:n_views, n_views] = -projected / schur_complement
+        system_inverse[n_views, :n_views] = -projected / schur_complement
+        system_inverse[n_views, n_views] = 1 / schur_complement
+        return system_inverse
+
+    def _get_rank_one_updated_inverse(self,
+                                      k: int,
+                                      delta: float) -> Optional[np.ndarray]:
+        """
+        Sherman-Morrison update of the inverse of the view system
+        for a change of delta to its k-th diagonal entry, or None
+        if the change leaves the system (close to) singular
+        """
+
+        if self._system_inverse is None:
+            return None
+
+        column_k = self._system_inverse[:, k].copy()
+        row_k = self._system_inverse[k, :].copy()
+        denominator = 1 + delta * column_k[k]
+        if abs(denominator) <= self.PIVOT_TOLERANCE * max(1., abs(delta * column_k[k])):
+            return None
+
+        return self._system_inverse - delta * np.outer(column_k, row_k) / denominator
+
+    def _get_view_system(self) -> np.ndarray:
+
+        return np.diag(self._view_variances / self._tau) + self._view_matrix.dot(self._cov_dot_views)
+
+    def _count_update(self) -> None:
+        """
+        rebuild the inverse from scratch every so often to
+        stop rounding errors accumulating, and after any change
+        made while the system was singular
+        """
+
+        self._n_updates += 1
+        if self._system_inverse is None or self._n_updates % self._refactor_interval == 0:
+            self._refactor()
+
+    def _refactor(self) -> None:
+        """
+        rebuild the inverse of the view system from scratch,
+        keeping no inverse if the system is (close to) singular
+        """
+
+        if not self._active_view_ids:
+            self._system_inverse = np.zeros((0, 0))
+            return
+
+        view_system = self._get_view_system()
+        if np.linalg.cond(view_system) * self.PIVOT_TOLERANCE < 1:
+            self._system_inverse = np.linalg.inv(view_system)
+        else:
+            self._system_inverse = None
+
+
+@dataclass
+class IncrementalSession:
+    """
+    state kept by the engine between incremental
+    solves for one date window
+    """
+
+    window: Tuple[str, str]
+    market_weights: pd.Series
+    market_cov: pd.DataFrame
+    solver: IncrementalBLSolver
+    views: Dict[str, View] = field(default_factory=dict)
+    calibrated_variances: Dict[Tuple[ViewAllocation, float], float] = field(default_factory=dict)
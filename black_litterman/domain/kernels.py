@@ -0,0 +1,227 @@
+import numpy as np
+from typing import Union
+from black_litterman.market_data.covariance import FactorCovariance
+
+Covariance = Union[np.ndarray, FactorCovariance]
+
+
+def get_black_litterman_weights(market_weights: np.ndarray,
+                                market_cov: Covariance,
+                                view_matrix: np.ndarray,
+                                view_cov: np.ndarray,
+                                view_out_performance: np.ndarray,
+                                tau: float,
+                                risk_aversion: float) -> np.ndarray:
+    """
+    positional Black-Litterman calculation to derive target
+    weights - the view inputs can carry leading batch dimensions
+    of the same size, in which case one set of weights is
+    returned per batch entry. With a factor covariance the
+    products S w and S P' cost O(N * k) rather than O(N^2)
+    """
+
+    view_matrix, view_cov, view_out_performance = _mask_uninformative_views(view_matrix, view_cov,
+                                                                            view_out_performance)
+    view_matrix_t = np.swapaxes(view_matrix, -1, -2)
+
+    cov_dot_weights = market_cov.dot(market_weights)
+    cov_dot_views = _cov_dot(market_cov, view_matrix_t)
+
+    view_system = view_cov / tau + np.matmul(view_matrix, cov_dot_views)
+    view_target = view_out_performance / risk_aversion - np.matmul(view_matrix, cov_dot_weights)
+    view_tilt = np.linalg.solve(view_system, view_target[..., None])
+
+    bl_weights = market_weights + np.matmul(view_matrix_t, view_tilt)[..., 0]
+    return bl_weights
+
+
+def get_black_litterman_weights_sparse(market_weights: np.ndarray,
+                                       market_cov: Covariance,
+                                       view_columns: np.ndarray,
+                                       view_weights: np.ndarray,
+                                       view_cov: np.ndarray,
+                                       view_out_performance: np.ndarray,
+                                       tau: float,
+                                       risk_aversion: float) -> np.ndarray:
+    """
+    Black-Litterman calculation with the view matrix in compact
+    form, as the columns each view touches and its weight on each
+    (see ViewCollection.get_view_columns) - S P' is gathered from
+    just those covariance columns, so P is never built and the
+    products cost O(N * K) rather than O(N^2 * K)
+    """
+
+    view_weights, view_cov, view_out_performance = _mask_uninformative_views(view_weights, view_cov,
+                                                                             view_out_performance)
+
+    cov_dot_weights = market_cov.dot(market_weights)
+    cov_dot_views = _cov_dot_sparse_views(market_cov, view_columns, view_weights)
+
+    view_system = view_cov / tau + np.einsum("kmj,km->kj", cov_dot_views[view_columns], view_weights)
+    view_target = view_out_performance / risk_aversion - np.sum(cov_dot_weights[view_columns] * view_weights,
+                                                                axis=-1)
+    view_tilt = np.linalg.solve(view_system, view_target)
+
+    asset_tilt = np.bincount(view_columns.ravel(), weights=(view_weights * view_tilt[:, None]).ravel(),
+                             minlength=len(market_weights))
+    return market_weights + asset_tilt
+
+
+def get_view_variances_from_confidences(market_cov: Covariance,
+                                        view_matrix: np.ndarray,
+                                        confidences: np.ndarray,
+                                        tau: float) -> np.ndarray:
+    """
+    closed form Idzorek calibration for each view (row) of the
+    view matrix - each view's tilt scales with
+    1 / (omega / tau + p'Sp), so hitting a fraction c of the full
+    confidence tilt requires omega = tau * p'Sp * (1 - c) / c.
+    Zero confidence maps to an infinite variance, as do views with
+    zero variance under the market covariance (a zero exposure, or
+    an absolute view on a riskless asset), which the calibration
+    has no scale for and so leaves inert. Views with a negative or
+    non-finite variance come back as NaN
+    """
+
+    cov_dot_views = _cov_dot(market_cov, np.swapaxes(view_matrix, -1, -2))
+    view_variances = np.einsum("...nk,...kn->...k", cov_dot_views, view_matrix)
+    return _get_variances_for_confidences(view_variances, confidences, tau)
+
+
+def get_view_variances_from_confidences_sparse(market_cov: Covariance,
+                                               view_columns: np.ndarray,
+                                               view_weights: np.ndarray,
+                                               confidences: np.ndarray,
+                                               tau: float) -> np.ndarray:
+    """
+    closed form Idzorek calibration for views given in compact
+    form, as for get_black_litterman_weights_sparse
+    """
+
+    cov_dot_views = _cov_dot_sparse_views(market_cov, view_columns, view_weights)
+    view_rows = np.arange(len(view_columns))[:, None]
+    view_variances = np.sum(cov_dot_views[view_columns, view_rows] * view_weights, axis=-1)
+    return _get_variances_for_confidences(view_variances, confidences, tau)
+
+
+def _get_variances_for_confidences(view_variances: np.ndarray,
+                                   confidences: np.ndarray,
+                                   tau: float) -> np.ndarray:
+
+    confidences = np.asarray(confidences, dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variances = tau * view_variances * (1 - confidences) / confidences
+
+    variances = np.where((confidences <= 0) | (view_variances == 0), np.inf, variances)
+    variances = np.where(np.isfinite(view_variances) & (view_variances >= 0), variances, np.nan)
+    return variances
+
+
+def get_view_variance_iterative(market_weights: np.ndarray,
+                                market_cov: Covariance,
+                                view_vector: np.ndarray,
+                                out_performance: float,
+                                confidence: float,
+                                tau: float,
+                                risk_aversion: float) -> float:
+    """
+    calibrate the variance of a single view by searching for the
+    variance that reproduces the confidence-weighted target weights.
+    As for the closed form, a view with zero variance under the
+    market covariance is left inert with an infinite variance
+    """
+
+    if _cov_dot(market_cov, view_vector).dot(view_vector) == 0:
+        return np.inf
+
+    # scipy is slow to import and only needed here, so
+    # load it on the first iterative calibration
+    from scipy import optimize
+
+    view_matrix = view_vector[None, :]
+    view_out_performance = np.array([out_performance])
+    target_weights = get_view_target_weights(market_weights, market_cov, view_vector, out_performance, confidence,
+                                             tau, risk_aversion)
+
+    def _error_vs_target_weights(var) -> float:
+        weights_for_cov = get_black_litterman_weights(market_weights, market_cov, view_matrix,
+                                                      np.reshape(var, (1, 1)), view_out_performance,
+                                                      tau, risk_aversion)
+        return get_sum_squares_error(weights_for_cov, target_weights)
+
+    variance = optimize.minimize(_error_vs_target_weights, np.array(0.1), method="BFGS")
+    return variance.x[0]
+
+
+def get_view_target_weights(market_weights: np.ndarray,
+                            market_cov: Covariance,
+                            view_vector: np.ndarray,
+                            out_performance: float,
+                            confidence: float,
+                            tau: float,
+                            risk_aversion: float) -> np.ndarray:
+    """
+    get target weights for a single view - the given fraction
+    of the way from the market weights to the weights with
+    full confidence in the view
+    """
+
+    full_confidence_weights = get_black_litterman_weights(market_weights, market_cov, view_vector[None, :],
+                                                          np.zeros((1, 1)), np.array([out_performance]),
+                                                          tau, risk_aversion)
+    return market_weights + confidence * (full_confidence_weights - market_weights)
+
+
+def get_sum_squares_error(weights_1: np.ndarray,
+                          weights_2: np.ndarray) -> float:
+
+    return float(np.sum((weights_1 - weights_2) ** 2))
+
+
+def _cov_dot(market_cov: Covariance,
+             other: np.ndarray) -> np.ndarray:
+
+    if isinstance(market_cov, FactorCovariance):
+        return market_cov.dot(other)
+
+    return np.matmul(market_cov, other)
+
+
+def _cov_dot_sparse_views(market_cov: Covariance,
+                          view_columns: np.ndarray,
+                          view_weights: np.ndarray) -> np.ndarray:
+    """
+    get S P' (assets x views) for a view matrix in compact form
+    """
+
+    if isinstance(market_cov, FactorCovariance):
+        factor_views = np.einsum("kmf,km->fk", market_cov.loadings[view_columns], view_weights)
+        cov_dot_views = market_cov.loadings.dot(factor_views)
+        view_rows = np.broadcast_to(np.arange(len(view_columns))[:, None], view_columns.shape)
+        np.add.at(cov_dot_views, (view_columns, view_rows),
+                  market_cov.specific_variances[view_columns] * view_weights)
+        return cov_dot_views
+
+    return np.einsum("nkm,km->nk", market_cov[:, view_columns], view_weights)
+
+
+def _mask_uninformative_views(view_matrix: np.ndarray,
+                              view_cov: np.ndarray,
+                              view_out_performance: np.ndarray):
+    """
+    views with infinite variance carry no information, so replace
+    them with an inert row (zero exposure, zero out-performance and
+    unit variance) which leaves the posterior unchanged
+    """
+
+    informative = np.isfinite(np.diagonal(view_cov, axis1=-2, axis2=-1))
+    if informative.all():
+        return view_matrix, view_cov, view_out_performance
+
+    view_matrix = np.where(informative[..., None], view_matrix, 0.)
+    view_out_performance = np.where(informative, view_out_performance, 0.)
+    view_cov = np.where(informative[..., :, None] & informative[..., None, :], view_cov, 0.)
+    inert_diagonal = np.eye(view_cov.shape[-1], dtype=bool) & ~informative[..., None]
+    view_cov = np.where(inert_diagonal, 1., view_cov)
+    return view_matrix, view_cov, view_out_performance
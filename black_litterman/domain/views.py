@@ -1,7 +1,8 @@
 import numpy as np
 import pandas as pd
 from dataclasses import dataclass
-from typing import List, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
 from uuid import uuid4
 
 
@@ -28,6 +29,14 @@ class ViewAllocation:
         else:
             return self.ABSOLUTE
 
+    def __eq__(self, other):
+        if not isinstance(other, ViewAllocation):
+            return NotImplemented
+        return (self.long_asset, self.short_asset) == (other.long_asset, other.short_asset)
+
+    def __hash__(self):
+        return hash((self.long_asset, self.short_asset))
+
 
 @dataclass(frozen=True)
 class View:
@@ -50,15 +59,43 @@ class View:
 
     def get_view_data_frame(self,
                             asset_universe: List[str]) -> pd.DataFrame:
-        view_series = pd.Series([0] * len(asset_universe), index=asset_universe, name=self.id)
-
-        view_series[self.allocation.long_asset] = 1
-        if self.allocation.short_asset is not None:
-            view_series[self.allocation.short_asset] = -1
 
-        view_data_frame = view_series.to_frame().T
+        view_vector = self.get_view_vector(asset_universe, dtype=np.int64)
+        view_data_frame = pd.DataFrame(view_vector[None, :], index=[self.id], columns=asset_universe)
         return view_data_frame
 
+    def get_view_vector(self,
+                        asset_universe: Sequence[str],
+                        dtype: type = float) -> np.ndarray:
+        """
+        get the view's exposure to each asset in the universe
+        """
+
+        view_vector = np.zeros(len(asset_universe), dtype=dtype)
+        columns, weights = self.get_view_columns(asset_universe)
+        np.add.at(view_vector, columns, weights.astype(dtype))
+        return view_vector
+
+    def get_view_columns(self,
+                         asset_universe: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        get the universe columns of the long and short assets
+        and the view's weight on each - an absolute view has
+        zero weight on its (first column) short asset
+        """
+
+        return self._get_view_columns(_get_asset_columns(tuple(asset_universe)))
+
+    def _get_view_columns(self,
+                          asset_columns: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+
+        long_column = _get_asset_column(asset_columns, self.allocation.long_asset)
+        if self.allocation.short_asset is None:
+            return np.array([long_column, 0]), np.array([1., 0.])
+
+        short_column = _get_asset_column(asset_columns, self.allocation.short_asset)
+        return np.array([long_column, short_column]), np.array([1., -1.])
+
 
 class ViewCollection:
 
@@ -84,16 +121,47 @@ class ViewCollection:
     def get_view_matrix(self,
                         asset_universe: List[str]) -> pd.DataFrame:
 
-        all_view_data_frames = []
-        for view in self._all_views.values():
-            view_data_frame = view.get_view_data_frame(asset_universe)
-            all_view_data_frames.append(view_data_frame)
-
-        if not all_view_data_frames:
+        if not self._all_views:
             return pd.DataFrame()
-        else:
-            view_matrix = pd.concat(all_view_data_frames, axis=0)
-            return view_matrix
+
+        view_array = self.get_view_array(asset_universe, dtype=np.int64)
+        view_matrix = pd.DataFrame(view_array, index=list(self._all_views), columns=asset_universe)
+        return view_matrix
+
+    def get_view_array(self,
+                       asset_universe: Sequence[str],
+                       dtype: type = float) -> np.ndarray:
+        """
+        get the views x assets view matrix, filled in
+        directly from each view's (at most two) columns
+        """
+
+        view_array = np.zeros((len(self._all_views), len(asset_universe)), dtype=dtype)
+        if not self._all_views:
+            return view_array
+
+        view_columns, view_weights = self.get_view_columns(asset_universe)
+        rows = np.repeat(np.arange(len(view_columns)), view_columns.shape[1])
+        np.add.at(view_array, (rows, view_columns.ravel()), view_weights.ravel().astype(dtype))
+        return view_array
+
+    def get_view_columns(self,
+                         asset_universe: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        get the view matrix in compact form - a views x 2 array
+        of the columns each view touches and the view's weight
+        on each
+        """
+
+        # resolve the asset map once rather than per view
+        asset_columns = _get_asset_columns(tuple(asset_universe))
+        n_views = len(self._all_views)
+        view_columns = np.zeros((n_views, 2), dtype=np.int64)
+        view_weights = np.zeros((n_views, 2))
+        for i, view in enumerate(self._all_views.values()):
+            view_columns[i], view_weights[i] = view._get_view_columns(asset_columns)
+
+        return view_columns, view_weights
 
     def get_view_out_performances(self) -> pd.Series:
 
@@ -108,3 +176,18 @@ class ViewCollection:
 
     def is_empty(self):
         return len(self._all_views) == 0
+
+
+@lru_cache(maxsize=32)
+def _get_asset_columns(asset_universe: Tuple[str, ...]) -> Dict[str, int]:
+
+    return {asset: column for column, asset in enumerate(asset_universe)}
+
+
+def _get_asset_column(asset_columns: Dict[str, int],
+                      asset: str) -> int:
+
+    try:
+        return asset_columns[asset]
+    except KeyError:
+        raise ValueError(f"View asset '{asset}' is not in the asset universe") from None
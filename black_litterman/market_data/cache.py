@@ -0,0 +1,86 @@
+from collections import OrderedDict, namedtuple
+from threading import RLock
+from typing import Any, Callable, Hashable, Optional
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class LRUCache:
+    """
+    bounded least-recently-used cache with hit/miss
+    counters - a maxsize of zero disables caching
+    """
+
+    def __init__(self,
+                 maxsize: int = 32):
+
+        if maxsize < 0:
+            raise ValueError(f"Cache size must be non-negative, got {maxsize}")
+
+        self._maxsize = maxsize
+        self._items = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._lock = RLock()
+
+    def get(self,
+            key: Hashable) -> Optional[Any]:
+        """
+        return the cached value for the key, or None
+        if it isn't cached
+        """
+
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self._hits += 1
+                return self._items[key]
+
+            self._misses += 1
+            return None
+
+    def put(self,
+            key: Hashable,
+            value: Any) -> None:
+        """
+        add a value to the cache, evicting the least
+        recently used entry if the cache is full
+        """
+
+        if self._maxsize == 0:
+            return
+
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self._maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self,
+                   predicate: Optional[Callable[[Hashable], bool]] = None) -> None:
+        """
+        drop all cached entries, or only those whose key
+        matches the predicate
+        """
+
+        with self._lock:
+            if predicate is None:
+                self._items.clear()
+            else:
+                for key in [key for key in self._items if predicate(key)]:
+                    del self._items[key]
+
+    def __getstate__(self):
+
+        # entries and lock aren't shipped - a copy sent to
+        # another process starts with an empty cache
+        return {"maxsize": self._maxsize}
+
+    def __setstate__(self, state):
+
+        self.__init__(state["maxsize"])
+
+    def cache_info(self) -> CacheInfo:
+
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._maxsize, len(self._items))
@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from queue import LifoQueue, Empty, Full
+from typing import Any, Callable, Iterator
+
+
+class ConnectionPool:
+    """
+    thread-safe pool of DB-API connections - connections are
+    created on demand and returned to the pool after use, with
+    at most `max_size` idle connections kept open
+    """
+
+    def __init__(self,
+                 connection_factory: Callable[[], Any],
+                 max_size: int = 4):
+
+        self._connection_factory = connection_factory
+        self._idle_connections = LifoQueue(maxsize=max_size)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        borrow a connection from the pool, opening a
+        new one if none are idle
+        """
+
+        try:
+            connection = self._idle_connections.get_nowait()
+        except Empty:
+            connection = self._connection_factory()
+
+        try:
+            yield connection
+        except Exception:
+            # the connection may be in a bad state, so don't reuse it
+            connection.close()
+            raise
+
+        try:
+            self._idle_connections.put_nowait(connection)
+        except Full:
+            connection.close()
+
+    def close_all(self) -> None:
+
+        while True:
+            try:
+                self._idle_connections.get_nowait().close()
+            except Empty:
+                return
@@ -0,0 +1,301 @@
+import numpy as np
+import pandas as pd
+from abc import ABC, abstractmethod
+from typing import Optional
+from black_litterman.constants import CovarianceEstimator
+from black_litterman.market_data.indexing import get_pairwise_covariance
+
+
+class BaseCovarianceEstimator(ABC):
+
+    @abstractmethod
+    def estimate(self,
+                 returns: np.ndarray) -> np.ndarray:
+        """
+        estimate the per-period covariance of a
+        dates x assets block of returns
+        """
+
+
+class SampleCovarianceEstimator(BaseCovarianceEstimator):
+    """
+    pairwise complete sample covariance,
+    matching pandas' DataFrame.cov
+    """
+
+    def estimate(self,
+                 returns: np.ndarray) -> np.ndarray:
+
+        return get_pairwise_covariance(returns)
+
+
+class _ShrinkageEstimator(BaseCovarianceEstimator):
+    """
+    shrink the maximum likelihood sample covariance towards
+    a scaled identity - missing returns are treated as
+    zero deviations from the asset's mean
+    """
+
+    def estimate(self,
+                 returns: np.ndarray) -> np.ndarray:
+
+        deviations = _get_deviations(returns)
+        n_dates, n_assets = deviations.shape
+        sample_cov = deviations.T.dot(deviations) / n_dates
+        target_scale = np.trace(sample_cov) / n_assets
+        shrinkage = self._get_shrinkage(deviations, sample_cov, target_scale)
+
+        covariance = (1 - shrinkage) * sample_cov
+        covariance[np.diag_indices(n_assets)] += shrinkage * target_scale
+        return covariance
+
+    @abstractmethod
+    def _get_shrinkage(self,
+                       deviations: np.ndarray,
+                       sample_cov: np.ndarray,
+                       target_scale: float) -> float:
+        """
+        get the weight given to the target
+        """
+
+
+class LedoitWolfEstimator(_ShrinkageEstimator):
+    """
+    Ledoit-Wolf (2004) shrinkage, with the optimal
+    intensity estimated from the data
+    """
+
+    def _get_shrinkage(self,
+                       deviations: np.ndarray,
+                       sample_cov: np.ndarray,
+                       target_scale: float) -> float:
+
+        n_dates, n_assets = deviations.shape
+        # sum over dates of ||x_t x_t' - S||^2, using
+        # ||x_t x_t'||^2 = (x_t'x_t)^2 to stay O(T * N)
+        squared_norms = np.sum(np.sum(deviations ** 2, axis=1) ** 2)
+        sample_norm = np.sum(sample_cov ** 2)
+        beta = (squared_norms / n_dates - sample_norm) / (n_dates * n_assets)
+        delta = (sample_norm - n_assets * target_scale ** 2) / n_assets
+        if delta <= 0:
+            return 0.
+
+        return float(np.clip(beta / delta, 0., 1.))
+
+
+class OASEstimator(_ShrinkageEstimator):
+    """
+    oracle approximating shrinkage (Chen et al., 2010),
+    which suits short windows with Gaussian returns
+    """
+
+    def _get_shrinkage(self,
+                       deviations: np.ndarray,
+                       sample_cov: np.ndarray,
+                       target_scale: float) -> float:
+
+        n_dates, n_assets = deviations.shape
+        mean_squared_cov = np.mean(sample_cov ** 2)
+        numerator = mean_squared_cov + target_scale ** 2
+        denominator = (n_dates + 1) * (mean_squared_cov - target_scale ** 2 / n_assets)
+        if denominator <= 0:
+            return 1.
+
+        return float(min(numerator / denominator, 1.))
+
+
+class EWMAEstimator(BaseCovarianceEstimator):
+    """
+    exponentially weighted (RiskMetrics style, zero mean)
+    covariance with weights normalised to sum to one, so short
+    windows aren't biased towards zero. Missing returns count
+    as zero.
+
+    For a window of n returns the estimate follows the recursion
+
+        C_n = (decay * (1 - decay^(n-1)) * C_(n-1) + (1 - decay) * r_n r_n') / (1 - decay^n)
+
+    so a window can be moved on by a day with `update`
+    """
+
+    def __init__(self,
+                 decay: float = 0.94):
+
+        if not 0 < decay < 1:
+            raise ValueError(f"EWMA decay must be between 0 and 1, got {decay}")
+
+        self._decay = decay
+
+    def estimate(self,
+                 returns: np.ndarray) -> np.ndarray:
+
+        returns = np.nan_to_num(returns.astype(np.float64))
+        n_dates = len(returns)
+        if n_dates == 0:
+            return np.full((returns.shape[1], returns.shape[1]), np.nan)
+
+        weights = (1 - self._decay) * self._decay ** np.arange(n_dates - 1, -1, -1)
+        weights /= 1 - self._decay ** n_dates
+        return (returns * weights[:, None]).T.dot(returns)
+
+    def update(self,
+               covariance: np.ndarray,
+               new_returns: np.ndarray,
+               n_dates: int) -> np.ndarray:
+        """
+        move the estimate over the previous n_dates
+        returns on by one day of returns
+        """
+
+        new_returns = np.nan_to_num(new_returns.astype(np.float64))
+        weight = (1 - self._decay) / (1 - self._decay ** (n_dates + 1))
+        return (1 - weight) * covariance + weight * np.outer(new_returns, new_returns)
+
+
+class FactorCovariance:
+    """
+    covariance with k factors plus a diagonal of specific
+    variances, B B' + diag(d), held in O(N * k) memory - products
+    with it go through the factor structure so the N x N matrix
+    is never built
+    """
+
+    def __init__(self,
+                 loadings: np.ndarray,
+                 specific_variances: np.ndarray,
+                 assets: Optional[pd.Index] = None):
+
+        self.loadings = loadings
+        self.specific_variances = specific_variances
+        self.assets = assets
+
+    @property
+    def shape(self):
+
+        n_assets = len(self.specific_variances)
+        return n_assets, n_assets
+
+    def dot(self,
+            other: np.ndarray) -> np.ndarray:
+        """
+        multiply a vector, or a (possibly batched) matrix
+        with assets along its second to last axis
+        """
+
+        factor_product = np.matmul(self.loadings, np.matmul(self.loadings.T, other))
+        if other.ndim == 1:
+            return factor_product + self.specific_variances * other
+
+        return factor_product + self.specific_variances[:, None] * other
+
+    def scaled(self,
+               scale: float) -> "FactorCovariance":
+
+        return FactorCovariance(self.loadings * np.sqrt(scale), self.specific_variances * scale, self.assets)
+
+    def to_dense(self) -> np.ndarray:
+
+        covariance = self.loadings.dot(self.loadings.T)
+        covariance[np.diag_indices(len(self.specific_variances))] += self.specific_variances
+        return covariance
+
+
+class FactorModelEstimator(BaseCovarianceEstimator):
+    """
+    statistical factor model - the first n_factors principal
+    components of the maximum likelihood sample covariance, with
+    the rest of each asset's variance left as specific variance.
+    Missing returns are treated as zero deviations from the
+    asset's mean
+    """
+
+    def __init__(self,
+                 n_factors: int = 5):
+
+        if n_factors < 1:
+            raise ValueError(f"Factor model needs at least one factor, got {n_factors}")
+
+        self._n_factors = n_factors
+
+    def estimate(self,
+                 returns: np.ndarray) -> np.ndarray:
+
+        return self.estimate_factors(returns).to_dense()
+
+    def estimate_factors(self,
+                         returns: np.ndarray) -> FactorCovariance:
+        """
+        estimate the factor structure without building the
+        full covariance - the thin SVD of the dates x assets
+        returns costs O(T * N * min(T, N))
+        """
+
+        n_dates, n_assets = returns.shape
+        if n_dates == 0:
+            return FactorCovariance(np.zeros((n_assets, 0)), np.full(n_assets, np.nan))
+
+        scaled_deviations = _get_deviations(returns) / np.sqrt(n_dates)
+        _, singular_values, components = np.linalg.svd(scaled_deviations, full_matrices=False)
+        n_factors = min(self._n_factors, len(singular_values))
+        loadings = components[:n_factors].T * singular_values[:n_factors]
+
+        total_variances = np.sum(scaled_deviations ** 2, axis=0)
+        specific_variances = np.maximum(total_variances - np.sum(loadings ** 2, axis=1), 0.)
+        return FactorCovariance(loadings, specific_variances)
+
+
+class CovarianceEstimatorFactory:
+
+    @staticmethod
+    def get_estimator(estimator: str,
+                      ewma_decay: float = 0.94,
+                      n_factors: int = 5) -> BaseCovarianceEstimator:
+        """
+        get the covariance estimator with the given name
+        """
+
+        if estimator == CovarianceEstimator.SAMPLE:
+            return SampleCovarianceEstimator()
+        elif estimator == CovarianceEstimator.LEDOIT_WOLF:
+            return LedoitWolfEstimator()
+        elif estimator == CovarianceEstimator.OAS:
+            return OASEstimator()
+        elif estimator == CovarianceEstimator.EWMA:
+            return EWMAEstimator(ewma_decay)
+        elif estimator == CovarianceEstimator.FACTOR:
+            return FactorModelEstimator(n_factors)
+        else:
+            raise ValueError(f"Covariance estimator '{estimator}' is not recognised - valid estimators "
+                             f"are {', '.join(CovarianceEstimator.get_all_estimators())}")
+
+
+def get_nearest_psd_matrix(covariance: np.ndarray,
+                           min_eigenvalue: float = 0.) -> np.ndarray:
+    """
+    project a symmetric matrix onto the nearest (in Frobenius
+    norm) matrix with eigenvalues of at least min_eigenvalue -
+    pairwise complete covariances of ragged histories need not
+    be positive semi-definite. Assets with any missing entry
+    are left as they are
+    """
+
+    complete = np.isfinite(covariance).all(axis=1)
+    block = covariance[np.ix_(complete, complete)]
+    block = (block + block.T) / 2
+    eigenvalues, eigenvectors = np.linalg.eigh(block)
+    if eigenvalues.size == 0 or eigenvalues[0] >= min_eigenvalue:
+        return covariance
+
+    projected = covariance.copy()
+    projected[np.ix_(complete, complete)] = (eigenvectors * np.maximum(eigenvalues, min_eigenvalue)).dot(
+        eigenvectors.T)
+    return projected
+
+
+def _get_deviations(returns: np.ndarray) -> np.ndarray:
+
+    returns = returns.astype(np.float64)
+    valid = ~np.isnan(returns)
+    counts = np.maximum(valid.sum(axis=0), 1)
+    means = np.where(valid, returns, 0.).sum(axis=0) / counts
+    return np.where(valid, returns - means, 0.)
@@ -1,15 +1,33 @@
+import os
+import re
+import json
+import hashlib
+import importlib
+import numpy as np
 import pandas as pd
+from threading import Lock
 from logging import getLogger
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from abc import ABC, abstractmethod
 from black_litterman.market_data.engine import MarketDataEngine
-from black_litterman.constants import Configuration, MarketData
-from cardano.market_data.market_data_client import MarketDataClient
+from black_litterman.market_data.indexing import DateIndex
+from black_litterman.market_data.connection_pool import ConnectionPool
+from black_litterman.market_data.validation import DataQualityReport, MarketDataValidator
+from black_litterman.constants import Configuration, DataFix, MarketData
 
 logger = getLogger()
 
 
 class BaseDataReader(ABC):
+    """
+    base for the market data sources - raw data is read,
+    checked for structural problems, formatted into wide
+    price and market cap frames and then quality checked
+    """
+
+    _validator = MarketDataValidator()
+    _last_quality_report = None
 
     @abstractmethod
     def _read_raw_data(self,
@@ -38,104 +56,630 @@ class BaseDataReader(ABC):
 
     def get_market_data_engine(self,
                                start_date: str,
-                               end_date: str) -> MarketDataEngine:
+                               end_date: str,
+                               **engine_options) -> MarketDataEngine:
         """
-        read market data an wrap in engine class
+        read market data an wrap in engine class - any
+        engine options are passed through to the engine
         """
 
+        formatted_data = self._get_market_data(start_date, end_date)
+        data_engine = MarketDataEngine(formatted_data[MarketData.PRICE_DATA],
+                                       formatted_data[MarketData.MARKET_CAP_DATA],
+                                       **engine_options)
+        return data_engine
+
+    def refresh_market_data_engine(self,
+                                   market_data_engine: MarketDataEngine,
+                                   end_date: str) -> None:
+        """
+        read only the dates after the last date held by
+        the engine, up to the end date, and append them
+        """
+
+        last_date = market_data_engine.get_last_date()
+        if last_date is None:
+            raise ValueError("Can't refresh a market data engine that holds no data")
+
+        start_date = last_date + pd.Timedelta(days=1)
+        if start_date > pd.Timestamp(end_date):
+            return
+
+        formatted_data = self._get_market_data(start_date.strftime("%Y-%m-%d"), end_date)
+        market_data_engine.append(formatted_data[MarketData.PRICE_DATA],
+                                  formatted_data[MarketData.MARKET_CAP_DATA])
+
+    def _get_market_data(self,
+                         start_date: str,
+                         end_date: str) -> Dict[str, pd.DataFrame]:
+
         raw_data = self._read_raw_data(start_date, end_date)
         self._validate_data(raw_data)
         formatted_data = self._get_formatted_data(raw_data)
-        data_engine = MarketDataEngine(formatted_data[MarketData.PRICE_DATA],
-                                       formatted_data[MarketData.MARKET_CAP_DATA])
-        return data_engine
+        formatted_data, self._last_quality_report = self._validator.validate(formatted_data)
+        if not self._last_quality_report.is_clean():
+            logger.warning(f"Market data quality issues - {self._last_quality_report.get_summary()}")
+
+        return formatted_data
+
+    def set_validator(self,
+                      validator: MarketDataValidator) -> None:
+        """
+        set the quality checks (and any fixes)
+        applied to each load of market data
+        """
+
+        self._validator = validator
+
+    def get_last_quality_report(self) -> Optional[DataQualityReport]:
+        """
+        get the quality report for the most recent
+        load of market data, if there has been one
+        """
+
+        return self._last_quality_report
+
+    @staticmethod
+    def _check_data_types(raw_data: Dict[str, pd.DataFrame]) -> None:
+
+        missing_data_types = [data_type for data_type in MarketData.get_data_types() if data_type not in raw_data]
+        if missing_data_types:
+            err_msg = f"Market data is missing {', '.join(missing_data_types)}"
+            logger.error(err_msg)
+            raise ValueError(err_msg)
 
 
 class LocalDataReader(BaseDataReader):
     """
-    read in data from a local spreadsheet
+    read in data from a local spreadsheet - parsed data is
+    cached in a binary file next to the workbook, which is
+    used instead of the workbook until the workbook changes.
+
+    Only the assets in the asset universe are kept, and in
+    pushdown mode only the requested dates and assets are
+    parsed from the workbook in the first place
     """
 
+    CACHE_SUFFIX = ".cache.npz"
+
     def __init__(self,
-                 data_file_path):
+                 data_file_path,
+                 use_cache: bool = True,
+                 cache_path: Optional[str] = None,
+                 asset_universe: Optional[List[str]] = None,
+                 pushdown: bool = False,
+                 dtype: str = "float64"):
 
         self._path = data_file_path
+        self._use_cache = use_cache
+        self._cache_path = cache_path or data_file_path + self.CACHE_SUFFIX
+        self._asset_universe = None if asset_universe is None else list(asset_universe)
+        self._pushdown = pushdown
+        self._dtype = dtype
 
     def _read_raw_data(self,
                        start_date: str,
                        end_date: str) -> Dict[str, pd.DataFrame]:
 
+        start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        raw_data = self._read_cached_data(start_date, end_date) if self._use_cache else None
+        if raw_data is None:
+            if self._pushdown:
+                raw_data = self._read_workbook_window(start_date, end_date)
+                coverage = (start_date, end_date)
+            else:
+                raw_data = self._read_workbook()
+                coverage = (pd.Timestamp.min, pd.Timestamp.max)
+
+            if self._use_cache:
+                self._write_cached_data(raw_data, coverage)
+
+        return {data_type: self._select_assets(data.loc[start_date: end_date, :])
+                for data_type, data in raw_data.items()}
+
+    def _select_assets(self,
+                       data: pd.DataFrame) -> pd.DataFrame:
+
+        if self._asset_universe is None:
+            return data
+
+        return data.loc[:, self._asset_universe]
+
+    def _read_workbook(self) -> Dict[str, pd.DataFrame]:
+
         raw_data = pd.read_excel(self._path, sheet_name=MarketData.get_data_types(), index_col=0)
-        raw_data = raw_data.loc[start_date: end_date, :]
+        for data_type, data in raw_data.items():
+            data.index = pd.to_datetime(data.index)
+            raw_data[data_type] = self._select_assets(data)
+
+        return raw_data
+
+    def _read_workbook_window(self,
+                              start_date: pd.Timestamp,
+                              end_date: pd.Timestamp) -> Dict[str, pd.DataFrame]:
+        """
+        stream each sheet once, keeping only the rows between
+        the dates and the columns in the asset universe - rows are
+        taken to be in date order, so the read stops after the
+        end date
+        """
+
+        # imported here as only pushdown reads need openpyxl directly
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(self._path, read_only=True, data_only=True)
+        try:
+            return {data_type: self._read_sheet_window(workbook[data_type], data_type, start_date, end_date)
+                    for data_type in MarketData.get_data_types()}
+        finally:
+            workbook.close()
+
+    def _read_sheet_window(self,
+                           sheet: Any,
+                           data_type: str,
+                           start_date: pd.Timestamp,
+                           end_date: pd.Timestamp) -> pd.DataFrame:
+
+        header = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True))
+        columns = [str(column) for column in header[1:]]
+        if self._asset_universe is None:
+            selected_columns = columns
+        else:
+            missing_assets = [asset for asset in self._asset_universe if asset not in columns]
+            if missing_assets:
+                raise KeyError(f"Assets {missing_assets} are not in the {data_type} sheet")
+            selected_columns = self._asset_universe
+
+        # positions in each row, after the date in position 0
+        positions = [columns.index(column) + 1 for column in selected_columns]
+        dates, values = [], []
+        for row in sheet.iter_rows(min_row=2, max_col=max(positions, default=0) + 1, values_only=True):
+            if row[0] is None:
+                continue
+
+            date = pd.Timestamp(row[0])
+            if date > end_date:
+                break
+            if date >= start_date:
+                dates.append(date)
+                values.append([row[position] if position < len(row) else None for position in positions])
+
+        data = pd.DataFrame(values, index=pd.DatetimeIndex(dates), columns=selected_columns)
+        return data.fillna(np.nan).infer_objects() if len(data) else data.astype(float)
+
+    def _get_workbook_fingerprint(self) -> Tuple[int, int]:
+
+        file_stats = os.stat(self._path)
+        return file_stats.st_mtime_ns, file_stats.st_size
+
+    def _get_workbook_hash(self) -> str:
+
+        file_hash = hashlib.sha256()
+        with open(self._path, "rb") as workbook:
+            for block in iter(lambda: workbook.read(1 << 20), b""):
+                file_hash.update(block)
+
+        return file_hash.hexdigest()
+
+    def _read_cached_data(self,
+                          start_date: pd.Timestamp,
+                          end_date: pd.Timestamp) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        load the data from the cache file, or return None if there
+        is no cache, the cache doesn't cover the requested dates and
+        assets, or the workbook has changed since it was written
+        (a newer modification time with identical contents still
+        counts as unchanged)
+        """
+
+        if not os.path.exists(self._cache_path):
+            return None
+
+        try:
+            with np.load(self._cache_path, allow_pickle=False) as cached:
+                coverage = pd.to_datetime(cached["coverage"])
+                if coverage[0] > start_date or coverage[1] < end_date:
+                    return None
+
+                cached_fingerprint = tuple(int(x) for x in cached["fingerprint"])
+                if cached_fingerprint != self._get_workbook_fingerprint():
+                    if str(cached["sha256"]) != self._get_workbook_hash():
+                        return None
+                    # contents unchanged - refresh the fingerprint so the
+                    # next read doesn't need to hash the workbook again
+                    refresh_fingerprint = True
+                else:
+                    refresh_fingerprint = False
+
+                raw_data = dict()
+                for data_type in MarketData.get_data_types():
+                    columns = cached[f"{data_type}_columns"].tolist()
+                    if self._asset_universe is not None and not set(self._asset_universe).issubset(columns):
+                        return None
+
+                    raw_data[data_type] = pd.DataFrame(cached[f"{data_type}_values"],
+                                                       index=pd.to_datetime(cached[f"{data_type}_dates"]),
+                                                       columns=columns)
+        except (OSError, KeyError, ValueError) as err:
+            logger.warning(f"Ignoring unreadable market data cache {self._cache_path}: {err}")
+            return None
+
+        if refresh_fingerprint:
+            self._write_cached_data(raw_data, (coverage[0], coverage[1]))
+
         return raw_data
 
+    def _write_cached_data(self,
+                           raw_data: Dict[str, pd.DataFrame],
+                           coverage: Tuple[pd.Timestamp, pd.Timestamp]) -> None:
+        """
+        write the data to the cache file along with the dates it
+        covers and the workbook's fingerprint and hash
+        """
+
+        arrays = {"fingerprint": np.array(self._get_workbook_fingerprint(), dtype=np.int64),
+                  "sha256": np.array(self._get_workbook_hash()),
+                  "coverage": np.array([date.to_datetime64() for date in coverage], dtype="datetime64[ns]")}
+        for data_type, data in raw_data.items():
+            arrays[f"{data_type}_values"] = data.values.astype(np.float64)
+            arrays[f"{data_type}_dates"] = data.index.values.astype("datetime64[ns]")
+            arrays[f"{data_type}_columns"] = np.array([str(column) for column in data.columns])
+
+        temp_path = self._cache_path + ".tmp"
+        try:
+            with open(temp_path, "wb") as cache_file:
+                np.savez(cache_file, **arrays)
+            os.replace(temp_path, self._cache_path)
+        except OSError as err:
+            logger.warning(f"Unable to write market data cache {self._cache_path}: {err}")
+
     def _validate_data(self, raw_data: Dict[str, pd.DataFrame]) -> None:
 
-        pass
-        # TODO: should add in some validation here
+        self._check_data_types(raw_data)
+        price_data = raw_data[MarketData.PRICE_DATA]
+        market_cap_data = raw_data[MarketData.MARKET_CAP_DATA]
+        if set(price_data.columns) != set(market_cap_data.columns):
+            err_msg = f"Price and market cap sheets in {self._path} are for different assets"
+            logger.error(err_msg)
+            raise ValueError(err_msg)
+
+        non_numeric = [f"{data_type}: {column}" for data_type, data in raw_data.items()
+                       for column, dtype in data.dtypes.items() if not np.issubdtype(dtype, np.number)]
+        if non_numeric:
+            err_msg = f"Non-numeric market data in {self._path} ({', '.join(non_numeric)})"
+            logger.error(err_msg)
+            raise ValueError(err_msg)
 
     def _get_formatted_data(self, raw_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
 
-        for data in raw_data.values():
+        # cast only once validation has ruled out non-numeric data
+        formatted_data = dict()
+        for data_type, data in raw_data.items():
+            data = data.astype(self._dtype, copy=False)
             data.index = pd.to_datetime(data.index)
+            formatted_data[data_type] = data
 
-        return raw_data
+        return formatted_data
 
 
 class SqlDataReader(BaseDataReader):
     """
-    read in data from SQL server database
+    read in data from a SQL database through any DB-API
+    connection. Data is held in long format in a single table
+    with columns (date, ticker, data_type, value), where dates
+    are ISO formatted and data_type is one of the MarketData
+    data types. The date range and ticker filters are applied in
+    the query, rows are streamed in chunks straight into dense
+    arrays and connections are pooled across reads. Query
+    parameters are bound in the driver's DB-API paramstyle, and
+    the table name, which can't be bound, must be a plain
+    (optionally schema qualified) identifier
     """
 
+    PARAMETER_FORMATS = {"qmark": "?", "numeric": ":{0}", "named": ":p{0}", "format": "%s",
+                         "pyformat": "%(p{0})s"}
+    TABLE_NAME_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?")
+
+    def __init__(self,
+                 connection_factory: Callable[[], Any],
+                 tickers: List[str],
+                 table: str = "market_data",
+                 chunk_size: int = 10000,
+                 pool_size: int = 4,
+                 paramstyle: str = "qmark",
+                 dtype: str = "float64"):
+
+        if not self.TABLE_NAME_PATTERN.fullmatch(table):
+            raise ValueError(f"SQL table name '{table}' is not a valid identifier")
+
+        if paramstyle not in self.PARAMETER_FORMATS:
+            raise ValueError(f"SQL paramstyle '{paramstyle}' is not recognised - valid paramstyles "
+                             f"are {', '.join(self.PARAMETER_FORMATS)}")
+
+        self._pool = ConnectionPool(connection_factory, pool_size)
+        self._tickers = list(tickers)
+        self._table = table
+        self._chunk_size = chunk_size
+        self._paramstyle = paramstyle
+        self._dtype = dtype
+
+    def _bind_parameters(self,
+                         query: str,
+                         parameters: List[Any]) -> Tuple[str, Union[List[Any], Dict[str, Any]]]:
+        """
+        swap the ? placeholders in a query for the driver's
+        paramstyle, naming the parameters if it needs them named
+        """
+
+        if self._paramstyle == "qmark":
+            return query, parameters
+
+        query_parts = query.split("?")
+        placeholders = [self.PARAMETER_FORMATS[self._paramstyle].format(i + 1) for i in range(len(parameters))]
+        query = "".join([part + placeholder for part, placeholder in zip(query_parts, placeholders + [""])])
+        if self._paramstyle in ["named", "pyformat"]:
+            return query, {f"p{i + 1}": value for i, value in enumerate(parameters)}
+
+        return query, parameters
+
+    def _get_filter(self,
+                    start_date: str,
+                    end_date: str) -> Tuple[str, List[Any]]:
+
+        ticker_placeholders = ", ".join(["?"] * len(self._tickers))
+        query_filter = f"date >= ? AND date < ? AND ticker IN ({ticker_placeholders})"
+        # compare against the start of the following day so dates
+        # with a time component on the end date are included
+        parameters = [pd.Timestamp(start_date).strftime("%Y-%m-%d"),
+                      (pd.Timestamp(end_date) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")] + self._tickers
+        return query_filter, parameters
+
     def _read_raw_data(self,
                        start_date: str,
-                       end_date: str):
-        raise NotImplementedError()
+                       end_date: str) -> Dict[str, pd.DataFrame]:
+
+        query_filter, parameters = self._get_filter(start_date, end_date)
+        data_types = MarketData.get_data_types()
+        type_placeholders = ", ".join(["?"] * len(data_types))
+
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(*self._bind_parameters(f"SELECT DISTINCT date FROM {self._table} "
+                                                      f"WHERE {query_filter} ORDER BY date", parameters))
+                dates = np.array([row[0] for row in cursor.fetchall()], dtype=str)
+                all_values = {data_type: np.full((len(dates), len(self._tickers)), np.nan, dtype=self._dtype)
+                              for data_type in data_types}
+
+                cursor.execute(*self._bind_parameters(f"SELECT data_type, date, ticker, value FROM {self._table} "
+                                                      f"WHERE {query_filter} AND data_type IN ({type_placeholders})",
+                                                      parameters + data_types))
+                self._fetch_into_arrays(cursor, dates, all_values)
+            finally:
+                cursor.close()
+
+        date_index = pd.to_datetime(dates)
+        raw_data = {data_type: pd.DataFrame(values, index=date_index, columns=self._tickers, copy=False)
+                    for data_type, values in all_values.items()}
+        return raw_data
+
+    def _fetch_into_arrays(self,
+                           cursor: Any,
+                           dates: np.ndarray,
+                           all_values: Dict[str, np.ndarray]) -> None:
+        """
+        stream the query results in chunks, scattering each
+        chunk into the preallocated dates x tickers arrays
+        """
+
+        ticker_order = np.argsort(self._tickers)
+        sorted_tickers = np.array(self._tickers, dtype=str)[ticker_order]
+
+        while True:
+            rows = cursor.fetchmany(self._chunk_size)
+            if not rows:
+                return
+
+            row_types, row_dates, row_tickers, row_values = [np.array(column) for column in zip(*rows)]
+            date_positions = np.searchsorted(dates, row_dates.astype(str))
+            ticker_positions = ticker_order[np.searchsorted(sorted_tickers, row_tickers.astype(str))]
+            row_values = row_values.astype(float)
+
+            for data_type, values in all_values.items():
+                is_type = row_types == data_type
+                values[date_positions[is_type], ticker_positions[is_type]] = row_values[is_type]
 
     def _validate_data(self,
                        raw_data: Dict[str, pd.DataFrame]) -> None:
-        raise NotImplementedError()
+
+        pass
 
     def _get_formatted_data(self,
                             raw_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
-        raise NotImplementedError()
+
+        return raw_data
+
+    def close(self) -> None:
+        """
+        close all pooled connections
+        """
+
+        self._pool.close_all()
 
 
 class ReutersDataReader(BaseDataReader):
     """
     read in data from the Thompson Reuters
-    market data API
+    market data API - requests are split into blocks of tickers
+    and dates and sent concurrently, and everything fetched is
+    kept in a local store (persisted to disk if a store path is
+    given) so later reads only request dates not already held
     """
 
+    PRICE_FIELD = "PI"
+    MARKET_CAP_FIELD = "X(MV)~GBP"
+    STORE_COLUMNS = ["ticker", "field", "date", "value"]
+
     def __init__(self,
                  credentials: Dict[str, str],
-                 tickers: Dict[str, str]):
-        self._mdc = MarketDataClient(credentials=credentials)
+                 tickers: Dict[str, str],
+                 store_path: Optional[str] = None,
+                 max_workers: int = 4,
+                 tickers_per_request: int = 20,
+                 days_per_request: int = 365,
+                 client_factory: Optional[Callable[[], Any]] = None,
+                 dtype: str = "float64"):
+
+        self._client_factory = client_factory or (lambda: self._create_client(credentials))
         self._tickers = tickers
+        self._store_path = store_path
+        self._max_workers = max_workers
+        self._tickers_per_request = tickers_per_request
+        self._days_per_request = days_per_request
+        self._dtype = dtype
+        self._store_lock = Lock()
+        self._stored_data, self._coverage = self._load_store()
+
+    @staticmethod
+    def _create_client(credentials: Dict[str, str]) -> Any:
+
+        # imported here so the Reuters client is only
+        # needed by those who read from Reuters
+        from cardano.market_data.market_data_client import MarketDataClient
+        return MarketDataClient(credentials=credentials)
+
+    def _load_store(self) -> Tuple[pd.DataFrame, Dict[Tuple[str, str], List[Tuple[pd.Timestamp, pd.Timestamp]]]]:
+        """
+        load previously fetched data and the sorted, disjoint
+        date ranges held for each ticker and field
+        """
+
+        if self._store_path is not None and os.path.exists(self._store_path):
+            try:
+                store = pd.read_pickle(self._store_path)
+                # older stores held a single range per ticker and field
+                coverage = {key: [ranges] if isinstance(ranges, tuple) else ranges
+                            for key, ranges in store["coverage"].items()}
+                return store["data"], coverage
+            except (OSError, KeyError, ValueError) as err:
+                logger.warning(f"Ignoring unreadable Reuters data store {self._store_path}: {err}")
+
+        return pd.DataFrame(columns=self.STORE_COLUMNS), dict()
+
+    def _save_store(self) -> None:
+
+        if self._store_path is None:
+            return
+
+        temp_path = self._store_path + ".tmp"
+        pd.to_pickle({"data": self._stored_data, "coverage": self._coverage}, temp_path)
+        os.replace(temp_path, self._store_path)
+
+    def _get_missing_requests(self,
+                              start_date: pd.Timestamp,
+                              end_date: pd.Timestamp) -> List[Tuple[List[str], str, pd.Timestamp, pd.Timestamp]]:
+        """
+        work out the (tickers, field, start, end) requests needed
+        to fill in the dates not already held, split into blocks
+        of tickers and dates
+        """
+
+        missing_ranges = dict()
+        for ticker in [value[0] for value in self._tickers.values()]:
+            for field in [self.PRICE_FIELD, self.MARKET_CAP_FIELD]:
+                coverage = self._coverage.get((ticker, field), [])
+                for gap_start, gap_end in _get_uncovered_ranges(coverage, start_date, end_date):
+                    missing_ranges.setdefault((field, gap_start, gap_end), []).append(ticker)
+
+        requests = []
+        for (field, gap_start, gap_end), tickers in missing_ranges.items():
+            block_starts = pd.date_range(gap_start, gap_end, freq=f"{self._days_per_request}D")
+            for block_start in block_starts:
+                block_end = min(block_start + pd.Timedelta(days=self._days_per_request - 1), gap_end)
+                for i in range(0, len(tickers), self._tickers_per_request):
+                    requests.append((tickers[i:i + self._tickers_per_request], field, block_start, block_end))
+
+        return requests
+
+    def _fetch(self,
+               tickers: List[str],
+               field: str,
+               start_date: pd.Timestamp,
+               end_date: pd.Timestamp) -> pd.DataFrame:
+        """
+        fetch one block of data with its own client, so
+        blocks can be fetched concurrently
+        """
+
+        client = self._client_factory()
+        n = len(tickers)
+        requests = list(zip(tickers, [field] * n, [start_date.strftime("%Y-%m-%d")] * n,
+                            [end_date.strftime("%Y-%m-%d")] * n))
+        requests = pd.DataFrame(requests, columns=client.get_reuters_input_headers())
+        client.add_reuters_data(requests)
+        return client.get_data_as_dataframe()
+
+    def _update_store(self,
+                      start_date: pd.Timestamp,
+                      end_date: pd.Timestamp) -> None:
+
+        requests = self._get_missing_requests(start_date, end_date)
+        if not requests:
+            return
+
+        with ThreadPoolExecutor(self._max_workers) as executor:
+            fetched_data = list(executor.map(lambda request: self._fetch(*request), requests))
+
+        new_data = pd.concat([self._stored_data] + [data[self.STORE_COLUMNS] for data in fetched_data],
+                             ignore_index=True)
+        new_data["date"] = pd.to_datetime(new_data["date"])
+        new_data = new_data.drop_duplicates(subset=["ticker", "field", "date"], keep="last")
+
+        # only mark dates up to the last one returned as covered, so
+        # data the vendor hasn't published yet is requested again
+        for (tickers, field, block_start, block_end), data in zip(requests, fetched_data):
+            last_dates = pd.to_datetime(data["date"]).groupby(data["ticker"]).max()
+            for ticker in tickers:
+                if ticker not in last_dates.index:
+                    continue
+                covered_end = min(block_end, last_dates[ticker])
+                if covered_end >= block_start:
+                    coverage = self._coverage.get((ticker, field), [])
+                    self._coverage[(ticker, field)] = _add_covered_range(coverage, block_start, covered_end)
+
+        self._stored_data = new_data
+        self._save_store()
 
     def _read_raw_data(self,
                        start_date: str,
                        end_date: str) -> Dict[str, pd.DataFrame]:
 
-        n = len(self._tickers)
-        tickers = [v[0] for v in self._tickers.values()]
+        start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        with self._store_lock:
+            self._update_store(start_date, end_date)
+            raw_data = self._stored_data
 
-        price_requests = list(zip(tickers, ["PI"] * n, [start_date] * n, [end_date] * n))
-        price_requests = pd.DataFrame(price_requests, columns=self._mdc.get_reuters_input_headers())
-        self._mdc.add_reuters_data(price_requests)
-
-        market_cap_requests = list(zip(tickers, ["X(MV)~GBP"] * n, [start_date] * n, [end_date] * n))
-        market_cap_requests = pd.DataFrame(market_cap_requests, columns=self._mdc.get_reuters_input_headers())
-        self._mdc.add_reuters_data(market_cap_requests)
-
-        raw_data = self._mdc.get_data_as_dataframe()
-        price_data = raw_data[raw_data["field"] == "PI"]
-        market_cap_data = raw_data[raw_data["field"] == "X(MV)~GBP"]
+        tickers = [v[0] for v in self._tickers.values()]
+        in_request = (raw_data["date"] >= start_date) & (raw_data["date"] <= end_date) & \
+            raw_data["ticker"].isin(tickers)
+        raw_data = raw_data[in_request]
+        price_data = raw_data[raw_data["field"] == self.PRICE_FIELD]
+        market_cap_data = raw_data[raw_data["field"] == self.MARKET_CAP_FIELD]
         return {MarketData.PRICE_DATA: price_data, MarketData.MARKET_CAP_DATA: market_cap_data}
 
     def _validate_data(self, raw_data: Dict[str, pd.DataFrame]) -> None:
-        # TODO: need to add some market data validation
-        pass
+
+        self._check_data_types(raw_data)
+        for data_type, data in raw_data.items():
+            missing_columns = [column for column in self.STORE_COLUMNS if column not in data.columns]
+            if missing_columns:
+                err_msg = f"Reuters {data_type} is missing columns {', '.join(missing_columns)}"
+                logger.error(err_msg)
+                raise ValueError(err_msg)
+
+            missing_tickers = set(v[0] for v in self._tickers.values()) - set(data["ticker"])
+            if missing_tickers:
+                logger.warning(f"No Reuters {data_type} returned for {', '.join(sorted(missing_tickers))}")
 
     def _get_formatted_data(self, raw_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
 
@@ -144,14 +688,108 @@ class ReutersDataReader(BaseDataReader):
 
         all_formatted_data = {}
         for data_type, data in raw_data.items():
-            formatted_data = pd.pivot_table(data, columns="ticker", index="date", values="value")
+            formatted_data = data.pivot(columns="ticker", index="date", values="value")
             formatted_data.index = pd.to_datetime(formatted_data.index)
             formatted_data.rename(columns=rename, inplace=True)
             all_formatted_data.update({data_type: formatted_data})
 
         all_formatted_data[MarketData.MARKET_CAP_DATA] *= cap_scalings
 
-        return all_formatted_data
+        return {data_type: data.astype(self._dtype, copy=False) for data_type, data in all_formatted_data.items()}
+
+
+class MmapDataReader(BaseDataReader):
+    """
+    read in data from a memory-mapped store - a directory with
+    one dense row-major matrix per data type (dates x tickers)
+    plus a small JSON index of dates, tickers and dtype. Data is
+    read through numpy.memmap without copying, so processes
+    reading the same store share one copy in the page cache.
+    Assets are returned in the store's column order, so any
+    ordering of the store's assets, or an evenly spaced subset of
+    them, is still read without copying. Other subsets, or a dtype
+    other than the store's, copy the selected data
+    """
+
+    INDEX_FILE = "index.json"
+    DATA_FILE_SUFFIX = ".bin"
+
+    def __init__(self,
+                 store_path: str,
+                 asset_universe: Optional[List[str]] = None,
+                 dtype: Optional[str] = None):
+
+        self._path = store_path
+        self._asset_universe = None if asset_universe is None else list(asset_universe)
+        self._dtype = dtype
+
+    @classmethod
+    def write_store(cls,
+                    store_path: str,
+                    price_data: pd.DataFrame,
+                    market_cap_data: pd.DataFrame,
+                    dtype: str = "float64") -> None:
+        """
+        write price and market cap data to a store - both
+        are aligned to the union of their dates and tickers
+        """
+
+        dates = price_data.index.union(market_cap_data.index).sort_values()
+        tickers = list(price_data.columns.union(market_cap_data.columns))
+        os.makedirs(store_path, exist_ok=True)
+
+        all_data = {MarketData.PRICE_DATA: price_data, MarketData.MARKET_CAP_DATA: market_cap_data}
+        for data_type, data in all_data.items():
+            values = data.reindex(index=dates, columns=tickers).values.astype(dtype)
+            store = np.memmap(os.path.join(store_path, data_type + cls.DATA_FILE_SUFFIX), dtype=dtype, mode="w+",
+                              shape=values.shape)
+            store[:] = values
+            store.flush()
+            del store
+
+        index = {"dtype": dtype,
+                 "dates": [date.strftime("%Y-%m-%d") for date in pd.to_datetime(dates)],
+                 "tickers": tickers}
+        with open(os.path.join(store_path, cls.INDEX_FILE), "w") as index_file:
+            json.dump(index, index_file)
+
+    def _read_raw_data(self,
+                       start_date: str,
+                       end_date: str) -> Dict[str, pd.DataFrame]:
+
+        with open(os.path.join(self._path, self.INDEX_FILE)) as index_file:
+            index = json.load(index_file)
+
+        dates = pd.DatetimeIndex(index["dates"])
+        tickers = index["tickers"]
+        rows = DateIndex(dates).get_row_slice(start_date, end_date)
+        if self._asset_universe is None:
+            columns = slice(None)
+            selected_tickers = tickers
+        else:
+            column_numbers = sorted(set(tickers.index(asset) for asset in self._asset_universe))
+            columns = _get_column_selection(column_numbers)
+            selected_tickers = [tickers[column] for column in column_numbers]
+
+        raw_data = dict()
+        for data_type in MarketData.get_data_types():
+            store = np.memmap(os.path.join(self._path, data_type + self.DATA_FILE_SUFFIX), dtype=index["dtype"],
+                              mode="r", shape=(len(dates), len(tickers)))
+            raw_data[data_type] = pd.DataFrame(store[rows, columns], index=dates[rows], columns=selected_tickers,
+                                               copy=False)
+
+        return raw_data
+
+    def _validate_data(self, raw_data: Dict[str, pd.DataFrame]) -> None:
+
+        pass
+
+    def _get_formatted_data(self, raw_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+
+        if self._dtype is None:
+            return raw_data
+
+        return {data_type: data.astype(self._dtype, copy=False) for data_type, data in raw_data.items()}
 
 
 class DataReaderFactory:
@@ -159,11 +797,12 @@ class DataReaderFactory:
     SOURCE_LOCAL = "local"
     SOURCE_SQL = "sql"
     SOURCE_REUTERS = "reuters"
+    SOURCE_MMAP = "mmap"
 
     @classmethod
     def get_valid_sources(cls) -> List[str]:
 
-        return [cls.SOURCE_LOCAL, cls.SOURCE_SQL]
+        return [cls.SOURCE_LOCAL, cls.SOURCE_SQL, cls.SOURCE_MMAP]
 
     @classmethod
     def get_data_reader(cls,
@@ -173,14 +812,90 @@ class DataReaderFactory:
         data_source = config_data.get(Configuration.MARKET_DATA_SOURCE, "Not Defined")
 
         if data_source == cls.SOURCE_LOCAL:
-            return LocalDataReader(config_data[Configuration.MARKET_DATA_FILE_PATH])
+            data_reader = LocalDataReader(config_data[Configuration.MARKET_DATA_FILE_PATH],
+                                          config_data.get(Configuration.USE_CACHE, True),
+                                          asset_universe=list(config_data[Configuration.ASSET_UNIVERSE]),
+                                          pushdown=config_data.get(Configuration.PUSHDOWN, False),
+                                          dtype=config_data.get(Configuration.STORAGE_DTYPE, "float64"))
         elif data_source == cls.SOURCE_SQL:
-            return SqlDataReader()
+            driver = importlib.import_module(config_data.get(Configuration.SQL_DRIVER, "sqlite3"))
+            connection_string = config_data[Configuration.SQL_CONNECTION_STRING]
+            data_reader = SqlDataReader(lambda: driver.connect(connection_string),
+                                        list(config_data[Configuration.ASSET_UNIVERSE]),
+                                        config_data.get(Configuration.SQL_TABLE, "market_data"),
+                                        paramstyle=driver.paramstyle,
+                                        dtype=config_data.get(Configuration.STORAGE_DTYPE, "float64"))
+        elif data_source == cls.SOURCE_MMAP:
+            data_reader = MmapDataReader(config_data[Configuration.MARKET_DATA_FILE_PATH],
+                                         list(config_data[Configuration.ASSET_UNIVERSE]),
+                                         dtype=config_data.get(Configuration.STORAGE_DTYPE, "float64"))
         elif data_source == cls.SOURCE_REUTERS:
-            return ReutersDataReader(config[Configuration.CREDENTIALS],
-                                     config_data[Configuration.ASSET_UNIVERSE])
+            data_reader = ReutersDataReader(config[Configuration.CREDENTIALS],
+                                            config_data[Configuration.ASSET_UNIVERSE],
+                                            config_data.get(Configuration.STORE_PATH),
+                                            dtype=config_data.get(Configuration.STORAGE_DTYPE, "float64"))
         else:
             err_msg = f"Data source '{data_source}' is not recognised - valid sources " \
                 f"are {', '.join(cls.get_valid_sources())}"
             logger.error(err_msg)
             raise ValueError(err_msg)
+
+        data_reader.set_validator(MarketDataValidator(config_data.get(Configuration.STALE_RUN_LENGTH, 5),
+                                                      config_data.get(Configuration.MAX_DAILY_MOVE, 0.5),
+                                                      config_data.get(Configuration.VALIDATION_FIX, DataFix.NONE)))
+        return data_reader
+
+
+def _get_column_selection(columns: List[int]) -> Union[slice, List[int]]:
+    """
+    get an index for the sorted columns - a slice if they are
+    evenly spaced, so indexing gives a view rather than a copy
+    """
+
+    if len(columns) == 1:
+        return slice(columns[0], columns[0] + 1)
+
+    steps = np.diff(columns)
+    if len(columns) > 1 and (steps == steps[0]).all():
+        return slice(columns[0], columns[-1] + 1, int(steps[0]))
+
+    return columns
+
+
+def _get_uncovered_ranges(coverage: List[Tuple[pd.Timestamp, pd.Timestamp]],
+                          start_date: pd.Timestamp,
+                          end_date: pd.Timestamp) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """
+    get the date ranges between start and end date (inclusive)
+    not held in the sorted, disjoint covered ranges
+    """
+
+    one_day = pd.Timedelta(days=1)
+    gaps = []
+    gap_start = start_date
+    for covered_start, covered_end in coverage:
+        if covered_start > gap_start:
+            gaps.append((gap_start, min(end_date, covered_start - one_day)))
+        gap_start = max(gap_start, covered_end + one_day)
+
+    gaps.append((gap_start, end_date))
+    return [(gap_start, gap_end) for gap_start, gap_end in gaps if gap_start <= gap_end]
+
+
+def _add_covered_range(coverage: List[Tuple[pd.Timestamp, pd.Timestamp]],
+                       start_date: pd.Timestamp,
+                       end_date: pd.Timestamp) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """
+    add a date range to sorted, disjoint covered ranges,
+    merging only ranges that overlap or touch
+    """
+
+    one_day = pd.Timedelta(days=1)
+    merged = []
+    for covered_start, covered_end in sorted(coverage + [(start_date, end_date)]):
+        if merged and covered_start <= merged[-1][1] + one_day:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], covered_end))
+        else:
+            merged.append((covered_start, covered_end))
+
+    return merged
@@ -1,28 +1,616 @@
+import numpy as np
 import pandas as pd
+from threading import RLock
+from collections import namedtuple
+from functools import partial
+from typing import Callable, Iterator, List, Optional, Tuple
+from black_litterman.constants import CovarianceEstimator, Frequency, ReturnType
+from black_litterman.market_data.cache import LRUCache, CacheInfo
+from black_litterman.market_data.covariance import BaseCovarianceEstimator, CovarianceEstimatorFactory, \
+    EWMAEstimator, FactorCovariance, FactorModelEstimator, get_nearest_psd_matrix
+from black_litterman.market_data.indexing import PrefixSumIndex, DateIndex, RollingWindowSums
+
+
+_ReturnsState = namedtuple("_ReturnsState", ["returns_data", "price_data", "returns_index", "prefix_sum_index",
+                                             "data_version"])
+_FrequencyStore = namedtuple("_FrequencyStore", ["returns_data", "returns_index", "data_version"])
+
+_PERIOD_CODES = {Frequency.WEEKLY: "W-FRI", Frequency.MONTHLY: "M"}
+_PERIODS_PER_YEAR = {Frequency.WEEKLY: 52, Frequency.MONTHLY: 12}
 
 
 class MarketDataEngine:
+    """
+    returns, market caps and derived covariances for a fixed
+    set of assets, which new dates can be appended to while
+    the engine is in use
+    """
 
     def __init__(self,
                  price_data: pd.DataFrame,
-                 market_cap_data: pd.DataFrame) -> None:
+                 market_cap_data: pd.DataFrame,
+                 cov_cache_size: int = 32,
+                 prefix_sum_stride: Optional[int] = None,
+                 dtype: str = "float64",
+                 lazy_returns: bool = False,
+                 return_type: str = ReturnType.SIMPLE,
+                 annualisation_factor: float = 250,
+                 cov_estimator: str = CovarianceEstimator.SAMPLE,
+                 ewma_decay: float = 0.94,
+                 n_factors: int = 5,
+                 psd_projection: bool = False,
+                 frequency: str = Frequency.DAILY) -> None:
+        """
+        returns and market caps are stored as `dtype`, and with
+        `lazy_returns` returns are only calculated for the windows
+        asked for. Covariances come from `cov_estimator`, at the
+        given return `frequency`, and are annualised by
+        `annualisation_factor` for daily returns
+        """
+
+        self._dtype = np.dtype(dtype)
+        if self._dtype not in [np.float32, np.float64]:
+            raise ValueError(f"Storage dtype must be float32 or float64, got {dtype}")
+
+        if return_type not in ReturnType.get_all_return_types():
+            raise ValueError(f"Return type '{return_type}' is not recognised - valid types "
+                             f"are {', '.join(ReturnType.get_all_return_types())}")
+
+        if lazy_returns and prefix_sum_stride is not None:
+            raise ValueError("Prefix sums need returns for the whole history, so can't be used with lazy returns")
+
+        self._check_estimator(cov_estimator)
+        self._check_frequency(frequency)
+        self._frequency = frequency
+        self._frequency_stores = dict()
+        self._cov_estimator = cov_estimator
+        self._ewma_decay = ewma_decay
+        self._n_factors = n_factors
+        self._psd_projection = psd_projection
+        # fail on bad settings now rather than on the first covariance
+        EWMAEstimator(ewma_decay)
+        FactorModelEstimator(n_factors)
+
+        self._return_type = return_type
+        self._annualisation_factor = annualisation_factor
+        self._lazy_returns = lazy_returns
+
+        price_data = self._sorted_by_date(price_data)
+        self._assets = price_data.columns
+        self._last_prices = self._get_last_prices(price_data, len(price_data))
+        if lazy_returns:
+            self._price_data = price_data
+            self._returns_data = None
+        else:
+            self._price_data = None
+            self._returns_data = self._calculate_returns(price_data, None)
+
+        self._market_cap_data = self._sorted_by_date(market_cap_data).astype(self._dtype, copy=False)
+        self._returns_index = DateIndex(price_data.index)
+        self._market_cap_index = DateIndex(self._market_cap_data.index)
+        self._cov_cache = LRUCache(cov_cache_size)
+        self._returns_cache = LRUCache(cov_cache_size if lazy_returns else 0)
+        self._prefix_sum_index = None
+        if prefix_sum_stride is not None:
+            self._prefix_sum_index = PrefixSumIndex(self._returns_data.values, prefix_sum_stride)
+
+        self._update_lock = RLock()
+        self._data_version = 0
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        del state["_update_lock"]
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self._update_lock = RLock()
+
+    @staticmethod
+    def _get_last_prices(price_data: pd.DataFrame,
+                         end_row: int) -> pd.Series:
+        """
+        get the last observed price of each asset in the rows
+        before end_row, looking back in growing blocks so only
+        the assets without a recent price are searched further
+        """
+
+        last_prices = np.full(price_data.shape[1], np.nan)
+        unresolved = np.arange(price_data.shape[1])
+        block_length = 16
+        while len(unresolved) and end_row > 0:
+            start_row = max(0, end_row - block_length)
+            block = price_data.values[start_row:end_row][:, unresolved]
+            observed = ~np.isnan(block)
+            found = observed.any(axis=0)
+            last_rows = len(block) - 1 - np.argmax(observed[::-1], axis=0)
+            last_prices[unresolved[found]] = block[last_rows[found], np.flatnonzero(found)]
+            unresolved = unresolved[~found]
+            end_row = start_row
+            block_length *= 2
+
+        return pd.Series(last_prices, index=price_data.columns)
+
+    def _calculate_returns(self,
+                           price_data: pd.DataFrame,
+                           previous_prices: Optional[pd.Series]) -> pd.DataFrame:
+        """
+        calculate returns in float64 and store them in the storage
+        dtype - missing prices are filled forward as pct_change
+        does, and the first return is measured from the previous
+        prices if given (otherwise it is missing)
+        """
+
+        prices = price_data.astype(np.float64, copy=False).ffill()
+        if previous_prices is not None:
+            prices = prices.fillna(previous_prices)
+
+        price_values = prices.values
+        previous_values = np.full(price_values.shape[1], np.nan) if previous_prices is None \
+            else previous_prices.values.astype(np.float64)
+
+        returns = np.empty(price_values.shape)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if len(price_values):
+                np.divide(price_values[0], previous_values, out=returns[0])
+                np.divide(price_values[1:], price_values[:-1], out=returns[1:])
+
+            if self._return_type == ReturnType.LOG:
+                np.log(returns, out=returns)
+            else:
+                returns -= 1
+
+        return pd.DataFrame(returns.astype(self._dtype, copy=False), index=price_data.index,
+                            columns=price_data.columns)
+
+    def _get_returns_state(self) -> _ReturnsState:
+
+        with self._update_lock:
+            return _ReturnsState(self._returns_data, self._price_data, self._returns_index,
+                                 self._prefix_sum_index, self._data_version)
+
+    def _get_returns_for_rows(self,
+                              state: _ReturnsState,
+                              rows: slice) -> pd.DataFrame:
+        """
+        get the returns for a slice of rows - from the stored
+        returns, or calculated from prices and cached in lazy mode
+        """
 
-        self._returns_data = price_data.pct_change(1)
-        self._market_cap_data = market_cap_data
+        if state.returns_data is not None:
+            return state.returns_data.iloc[rows]
+
+        # returns for existing rows never change on append, so
+        # rows are a safe cache key whatever the data version
+        cache_key = (rows.start, rows.stop)
+        returns = self._returns_cache.get(cache_key)
+        if returns is None:
+            previous_prices = None
+            if rows.start > 0:
+                previous_prices = self._get_last_prices(state.price_data, rows.start)
+
+            returns = self._calculate_returns(state.price_data.iloc[rows], previous_prices)
+            self._returns_cache.put(cache_key, returns)
+
+        return returns
+
+    @staticmethod
+    def _get_dates(state: _ReturnsState) -> pd.DatetimeIndex:
+
+        return state.price_data.index if state.returns_data is None else state.returns_data.index
+
+    def _get_market_cap_state(self) -> Tuple[pd.DataFrame, DateIndex]:
+
+        with self._update_lock:
+            return self._market_cap_data, self._market_cap_index
+
+    def get_last_date(self) -> Optional[pd.Timestamp]:
+        """
+        get the last date for which both prices and market
+        caps are held, or None if either is empty
+        """
+
+        dates = self._get_dates(self._get_returns_state())
+        market_cap_data, _ = self._get_market_cap_state()
+        if dates.empty or market_cap_data.empty:
+            return None
+
+        return min(dates[-1], market_cap_data.index[-1])
+
+    def append(self,
+               price_data: pd.DataFrame,
+               market_cap_data: pd.DataFrame) -> None:
+        """
+        extend the engine with new prices and market caps - rows
+        on or before the dates already held are ignored. Only the
+        new returns are calculated, and only cached covariances
+        for windows ending on or after the first new date are
+        dropped. Readers see the data from before or after an
+        append, never a mix of the two
+        """
+
+        with self._update_lock:
+            state = self._get_returns_state()
+            current_data = state.price_data if state.returns_data is None else state.returns_data
+            new_prices = self._get_new_rows(price_data, current_data)
+            new_market_caps = self._get_new_rows(market_cap_data, self._market_cap_data)
+
+            if not new_prices.empty:
+                if self._lazy_returns:
+                    self._price_data = pd.concat([state.price_data, new_prices])
+                else:
+                    # measure the first new return from the last price held
+                    previous_prices = None if current_data.empty else self._last_prices
+                    new_returns = self._calculate_returns(new_prices, previous_prices)
+                    self._returns_data = pd.concat([state.returns_data, new_returns])
+                    if state.prefix_sum_index is not None:
+                        self._prefix_sum_index = state.prefix_sum_index.extend(new_returns.values)
+
+                self._returns_index = state.returns_index.extend(new_prices.index)
+                last_prices = self._get_last_prices(new_prices, len(new_prices))
+                self._last_prices = last_prices.fillna(self._last_prices)
+                self._data_version += 1
+
+                first_new_date = new_prices.index[0]
+                # new dates can extend the last period of lower
+                # frequency returns, so those are all dropped
+                self._cov_cache.invalidate(lambda key: key[1] >= first_new_date or key[-1] != Frequency.DAILY)
+
+            if not new_market_caps.empty:
+                self._market_cap_data = pd.concat([self._market_cap_data, new_market_caps.astype(self._dtype)])
+                self._market_cap_index = self._market_cap_index.extend(new_market_caps.index)
+
+    @staticmethod
+    def _get_new_rows(new_data: pd.DataFrame,
+                      current_data: pd.DataFrame) -> pd.DataFrame:
+
+        if set(new_data.columns) != set(current_data.columns):
+            raise ValueError("Appended data must be for the same assets as the data already held")
+
+        new_data = MarketDataEngine._sorted_by_date(new_data)[current_data.columns]
+        if not current_data.empty:
+            new_data = new_data[new_data.index > current_data.index[-1]]
+
+        return new_data
+
+    @staticmethod
+    def _sorted_by_date(data: pd.DataFrame) -> pd.DataFrame:
+
+        # avoid sort_index on sorted data as it copies, which
+        # would break zero-copy use of memory-mapped data
+        if data.index.is_monotonic_increasing:
+            return data
+
+        return data.sort_index()
 
     def get_annualised_cov_matrix(self,
                                   start_date: str,
-                                  end_date: str):
+                                  end_date: str,
+                                  estimator: Optional[str] = None,
+                                  frequency: Optional[str] = None) -> pd.DataFrame:
         """
         get cov matrix based on returns for the
-        given dates (inclusive)
+        given dates (inclusive), using the engine's
+        estimator and return frequency unless others
+        are given - results are cached and shared
+        between callers, so should be treated as
+        read-only
         """
 
-        date_mask = (self._returns_data.index >= start_date) & (self._returns_data.index <= end_date)
-        returns_for_dates = self._returns_data[date_mask]
-        covariance_for_dates = returns_for_dates.cov() * 250
+        if estimator is None:
+            estimator = self._cov_estimator
+        self._check_estimator(estimator)
+        if frequency is None:
+            frequency = self._frequency
+        self._check_frequency(frequency)
+
+        cache_key = (pd.Timestamp(start_date), pd.Timestamp(end_date), estimator, frequency)
+        covariance_for_dates = self._cov_cache.get(cache_key)
+        if covariance_for_dates is None:
+            state = self._get_returns_state()
+            covariance_for_dates = self._calculate_annualised_cov_matrix(state, start_date, end_date, estimator,
+                                                                         frequency)
+            with self._update_lock:
+                # don't cache a result calculated from data that
+                # has since been appended to
+                if state.data_version == self._data_version:
+                    self._cov_cache.put(cache_key, covariance_for_dates)
+
         return covariance_for_dates
 
+    def _calculate_annualised_cov_matrix(self,
+                                         state: _ReturnsState,
+                                         start_date: str,
+                                         end_date: str,
+                                         estimator: str,
+                                         frequency: str) -> pd.DataFrame:
+
+        returns_index, get_returns_for_rows = self._get_returns_panel(state, frequency)
+        rows = returns_index.get_row_slice(start_date, end_date)
+        if estimator == CovarianceEstimator.SAMPLE and state.prefix_sum_index is not None \
+                and frequency == Frequency.DAILY:
+            covariance = state.prefix_sum_index.get_covariance(rows.start, rows.stop)
+            return self._annualise_cov_matrix(covariance)
+
+        # estimators accumulate in float64 whatever the storage dtype
+        returns_for_dates = get_returns_for_rows(rows)
+        covariance = self._get_estimator(estimator).estimate(returns_for_dates.values)
+        return self._annualise_cov_matrix(covariance, frequency)
+
+    @staticmethod
+    def _check_frequency(frequency: str) -> None:
+
+        if frequency not in Frequency.get_all_frequencies():
+            raise ValueError(f"Frequency '{frequency}' is not recognised - valid frequencies "
+                             f"are {', '.join(Frequency.get_all_frequencies())}")
+
+    def _get_returns_panel(self,
+                           state: _ReturnsState,
+                           frequency: str) -> Tuple[DateIndex, Callable[[slice], pd.DataFrame]]:
+        """
+        get the date index of the returns at the given
+        frequency, and a function that gets their rows
+        """
+
+        if frequency == Frequency.DAILY:
+            return state.returns_index, partial(self._get_returns_for_rows, state)
+
+        store = self._get_frequency_store(state, frequency)
+        return store.returns_index, lambda rows: store.returns_data.iloc[rows]
+
+    def _get_frequency_store(self,
+                             state: _ReturnsState,
+                             frequency: str) -> _FrequencyStore:
+        """
+        get the returns at a lower frequency, building them
+        from the daily returns if the data has changed since
+        they were last built
+        """
+
+        store = self._frequency_stores.get(frequency)
+        if store is None or store.data_version != state.data_version:
+            daily_returns = self._get_returns_for_rows(state, slice(0, len(state.returns_index)))
+            returns_data = self._aggregate_returns(daily_returns, frequency)
+            store = _FrequencyStore(returns_data, DateIndex(returns_data.index), state.data_version)
+            with self._update_lock:
+                if state.data_version == self._data_version:
+                    self._frequency_stores[frequency] = store
+
+        return store
+
+    def _aggregate_returns(self,
+                           daily_returns: pd.DataFrame,
+                           frequency: str) -> pd.DataFrame:
+        """
+        compound daily returns into returns over each period - as
+        missing prices are filled forward, a daily return is only
+        missing before an asset's first price, so a period with
+        any missing return has no price at the previous period
+        end and its return is missing. Sums are taken in float64
+        whatever the storage dtype
+        """
+
+        periods = daily_returns.index.to_period(_PERIOD_CODES[frequency])
+        growth = daily_returns.astype(np.float64)
+        if self._return_type == ReturnType.SIMPLE:
+            growth = np.log1p(growth)
+
+        period_returns = growth.groupby(periods).sum()
+        period_returns = period_returns.mask(growth.isna().groupby(periods).any())
+        if self._return_type == ReturnType.SIMPLE:
+            period_returns = np.expm1(period_returns)
+
+        last_dates = daily_returns.index.to_series().groupby(periods).last()
+        period_returns.index = pd.DatetimeIndex(last_dates.values)
+        return period_returns.astype(self._dtype, copy=False)
+
+    @staticmethod
+    def _check_estimator(estimator: str) -> None:
+
+        if estimator not in CovarianceEstimator.get_all_estimators():
+            raise ValueError(f"Covariance estimator '{estimator}' is not recognised - valid estimators "
+                             f"are {', '.join(CovarianceEstimator.get_all_estimators())}")
+
+    def _get_estimator(self,
+                       estimator: str) -> BaseCovarianceEstimator:
+
+        return CovarianceEstimatorFactory.get_estimator(estimator, self._ewma_decay, self._n_factors)
+
+    def get_annualised_factor_covariance(self,
+                                         start_date: str,
+                                         end_date: str,
+                                         frequency: Optional[str] = None) -> FactorCovariance:
+        """
+        get the factor model covariance based on returns for
+        the given dates (inclusive) as loadings and specific
+        variances - cached in the same way as cov matrices
+        """
+
+        if frequency is None:
+            frequency = self._frequency
+        self._check_frequency(frequency)
+
+        cache_key = (pd.Timestamp(start_date), pd.Timestamp(end_date), FactorCovariance.__name__, frequency)
+        factor_covariance = self._cov_cache.get(cache_key)
+        if factor_covariance is None:
+            state = self._get_returns_state()
+            returns_index, get_returns_for_rows = self._get_returns_panel(state, frequency)
+            returns_for_dates = get_returns_for_rows(returns_index.get_row_slice(start_date, end_date))
+            factor_covariance = FactorModelEstimator(self._n_factors).estimate_factors(returns_for_dates.values)
+            factor_covariance = self._annualise_factor_covariance(factor_covariance, frequency)
+            with self._update_lock:
+                if state.data_version == self._data_version:
+                    self._cov_cache.put(cache_key, factor_covariance)
+
+        return factor_covariance
+
+    def _get_periods_per_year(self,
+                              frequency: str) -> float:
+
+        return _PERIODS_PER_YEAR.get(frequency, self._annualisation_factor)
+
+    def _annualise_cov_matrix(self,
+                              covariance: np.ndarray,
+                              frequency: str = Frequency.DAILY) -> pd.DataFrame:
+        """
+        annualise a per-period covariance, first projecting
+        it to be positive semi-definite if configured
+        """
+
+        if self._psd_projection:
+            covariance = get_nearest_psd_matrix(covariance)
+
+        return pd.DataFrame(covariance * self._get_periods_per_year(frequency), index=self._assets,
+                            columns=self._assets)
+
+    def _annualise_factor_covariance(self,
+                                     factor_covariance: FactorCovariance,
+                                     frequency: str) -> FactorCovariance:
+
+        factor_covariance = factor_covariance.scaled(self._get_periods_per_year(frequency))
+        factor_covariance.assets = self._assets
+        return factor_covariance
+
+    def get_rolling_cov_matrices(self,
+                                 end_dates: List[str],
+                                 window_length: Optional[int] = None,
+                                 start_date: Optional[str] = None,
+                                 estimator: Optional[str] = None,
+                                 frequency: Optional[str] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """
+        walk forward through the end dates, yielding the annualised
+        cov matrix for each - over the last `window_length` returns
+        (at the given frequency) up to the date if given, otherwise
+        over an expanding window from the start date. Sample
+        covariances are found by updating the previous window
+        rather than from scratch, as are EWMA covariances over
+        expanding windows
+        """
+
+        if estimator is None:
+            estimator = self._cov_estimator
+        self._check_estimator(estimator)
+        if frequency is None:
+            frequency = self._frequency
+        self._check_frequency(frequency)
+
+        state = self._get_returns_state()
+        returns_index, get_returns_for_rows = self._get_returns_panel(state, frequency)
+        windows = self._get_rolling_windows(returns_index, end_dates, window_length, start_date)
+
+        if estimator != CovarianceEstimator.SAMPLE:
+            yield from self._get_rolling_estimated_cov_matrices(get_returns_for_rows, windows, estimator, frequency)
+            return
+
+        # only the returns spanned by the windows are needed
+        first_row = min([start_row for _, start_row, _ in windows], default=0)
+        window_sums = None
+        if state.prefix_sum_index is None or frequency != Frequency.DAILY:
+            last_row = max([end_row for _, _, end_row in windows], default=0)
+            window_sums = RollingWindowSums(get_returns_for_rows(slice(first_row, last_row)).values)
+
+        for end_date, start_row, end_row in windows:
+            if window_sums is None:
+                covariance = state.prefix_sum_index.get_covariance(start_row, end_row)
+            else:
+                window_sums.move_to(start_row - first_row, end_row - first_row)
+                covariance = window_sums.get_covariance()
+
+            yield end_date, self._annualise_cov_matrix(covariance, frequency)
+
+    def get_rolling_factor_covariances(self,
+                                       end_dates: List[str],
+                                       window_length: Optional[int] = None,
+                                       start_date: Optional[str] = None,
+                                       frequency: Optional[str] = None) -> Iterator[Tuple[str, FactorCovariance]]:
+        """
+        walk forward through the end dates as for
+        get_rolling_cov_matrices, yielding the annualised
+        factor model covariance for each window
+        """
+
+        if frequency is None:
+            frequency = self._frequency
+        self._check_frequency(frequency)
+
+        state = self._get_returns_state()
+        returns_index, get_returns_for_rows = self._get_returns_panel(state, frequency)
+        factor_estimator = FactorModelEstimator(self._n_factors)
+        windows = self._get_rolling_windows(returns_index, end_dates, window_length, start_date)
+        for end_date, start_row, end_row in windows:
+            returns = get_returns_for_rows(slice(start_row, end_row)).values
+            yield end_date, self._annualise_factor_covariance(factor_estimator.estimate_factors(returns), frequency)
+
+    @staticmethod
+    def _get_rolling_windows(returns_index: DateIndex,
+                             end_dates: List[str],
+                             window_length: Optional[int],
+                             start_date: Optional[str]) -> List[Tuple[str, int, int]]:
+        """
+        get the (end date, start row, end row) of the
+        returns in the window for each end date
+        """
+
+        if window_length is None and start_date is None:
+            raise ValueError("Either a window length or a start date is needed for rolling covariances")
+
+        windows = []
+        for end_date in end_dates:
+            end_row = returns_index.get_row_count_on_or_before(end_date)
+            if window_length is None:
+                start_row = min(returns_index.get_row_slice(start_date, end_date).start, end_row)
+            else:
+                start_row = max(0, end_row - window_length)
+            windows.append((end_date, start_row, end_row))
+
+        return windows
+
+    def _get_rolling_estimated_cov_matrices(self,
+                                            get_returns_for_rows: Callable[[slice], pd.DataFrame],
+                                            windows: List[Tuple[str, int, int]],
+                                            estimator: str,
+                                            frequency: str) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """
+        estimate the cov matrix for each window, moving an EWMA
+        estimate on a day at a time where a window extends the
+        previous one
+        """
+
+        cov_estimator = self._get_estimator(estimator)
+        covariance, previous_start_row, previous_end_row = None, None, None
+        for end_date, start_row, end_row in windows:
+            if isinstance(cov_estimator, EWMAEstimator) and covariance is not None \
+                    and start_row == previous_start_row and end_row >= previous_end_row:
+                new_returns = get_returns_for_rows(slice(previous_end_row, end_row)).values
+                for n_dates, returns in enumerate(new_returns, previous_end_row - start_row):
+                    covariance = cov_estimator.update(covariance, returns, n_dates)
+            else:
+                returns = get_returns_for_rows(slice(start_row, end_row)).values
+                covariance = cov_estimator.estimate(returns)
+
+            previous_start_row, previous_end_row = start_row, end_row
+            yield end_date, self._annualise_cov_matrix(covariance, frequency)
+
+    def get_cov_cache_info(self) -> CacheInfo:
+        """
+        get hit/miss statistics for the
+        covariance cache
+        """
+
+        return self._cov_cache.cache_info()
+
+    def invalidate_cache(self) -> None:
+        """
+        drop all cached results - must be called whenever
+        the underlying market data changes
+        """
+
+        self._cov_cache.invalidate()
+        with self._update_lock:
+            self._frequency_stores = dict()
+
     def get_market_weights(self,
                            selected_date: str) -> pd.Series:
         """
@@ -30,7 +618,9 @@ class MarketDataEngine:
         on index market caps
         """
 
-        market_cap_for_date = self._market_cap_data[self._market_cap_data.index <= selected_date].iloc[-1, :]
+        market_cap_data, market_cap_index = self._get_market_cap_state()
+        row = market_cap_index.get_last_row_on_or_before(selected_date)
+        market_cap_for_date = market_cap_data.iloc[row, :].astype(np.float64)
         market_weights = market_cap_for_date / market_cap_for_date.sum()
         return market_weights
 
@@ -40,9 +630,17 @@ class MarketDataEngine:
                             risk_aversion: float) -> pd.Series:
         """
         get the market clearing returns for the given
-        level of risk aversion
+        level of risk aversion - under the factor model
+        estimator these go through the factor structure,
+        so the full cov matrix is never built
         """
 
+        if self._cov_estimator == CovarianceEstimator.FACTOR:
+            factor_covariance = self.get_annualised_factor_covariance(start_date, end_date)
+            market_weights = self.get_market_weights(end_date).loc[factor_covariance.assets]
+            market_returns = factor_covariance.dot(market_weights.values.astype(np.float64)) * risk_aversion
+            return pd.Series(market_returns, index=factor_covariance.assets)
+
         cov_matrix = self.get_annualised_cov_matrix(start_date, end_date)
         market_weights = self.get_market_weights(end_date)
         market_returns = cov_matrix.dot(market_weights).mul(risk_aversion)
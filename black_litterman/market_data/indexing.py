@@ -0,0 +1,326 @@
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from typing import List, Optional, Tuple, Union
+
+DateLike = Union[str, pd.Timestamp]
+
+
+@lru_cache(maxsize=1024)
+def _parse_date(date: DateLike) -> np.datetime64:
+
+    return pd.Timestamp(date).to_datetime64()
+
+
+class DateIndex:
+    """
+    binary search lookups over a sorted set of dates, so
+    point-in-time and window lookups are O(log T)
+    """
+
+    def __init__(self,
+                 dates: pd.DatetimeIndex):
+
+        if not dates.is_monotonic_increasing:
+            raise ValueError("Dates must be sorted in increasing order")
+
+        self._dates = dates.values
+
+    def __len__(self) -> int:
+
+        return len(self._dates)
+
+    def extend(self,
+               dates: pd.DatetimeIndex) -> "DateIndex":
+        """
+        get a new index with the given dates, which must all
+        be later than the existing ones, added on the end
+        """
+
+        if len(dates) == 0:
+            return self
+
+        if not dates.is_monotonic_increasing or (len(self._dates) and dates.values[0] <= self._dates[-1]):
+            raise ValueError("Dates must be sorted in increasing order")
+
+        extended = DateIndex.__new__(DateIndex)
+        extended._dates = np.concatenate([self._dates, dates.values])
+        return extended
+
+    def get_row_slice(self,
+                      start_date: DateLike,
+                      end_date: DateLike) -> slice:
+        """
+        get the slice of rows falling between the
+        given dates (inclusive)
+        """
+
+        start_row = self._dates.searchsorted(_parse_date(start_date), side="left")
+        end_row = self._dates.searchsorted(_parse_date(end_date), side="right")
+        return slice(int(start_row), int(max(start_row, end_row)))
+
+    def get_row_count_on_or_before(self,
+                                   date: DateLike) -> int:
+        """
+        get the number of rows dated on or
+        before the given date
+        """
+
+        return int(self._dates.searchsorted(_parse_date(date), side="right"))
+
+    def get_last_row_on_or_before(self,
+                                  date: DateLike) -> int:
+        """
+        get the position of the last row dated on
+        or before the given date
+        """
+
+        row = self.get_row_count_on_or_before(date) - 1
+        if row < 0:
+            raise ValueError(f"No data on or before {date}")
+
+        return int(row)
+
+
+class PrefixSumIndex:
+    """
+    checkpointed prefix sums of the pairwise observation counts,
+    sums and cross-products of a returns panel, so the pairwise
+    complete sample covariance of any block of rows can be found
+    as the difference of two prefix sums.
+
+    A checkpoint is stored every `stride` rows, so memory is
+    roughly 3 * (T / stride) * N^2 floats and each window costs
+    O(stride * N^2) on top of the O(N^2) difference - a stride of
+    1 is fastest, larger strides suit very wide universes
+    """
+
+    def __init__(self,
+                 returns: np.ndarray,
+                 stride: int = 1):
+
+        if stride < 1:
+            raise ValueError(f"Prefix sum stride must be at least 1, got {stride}")
+
+        self._stride = stride
+        self._shift = _get_column_means(returns)
+        self._values, self._valid = _centre_returns(returns, self._shift)
+        self._checkpoints = _accumulate_block_sums(self._values, self._valid, stride, None)
+
+    @property
+    def n_rows(self) -> int:
+
+        return self._values.shape[0]
+
+    def extend(self,
+               returns: np.ndarray) -> "PrefixSumIndex":
+        """
+        get a new index covering the existing rows followed by the
+        given rows - existing checkpoints are reused, so the cost is
+        O(new rows * N^2), and this index is left untouched for any
+        readers still using it
+        """
+
+        extended = PrefixSumIndex.__new__(PrefixSumIndex)
+        extended._stride = self._stride
+        extended._shift = self._shift
+
+        # rows after the last checkpoint are summed again
+        # along with the new ones
+        first_row = (len(self._checkpoints[0]) - 1) * self._stride
+        new_values, new_valid = _centre_returns(returns, self._shift)
+        extended._values = np.concatenate([self._values, new_values])
+        extended._valid = np.concatenate([self._valid, new_valid])
+
+        new_checkpoints = _accumulate_block_sums(extended._values[first_row:], extended._valid[first_row:],
+                                                 self._stride, [checkpoint[-1] for checkpoint in self._checkpoints])
+        extended._checkpoints = tuple(np.concatenate([checkpoint, new_checkpoint[1:]])
+                                      for checkpoint, new_checkpoint in zip(self._checkpoints, new_checkpoints))
+        return extended
+
+    def _get_prefix_sums(self,
+                         row: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        get the counts, sums and cross-products over the
+        first `row` rows of the panel
+        """
+
+        block = row // self._stride
+        block_start = block * self._stride
+        values = self._values[block_start:row].astype(np.float64)
+        valid = self._valid[block_start:row].astype(np.float64)
+
+        counts = self._checkpoints[0][block] + valid.T.dot(valid)
+        sums = self._checkpoints[1][block] + values.T.dot(valid)
+        cross_products = self._checkpoints[2][block] + values.T.dot(values)
+        return counts, sums, cross_products
+
+    def get_covariance(self,
+                       start_row: int,
+                       end_row: int) -> np.ndarray:
+        """
+        get the pairwise complete sample covariance of rows
+        start_row (inclusive) to end_row (exclusive), matching
+        pandas' DataFrame.cov
+        """
+
+        end_sums = self._get_prefix_sums(end_row)
+        start_sums = self._get_prefix_sums(start_row)
+        counts, sums, cross_products = [end - start for end, start in zip(end_sums, start_sums)]
+        return _covariance_from_sums(counts, sums, cross_products)
+
+
+class RollingWindowSums:
+    """
+    running pairwise counts, sums and cross-products of a
+    returns panel over a window of rows, updated as the window
+    moves by adding the rows that enter and subtracting the
+    rows that leave - a window that slides forward by d rows
+    costs O(d * N^2) whatever its length
+    """
+
+    def __init__(self,
+                 returns: np.ndarray):
+
+        self._values, self._valid = _centre_returns(returns)
+        n_assets = returns.shape[1]
+        self._start_row = 0
+        self._end_row = 0
+        self._sums = [np.zeros((n_assets, n_assets)) for _ in range(3)]
+
+    def _accumulate(self,
+                    start_row: int,
+                    end_row: int,
+                    sign: float) -> None:
+
+        values = self._values[start_row:end_row].astype(np.float64)
+        valid = self._valid[start_row:end_row].astype(np.float64)
+        self._sums[0] += sign * valid.T.dot(valid)
+        self._sums[1] += sign * values.T.dot(valid)
+        self._sums[2] += sign * values.T.dot(values)
+
+    def move_to(self,
+                start_row: int,
+                end_row: int) -> None:
+        """
+        move the window to cover rows start_row (inclusive)
+        to end_row (exclusive)
+        """
+
+        if start_row >= self._end_row or end_row <= self._start_row:
+            # no overlap - cheaper to start again
+            for sums in self._sums:
+                sums[:] = 0
+            self._accumulate(start_row, end_row, 1.)
+        else:
+            if start_row < self._start_row:
+                self._accumulate(start_row, self._start_row, 1.)
+            elif start_row > self._start_row:
+                self._accumulate(self._start_row, start_row, -1.)
+
+            if end_row > self._end_row:
+                self._accumulate(self._end_row, end_row, 1.)
+            elif end_row < self._end_row:
+                self._accumulate(end_row, self._end_row, -1.)
+
+        self._start_row = start_row
+        self._end_row = end_row
+
+    def get_covariance(self) -> np.ndarray:
+        """
+        get the pairwise complete sample covariance of
+        the current window
+        """
+
+        return _covariance_from_sums(*self._sums)
+
+
+def get_pairwise_covariance(returns: np.ndarray) -> np.ndarray:
+    """
+    get the pairwise complete sample covariance of a returns
+    panel, matching pandas' DataFrame.cov - the pairwise counts,
+    sums and cross-products are each one masked matrix product
+    """
+
+    values, valid = _centre_returns(returns)
+    values = values.astype(np.float64, copy=False)
+    valid = valid.astype(np.float64)
+    return _covariance_from_sums(valid.T.dot(valid), values.T.dot(valid), values.T.dot(values))
+
+
+def _get_column_means(returns: np.ndarray) -> np.ndarray:
+
+    valid = ~np.isnan(returns)
+    column_counts = valid.sum(axis=0)
+    column_sums = np.where(valid, returns, 0.).sum(axis=0, dtype=np.float64)
+    return np.where(column_counts > 0, column_sums / np.maximum(column_counts, 1), 0.)
+
+
+def _centre_returns(returns: np.ndarray,
+                    shift: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    centre each column (on its mean unless a shift is given) and
+    zero out missing values, returning the centred values and a
+    validity mask - centring limits cancellation error when
+    accumulating cross-products, and covariance is shift invariant.
+
+    Centred values keep the dtype of the returns (so float32
+    returns stay compact) and the mask is boolean - both are
+    cast to float64 before anything is accumulated
+    """
+
+    if shift is None:
+        shift = _get_column_means(returns)
+
+    valid = ~np.isnan(returns)
+    values = np.where(valid, returns - shift, 0.).astype(_get_storage_dtype(returns), copy=False)
+    return values, valid
+
+
+def _get_storage_dtype(returns: np.ndarray) -> np.dtype:
+
+    return returns.dtype if np.issubdtype(returns.dtype, np.floating) else np.dtype(np.float64)
+
+
+def _accumulate_block_sums(values: np.ndarray,
+                           valid: np.ndarray,
+                           stride: int,
+                           initial: Optional[List[np.ndarray]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    sum each complete block of `stride` rows with batched matrix
+    products and accumulate the block totals on top of the initial
+    counts, sums and cross-products (zero if not given)
+    """
+
+    n_rows, n_assets = values.shape
+    n_blocks = n_rows // stride
+    values = values[:n_blocks * stride].astype(np.float64, copy=False).reshape(n_blocks, stride, n_assets)
+    valid = valid[:n_blocks * stride].astype(np.float64).reshape(n_blocks, stride, n_assets)
+
+    checkpoints = []
+    for i, (left, right) in enumerate([(valid, valid), (values, valid), (values, values)]):
+        block_sums = np.matmul(np.swapaxes(left, 1, 2), right)
+        prefix_sums = np.zeros((n_blocks + 1, n_assets, n_assets))
+        if initial is not None:
+            prefix_sums[0] = initial[i]
+        np.cumsum(block_sums, axis=0, out=prefix_sums[1:])
+        prefix_sums[1:] += prefix_sums[0]
+        checkpoints.append(prefix_sums)
+
+    return tuple(checkpoints)
+
+
+def _covariance_from_sums(counts: np.ndarray,
+                          sums: np.ndarray,
+                          cross_products: np.ndarray) -> np.ndarray:
+    """
+    pairwise complete sample covariance from the pairwise counts,
+    sums (sums[i, j] is the sum of asset i over rows where j is
+    observed) and cross-products
+    """
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = (cross_products - sums * sums.T / counts) / (counts - 1)
+
+    covariance[counts < 2] = np.nan
+    return covariance
@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Dict, Tuple
+from black_litterman.constants import DataFix, MarketData
+
+
+@dataclass(frozen=True)
+class DataQualityReport:
+    """
+    counts of the problems found in a set of
+    market data, and the assets affected
+    """
+
+    n_dates: int
+    n_assets: int
+    missing_prices: int
+    missing_market_caps: int
+    non_positive_prices: int
+    non_positive_market_caps: int
+    stale_prices: int
+    price_jumps: int
+    misaligned_dates: int
+    duplicate_dates: int
+    flagged_assets: Tuple[str, ...]
+    fixed_points: int = 0
+
+    def is_clean(self) -> bool:
+        """
+        check whether any prices or market caps are non-positive,
+        stale or jump, or whether any dates are misaligned or
+        duplicated - missing values on their own are expected,
+        e.g. before an asset is listed
+        """
+
+        return not any([self.non_positive_prices, self.non_positive_market_caps, self.stale_prices,
+                        self.price_jumps, self.misaligned_dates, self.duplicate_dates])
+
+    def get_summary(self) -> str:
+
+        return f"{self.n_dates} dates x {self.n_assets} assets: {self.missing_prices} missing prices, " \
+            f"{self.missing_market_caps} missing market caps, {self.non_positive_prices} non-positive prices, " \
+            f"{self.non_positive_market_caps} non-positive market caps, {self.stale_prices} stale prices, " \
+            f"{self.price_jumps} price jumps, {self.misaligned_dates} misaligned dates, " \
+            f"{self.duplicate_dates} duplicate dates, {self.fixed_points} points fixed " \
+            f"(flagged assets: {', '.join(self.flagged_assets) or 'none'})"
+
+
+class MarketDataValidator:
+    """
+    vectorised checks on wide price and market cap data, with
+    every check a whole-array NumPy operation so it is cheap
+    enough to run on each load.
+
+    A price is stale if it is unchanged for `stale_run_length`
+    consecutive dates, and jumps if it moves by more than
+    `max_daily_move` (as a fraction) from the previous date.
+    Non-positive values and isolated bad prints - jumps which
+    reverse the next day - can be forward filled or dropped
+    (set to missing), in which case duplicate dates are also
+    dropped, keeping the last
+    """
+
+    def __init__(self,
+                 stale_run_length: int = 5,
+                 max_daily_move: float = 0.5,
+                 fix: str = DataFix.NONE):
+
+        if stale_run_length < 2:
+            raise ValueError(f"Stale run length must be at least 2, got {stale_run_length}")
+
+        if fix not in DataFix.get_all_fixes():
+            raise ValueError(f"Data fix '{fix}' is not recognised - valid fixes "
+                             f"are {', '.join(DataFix.get_all_fixes())}")
+
+        self._stale_run_length = stale_run_length
+        self._max_daily_move = max_daily_move
+        self._fix = fix
+
+    def validate(self,
+                 market_data: Dict[str, pd.DataFrame]) -> Tuple[Dict[str, pd.DataFrame], DataQualityReport]:
+        """
+        check the price and market cap data, returning the
+        data (fixed if requested) and a report of what was found
+        """
+
+        price_data = market_data[MarketData.PRICE_DATA]
+        market_cap_data = market_data[MarketData.MARKET_CAP_DATA]
+        prices = price_data.values
+        market_caps = market_cap_data.values
+
+        missing_prices = np.isnan(prices)
+        missing_market_caps = np.isnan(market_caps)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            non_positive_prices = prices <= 0
+            non_positive_market_caps = market_caps <= 0
+            stale_prices = self._get_stale_prices(prices)
+            price_jumps, bad_prints = self._get_price_jumps(prices)
+
+        price_dates = price_data.index.values
+        market_cap_dates = market_cap_data.index.values
+        duplicate_dates = int(price_data.index.duplicated().sum() + market_cap_data.index.duplicated().sum())
+        misaligned_dates = len(np.setxor1d(price_dates, market_cap_dates))
+
+        flagged = (non_positive_prices | stale_prices | price_jumps).any(axis=0)
+        flagged_assets = tuple(str(asset) for asset in price_data.columns[flagged])
+
+        fixed_points = 0
+        if self._fix != DataFix.NONE:
+            bad_prices = non_positive_prices | bad_prints
+            fixed_points = int(bad_prices.sum() + non_positive_market_caps.sum())
+            market_data = {MarketData.PRICE_DATA: self._apply_fix(price_data, bad_prices),
+                           MarketData.MARKET_CAP_DATA: self._apply_fix(market_cap_data, non_positive_market_caps)}
+
+        report = DataQualityReport(n_dates=len(price_dates),
+                                   n_assets=prices.shape[1],
+                                   missing_prices=int(missing_prices.sum()),
+                                   missing_market_caps=int(missing_market_caps.sum()),
+                                   non_positive_prices=int(non_positive_prices.sum()),
+                                   non_positive_market_caps=int(non_positive_market_caps.sum()),
+                                   stale_prices=int(stale_prices.sum()),
+                                   price_jumps=int(price_jumps.sum()),
+                                   misaligned_dates=misaligned_dates,
+                                   duplicate_dates=duplicate_dates,
+                                   flagged_assets=flagged_assets,
+                                   fixed_points=fixed_points)
+        return market_data, report
+
+    def _get_stale_prices(self,
+                          prices: np.ndarray) -> np.ndarray:
+        """
+        flag prices which end a run of `stale_run_length`
+        identical prices, by and-ing shifted copies of the
+        unchanged mask
+        """
+
+        stale_prices = np.zeros(prices.shape, dtype=bool)
+        repeats = self._stale_run_length - 1
+        if len(prices) <= repeats:
+            return stale_prices
+
+        unchanged = prices[1:] == prices[:-1]
+        run_ends = unchanged[repeats - 1:].copy()
+        for shift in range(1, repeats):
+            run_ends &= unchanged[repeats - 1 - shift:len(unchanged) - shift]
+
+        stale_prices[repeats:] = run_ends
+        return stale_prices
+
+    def _get_price_jumps(self,
+                         prices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        flag prices which move too far from the previous price,
+        and those jumps which are reversed by the next price
+        """
+
+        moves = np.divide(prices[1:], prices[:-1])
+        moves -= 1
+        np.abs(moves, out=moves)
+        price_jumps = np.zeros(prices.shape, dtype=bool)
+        np.greater(moves, self._max_daily_move, out=price_jumps[1:])
+        del moves
+
+        # only check for a reversal where a jump is followed by another
+        bad_prints = np.zeros(prices.shape, dtype=bool)
+        rows, columns = np.nonzero(price_jumps[1:-1] & price_jumps[2:])
+        rows += 1
+        reverted = np.abs(prices[rows + 1, columns] / prices[rows - 1, columns] - 1) <= self._max_daily_move
+        bad_prints[rows[reverted], columns[reverted]] = True
+        return price_jumps, bad_prints
+
+    def _apply_fix(self,
+                   data: pd.DataFrame,
+                   bad_points: np.ndarray) -> pd.DataFrame:
+
+        if bad_points.any():
+            cleaned_data = data.mask(bad_points)
+            if self._fix == DataFix.FORWARD_FILL:
+                # only fill the bad points, not data that was already missing
+                cleaned_data = data.where(~bad_points, cleaned_data.ffill())
+            data = cleaned_data
+
+        if data.index.has_duplicates:
+            data = data[~data.index.duplicated(keep="last")]
+
+        return data
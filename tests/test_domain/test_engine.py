@@ -1,8 +1,15 @@
+import os
+import sys
+import subprocess
 import unittest
+import numpy as np
 import pandas as pd
 from unittest import mock
 from black_litterman.domain.engine import BLEngine, CalculationSettings
 from black_litterman.domain.views import View, ViewAllocation, ViewCollection
+from black_litterman.domain import kernels
+from black_litterman.market_data.engine import MarketDataEngine
+from black_litterman.constants import CalibrationMethod, CovarianceEstimator, ExecutorType
 
 
 class TestEngine(unittest.TestCase):
@@ -23,17 +30,30 @@ class TestEngine(unittest.TestCase):
         engine = BLEngine(mock_data_reader, calc_settings)
         return engine
 
+    @staticmethod
+    def _get_view_collection(*views: View) -> ViewCollection:
+        view_collection = ViewCollection()
+        for view in views:
+            view_collection.add_view(view)
+        return view_collection
+
+    def _get_weights_for_variances(self,
+                                   view_collection: ViewCollection,
+                                   variances: dict) -> pd.Series:
+        market_cov, market_weights = self._get_market_data()
+        calc_settings = CalculationSettings(1, 3, None, None, ["asset_1", "asset_2", "asset_3"],
+                                            CalibrationMethod.ITERATIVE)
+        engine = BLEngine(mock.MagicMock(), calc_settings)
+        return engine._get_weights_sparse(view_collection, market_weights, market_cov.values,
+                                          lambda views: [variances[view.id] for view in views])
+
     def test_get_bl_weights_absolute_view(self):
         # arrange
-        market_cov, market_weights = self._get_market_data()
-        engine = self._get_bl_engine()
-        view_matrix = pd.Series([1, 0, 0], index=market_cov.index, name="view_1").to_frame().T
-        view_cov = pd.DataFrame([[0.05]], index=["view_1"], columns=["view_1"])
-        view_outperf = pd.Series([0.2], index=["view_1"])
+        market_cov, _ = self._get_market_data()
+        view_collection = self._get_view_collection(View("view_1", "view_1", 0.2, 0.5, ViewAllocation("asset_1")))
 
         # act
-        result = engine._get_weights(market_weights, market_cov, view_matrix, view_cov,
-                                     view_outperf)
+        result = self._get_weights_for_variances(view_collection, {"view_1": 0.05})
 
         # assert
         expected_result = pd.Series([0.442028986, 0.5, 0.2], index=market_cov.index)
@@ -41,15 +61,12 @@ class TestEngine(unittest.TestCase):
 
     def test_get_bl_weights_relative_view(self):
         # arrange
-        market_cov, market_weights = self._get_market_data()
-        engine = self._get_bl_engine()
-        view_matrix = pd.Series([0, -1, 1], index=market_cov.index, name="view_1").to_frame().T
-        view_cov = pd.DataFrame([0.1], index=["view_1"], columns=["view_1"])
-        view_outperf = pd.Series([0.06], index=["view_1"])
+        market_cov, _ = self._get_market_data()
+        view_collection = self._get_view_collection(View("view_1", "view_1", 0.06, 0.5,
+                                                         ViewAllocation("asset_3", "asset_2")))
 
         # act
-        result = engine._get_weights(market_weights, market_cov, view_matrix, view_cov,
-                                       view_outperf)
+        result = self._get_weights_for_variances(view_collection, {"view_1": 0.1})
 
         # assert
         expected_result = pd.Series([0.3, 0.5833333, 0.1166667], index=market_cov.index)
@@ -57,17 +74,15 @@ class TestEngine(unittest.TestCase):
 
     def test_get_bl_weights_multiple_views(self):
         # arrange
-        market_cov, market_weights = self._get_market_data()
-        engine = self._get_bl_engine()
-        view_matrix = pd.DataFrame([[0, -1, 1], [1, 0, 0], [-1, 0, 1]], index=["view_1", "view_2", "view_3"],
-                                   columns=market_cov.index)
-        view_cov = pd.DataFrame([[0.1, 0, 0], [0, 0.05, 0], [0, 0, 0.04]], index=["view_1", "view_2", "view_3"],
-                                columns=["view_1", "view_2", "view_3"])
-        view_outperf = pd.Series([0.05, 0.09, 0.08], index=["view_1", "view_2", "view_3"])
+        market_cov, _ = self._get_market_data()
+        view_collection = self._get_view_collection(View("view_1", "view_1", 0.05, 0.5,
+                                                         ViewAllocation("asset_3", "asset_2")),
+                                                    View("view_2", "view_2", 0.09, 0.5, ViewAllocation("asset_1")),
+                                                    View("view_3", "view_3", 0.08, 0.5,
+                                                         ViewAllocation("asset_3", "asset_1")))
 
         # act
-        result = engine._get_weights(market_weights, market_cov, view_matrix, view_cov,
-                                       view_outperf)
+        result = self._get_weights_for_variances(view_collection, {"view_1": 0.1, "view_2": 0.05, "view_3": 0.04})
 
         # assert
         expected_result = pd.Series([0.2982666, 0.6179881, 0.1043762], index=market_cov.index)
@@ -75,11 +90,11 @@ class TestEngine(unittest.TestCase):
 
     def test_get_sum_squares(self):
         # arrange
-        series_1 = pd.Series([0.5, 0.25, 0.75, 0.3])
-        series_2 = pd.Series([0.2, 0.3, 0.75, 0.4])
+        weights_1 = np.array([0.5, 0.25, 0.75, 0.3])
+        weights_2 = np.array([0.2, 0.3, 0.75, 0.4])
 
         # act
-        result = BLEngine._get_sum_squares_error(series_1, series_2)
+        result = kernels.get_sum_squares_error(weights_1, weights_2)
 
         # assert
         self.assertAlmostEqual(0.1025, result)
@@ -88,33 +103,27 @@ class TestEngine(unittest.TestCase):
         # arrange
         test_view = View("1", "test_view", 0.08, 0.5, ViewAllocation("asset_3", "asset_2"))
         market_cov, market_weights = self._get_market_data()
-        engine = self._get_bl_engine()
-        view_matrix = test_view.get_view_data_frame(["asset_1", "asset_2", "asset_3"])
-        view_out_performance = pd.Series([0.08], index=["1"])
+        view_vector = test_view.get_view_vector(["asset_1", "asset_2", "asset_3"])
 
         # act
-        result = engine._get_view_target_weights(test_view, market_weights, market_cov,
-                                                   view_matrix, view_out_performance)
+        result = kernels.get_view_target_weights(market_weights.values, market_cov.values, view_vector,
+                                                 test_view.out_performance, test_view.confidence, 1, 3)
 
         # assert
-        expected_result = pd.Series([0.3, 0.58333333, 0.11666667], index=["asset_1", "asset_2", "asset_3"])
-        pd.testing.assert_series_equal(expected_result, result)
+        np.testing.assert_allclose([0.3, 0.58333333, 0.11666667], result, atol=1e-7)
 
     def test_get_target_weights_absolute_view(self):
         # arrange
         test_view = View("1", "test_view", 0.13, 0.8, ViewAllocation("asset_1", None))
         market_cov, market_weights = self._get_market_data()
-        engine = self._get_bl_engine()
-        view_matrix = test_view.get_view_data_frame(["asset_1", "asset_2", "asset_3"])
-        view_out_performance = pd.Series([0.13], index=["1"])
+        view_vector = test_view.get_view_vector(["asset_1", "asset_2", "asset_3"])
 
         # act
-        result = engine._get_view_target_weights(test_view, market_weights, market_cov,
-                                                   view_matrix, view_out_performance)
+        result = kernels.get_view_target_weights(market_weights.values, market_cov.values, view_vector,
+                                                 test_view.out_performance, test_view.confidence, 1, 3)
 
         # assert
-        expected_result = pd.Series([0.3414814815, 0.5, 0.2], index=["asset_1", "asset_2", "asset_3"])
-        pd.testing.assert_series_equal(expected_result, result)
+        np.testing.assert_allclose([0.3414814815, 0.5, 0.2], result, atol=1e-7)
 
     def test_confidence_to_variance_absolute_view(self):
         # arrange
@@ -160,11 +169,230 @@ class TestEngine(unittest.TestCase):
         expected_result = pd.DataFrame([[0.1, 0], [0, 0.05]], index=["view_1", "view_2"], columns=["view_1", "view_2"])
         pd.testing.assert_frame_equal(expected_result, result)
 
+    def test_confidence_to_variance_analytic_matches_iterative(self):
+        # arrange
+        view = View("test_view", "test_view", 0.07, 0.65, ViewAllocation("asset_1", "asset_3"))
+        market_cov, market_weights = self._get_market_data()
+        bl_engine = self._get_bl_engine()
 
+        # act
+        analytic = bl_engine._confidence_to_variance_analytic(view, market_cov)
+        iterative = bl_engine._confidence_to_variance_iterative(view, market_weights, market_cov)
 
+        # assert
+        self.assertAlmostEqual(iterative, analytic, delta=1e-4)
 
+    def test_confidence_to_variance_iterative_method(self):
+        # arrange
+        view = View("test_view", "test_view", 0.13, 0.5, ViewAllocation("asset_1"))
+        market_cov, market_weights = self._get_market_data()
+        calc_settings = CalculationSettings(1, 3, None, None, ["asset_1", "asset_2", "asset_3"],
+                                            CalibrationMethod.ITERATIVE)
+        bl_engine = BLEngine(mock.MagicMock(), calc_settings)
+        bl_engine._confidence_to_variance_analytic = mock.MagicMock()
 
+        # act
+        result = bl_engine._confidence_to_variance(view, market_weights, market_cov)
 
+        # assert
+        bl_engine._confidence_to_variance_analytic.assert_not_called()
+        self.assertAlmostEqual(0.18, result, delta=1e-4)
+
+    def test_zero_confidence_view_leaves_market_weights(self):
+        # arrange
+        view = View("test_view", "test_view", 0.13, 0, ViewAllocation("asset_1"))
+        market_cov, market_weights = self._get_market_data()
+        bl_engine = self._get_bl_engine()
+
+        # act
+        variance = bl_engine._confidence_to_variance(view, market_weights, market_cov)
+        result = self._get_weights_for_variances(self._get_view_collection(view), {"test_view": variance})
+
+        # assert
+        self.assertEqual(np.inf, variance)
+        pd.testing.assert_series_equal(market_weights, result)
+
+    def test_zero_exposure_views_leave_market_weights(self):
+        # arrange
+        market_cov, market_weights = self._get_market_data()
+        market_cov["asset_3"] = 0.
+        market_cov.loc["asset_3"] = 0.
+        view_collection = ViewCollection()
+        view_collection.add_view(View("view_1", "view_1", 0.05, 0.6, ViewAllocation("asset_2", "asset_2")))
+        view_collection.add_view(View("view_2", "view_2", 0.03, 1, ViewAllocation("asset_3")))
+
+        for method in [CalibrationMethod.ANALYTIC, CalibrationMethod.ITERATIVE]:
+            calc_settings = CalculationSettings(1, 3, None, None, ["asset_1", "asset_2", "asset_3"], method)
+            engine = BLEngine(mock.MagicMock(), calc_settings)
+            engine._market_data_engine.get_market_weights.return_value = market_weights
+            engine._market_data_engine.get_annualised_cov_matrix.return_value = market_cov
+
+            # act
+            result = engine.get_black_litterman_weights(view_collection, "2020-01-01", "2020-06-30")
+            batch_result = engine.get_black_litterman_weights_batch([view_collection], "2020-01-01", "2020-06-30")
+
+            # assert
+            pd.testing.assert_series_equal(market_weights, result, check_names=False)
+            pd.testing.assert_series_equal(market_weights, batch_result[0], check_names=False)
+
+    def test_get_bl_weights_misaligned_inputs(self):
+        # arrange
+        market_cov, market_weights = self._get_market_data()
+        engine = self._get_bl_engine()
+        view_collection = self._get_view_collection(View("view_1", "view_1", 0.2, 0.5, ViewAllocation("asset_1")))
 
+        # act / assert
+        with self.assertRaises(ValueError):
+            engine._get_black_litterman_weights_for_market(view_collection, market_weights,
+                                                           market_cov.drop(index="asset_3", columns="asset_3"))
 
+    def test_get_bl_weights_batch(self):
+        # arrange
+        market_cov, market_weights = self._get_market_data()
+        engine = self._get_bl_engine()
+        engine._market_data_engine.get_market_weights.return_value = market_weights
+        engine._market_data_engine.get_annualised_cov_matrix.return_value = market_cov
 
+        collection_1 = ViewCollection()
+        collection_1.add_view(View("view_1", "view_1", 0.14, 0.6, ViewAllocation("asset_1")))
+        collection_2 = ViewCollection()
+        collection_2.add_view(View("view_2", "view_2", 0.06, 0.3, ViewAllocation("asset_3", "asset_2")))
+        collection_2.add_view(View("view_3", "view_3", 0.02, 0.8, ViewAllocation("asset_2")))
+        view_collections = [collection_1, ViewCollection(), collection_2]
+
+        # act
+        result = engine.get_black_litterman_weights_batch(view_collections, "2020-01-01", "2020-06-30")
+
+        # assert
+        self.assertEqual([0, 1, 2], list(result.columns))
+        pd.testing.assert_series_equal(market_weights, result[1], check_names=False)
+        for i in [0, 2]:
+            expected_result = engine.get_black_litterman_weights(view_collections[i], "2020-01-01", "2020-06-30")
+            pd.testing.assert_series_equal(expected_result, result[i], check_names=False)
+
+    def test_get_bl_weights_sample_covariance_matches_dense(self):
+        # arrange
+        market_cov, market_weights = self._get_market_data()
+        engine = self._get_bl_engine()
+        engine._market_data_engine.get_market_weights.return_value = market_weights
+        engine._market_data_engine.get_annualised_cov_matrix.return_value = market_cov.iloc[::-1, ::-1]
+        view_collection = ViewCollection()
+        view_collection.add_view(View("view_1", "view_1", 0.05, 0.6, ViewAllocation("asset_3", "asset_2")))
+        view_collection.add_view(View("view_2", "view_2", 0.09, 0.3, ViewAllocation("asset_1")))
+
+        # act
+        result = engine.get_black_litterman_weights(view_collection, "2020-01-01", "2020-06-30")
+
+        # assert
+        view_matrix = view_collection.get_view_matrix(list(market_weights.index))
+        view_cov = engine.get_view_covariances_from_confidences(market_weights, market_cov, view_collection)
+        expected_result = kernels.get_black_litterman_weights(market_weights.values, market_cov.values,
+                                                              view_matrix.values, view_cov.values,
+                                                              view_collection.get_view_out_performances().values, 1, 3)
+        np.testing.assert_allclose(expected_result, result.values)
+
+    def test_get_view_covariances_from_confidences_in_parallel(self):
+        # arrange
+        view_collection = ViewCollection()
+        view_collection.add_view(View("view_1", "view_1", 0.14, 0.6, ViewAllocation("asset_1")))
+        view_collection.add_view(View("view_2", "view_2", 0.06, 0.3, ViewAllocation("asset_3", "asset_2")))
+        view_collection.add_view(View("view_3", "view_3", 0.02, 0.8, ViewAllocation("asset_2")))
+        market_cov, market_weights = self._get_market_data()
+        expected_result = self._get_bl_engine().get_view_covariances_from_confidences(market_weights, market_cov,
+                                                                                      view_collection)
+
+        for method, executor in [(CalibrationMethod.ANALYTIC, ExecutorType.THREAD),
+                                 (CalibrationMethod.ITERATIVE, ExecutorType.THREAD),
+                                 (CalibrationMethod.ITERATIVE, ExecutorType.PROCESS)]:
+            calc_settings = CalculationSettings(1, 3, None, None, ["asset_1", "asset_2", "asset_3"], method,
+                                                calibration_workers=2, calibration_executor=executor)
+            engine = BLEngine(mock.MagicMock(), calc_settings)
+
+            # act
+            result = engine.get_view_covariances_from_confidences(market_weights, market_cov, view_collection)
+
+            # assert
+            self.assertEqual(list(expected_result.index), list(result.index))
+            np.testing.assert_allclose(expected_result.values, result.values, atol=1e-4)
+
+    @staticmethod
+    def _get_factor_model_engine() -> BLEngine:
+        asset_universe = ["asset_1", "asset_2", "asset_3", "asset_4"]
+        dates = pd.date_range("2019-01-01", periods=80, freq="B")
+        returns = np.random.RandomState(2).normal(0.0003, 0.01, (80, 4))
+        price_data = pd.DataFrame(100 * np.exp(returns.cumsum(axis=0)), index=dates, columns=asset_universe)
+        market_cap_data = pd.DataFrame([[4., 3, 2, 1]] * 80, index=dates, columns=asset_universe)
+        calc_settings = CalculationSettings(0.05, 3, "2019-01-01", "2019-04-22", asset_universe,
+                                            cov_estimator=CovarianceEstimator.FACTOR, n_factors=2)
+        mock_data_reader = mock.MagicMock()
+        mock_data_reader.get_market_data_engine.return_value = MarketDataEngine(price_data, market_cap_data,
+                                                                                **calc_settings.get_engine_options())
+        return BLEngine(mock_data_reader, calc_settings)
+
+    def test_get_bl_weights_factor_model_matches_dense(self):
+        # arrange
+        asset_universe = ["asset_1", "asset_2", "asset_3", "asset_4"]
+        engine = self._get_factor_model_engine()
+        view_collection = ViewCollection()
+        view_collection.add_view(View("view_1", "view_1", 0.02, 0.6, ViewAllocation("asset_1", "asset_3")))
+        view_collection.add_view(View("view_2", "view_2", 0.05, 0.3, ViewAllocation("asset_4")))
+
+        # act
+        result = engine.get_black_litterman_weights(view_collection, "2019-01-01", "2019-04-22")
+
+        # assert
+        factor_cov = engine._market_data_engine.get_annualised_factor_covariance("2019-01-01", "2019-04-22")
+        dense_cov = pd.DataFrame(factor_cov.to_dense(), index=asset_universe, columns=asset_universe)
+        market_weights = engine.get_market_weights("2019-04-22")
+        expected_result = engine._get_black_litterman_weights_for_market(view_collection, market_weights, dense_cov)
+        np.testing.assert_allclose(expected_result.values, result.values)
+
+    def test_get_bl_weights_batch_factor_model(self):
+        # arrange
+        engine = self._get_factor_model_engine()
+        collection_1 = self._get_view_collection(View("view_1", "view_1", 0.02, 0.6,
+                                                      ViewAllocation("asset_1", "asset_3")))
+        collection_2 = self._get_view_collection(View("view_2", "view_2", 0.05, 0.3, ViewAllocation("asset_4")),
+                                                 View("view_3", "view_3", 0.01, 0.8, ViewAllocation("asset_2")))
+
+        with mock.patch.object(engine._market_data_engine, "get_annualised_cov_matrix") as get_dense_cov:
+            # act
+            result = engine.get_black_litterman_weights_batch([collection_1, collection_2], "2019-01-01",
+                                                              "2019-04-22")
+
+            # assert
+            get_dense_cov.assert_not_called()
+
+        for i, collection in enumerate([collection_1, collection_2]):
+            expected_result = engine.get_black_litterman_weights(collection, "2019-01-01", "2019-04-22")
+            np.testing.assert_allclose(expected_result.values, result[i].values)
+
+    def test_incremental_updates_with_factor_model(self):
+        # arrange
+        calc_settings = CalculationSettings(1, 3, None, None, ["asset_1", "asset_2", "asset_3"],
+                                            incremental_updates=True, cov_estimator=CovarianceEstimator.FACTOR)
+
+        # act / assert
+        with self.assertRaises(ValueError):
+            BLEngine(mock.MagicMock(), calc_settings)
+
+    def test_unknown_calibration_method(self):
+        # arrange
+        calc_settings = CalculationSettings(1, 3, None, None, ["asset_1", "asset_2", "asset_3"], "analytical")
+
+        # act / assert
+        with self.assertRaises(ValueError):
+            BLEngine(mock.MagicMock(), calc_settings)
+
+    def test_import_does_not_load_optional_dependencies(self):
+        # arrange
+        repo_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        script = "import sys; import black_litterman.domain.config_handling; " \
+                 "print([m for m in ['scipy', 'cardano', 'PySide2'] if m in sys.modules])"
+
+        # act
+        result = subprocess.run([sys.executable, "-c", script], stdout=subprocess.PIPE, check=True,
+                                universal_newlines=True, cwd=repo_root)
+
+        # assert
+        self.assertEqual("[]", result.stdout.strip())
@@ -0,0 +1,154 @@
+import unittest
+import numpy as np
+import pandas as pd
+from unittest import mock
+from black_litterman.domain import kernels
+from black_litterman.domain.engine import BLEngine, CalculationSettings
+from black_litterman.domain.incremental import IncrementalBLSolver
+from black_litterman.domain.views import View, ViewAllocation, ViewCollection
+
+
+class TestIncrementalBLSolver(unittest.TestCase):
+
+    @staticmethod
+    def _get_market_data():
+        market_cov = np.array([[0.18, -0.04, 0], [-0.04, 0.05, 0.07], [0, 0.07, 0.11]])
+        market_weights = np.array([0.3, 0.5, 0.2])
+
+        return market_cov, market_weights
+
+    def _assert_matches_full_solve(self, solver, market_weights, market_cov, views):
+        view_matrix = np.array([view[0] for view in views])
+        view_out_performance = np.array([view[1] for view in views])
+        view_cov = np.diag([view[2] for view in views])
+        expected_result = kernels.get_black_litterman_weights(market_weights, market_cov, view_matrix, view_cov,
+                                                              view_out_performance, 1, 3)
+        np.testing.assert_allclose(expected_result, solver.get_weights(), atol=1e-10)
+
+    def test_add_update_and_remove_views(self):
+        # arrange
+        market_cov, market_weights = self._get_market_data()
+        solver = IncrementalBLSolver(market_weights, market_cov, 1, 3)
+        view_1 = (np.array([0., -1, 1]), 0.05, 0.1)
+        view_2 = (np.array([1., 0, 0]), 0.09, 0.05)
+        view_3 = (np.array([-1., 0, 1]), 0.08, 0.04)
+
+        # act / assert
+        solver.add_view("view_1", *view_1)
+        solver.add_view("view_2", *view_2)
+        solver.add_view("view_3", *view_3)
+        self._assert_matches_full_solve(solver, market_weights, market_cov, [view_1, view_2, view_3])
+
+        solver.update_view_variance("view_2", 0.2)
+        solver.update_view_out_performance("view_3", 0.01)
+        view_2 = (view_2[0], view_2[1], 0.2)
+        view_3 = (view_3[0], 0.01, view_3[2])
+        self._assert_matches_full_solve(solver, market_weights, market_cov, [view_1, view_2, view_3])
+
+        solver.remove_view("view_1")
+        self._assert_matches_full_solve(solver, market_weights, market_cov, [view_2, view_3])
+
+    def test_infinite_variance_views_are_inert(self):
+        # arrange
+        market_cov, market_weights = self._get_market_data()
+        solver = IncrementalBLSolver(market_weights, market_cov, 1, 3)
+        view = (np.array([1., 0, 0]), 0.2, 0.05)
+
+        # act / assert
+        solver.add_view("view_1", view[0], view[1], np.inf)
+        np.testing.assert_allclose(market_weights, solver.get_weights())
+
+        solver.update_view_variance("view_1", view[2])
+        self._assert_matches_full_solve(solver, market_weights, market_cov, [view])
+
+    def test_duplicate_views_match_full_solve(self):
+        # arrange
+        market_cov, market_weights = self._get_market_data()
+        solver = IncrementalBLSolver(market_weights, market_cov, 1, 3)
+        view_1 = (np.array([1., 0, 0]), 0.14, 0.05)
+        view_2 = (np.array([1., 0, 0]), 0.14, 0.05)
+
+        # act / assert
+        solver.add_view("view_1", *view_1)
+        solver.add_view("view_2", *view_2)
+        solver.update_view_variance("view_1", 0)
+        solver.update_view_variance("view_2", 0)
+        view_1 = (view_1[0], view_1[1], 0)
+        view_2 = (view_2[0], view_2[1], 0)
+        self._assert_matches_full_solve(solver, market_weights, market_cov, [view_1, view_2])
+
+        solver.remove_view("view_2")
+        self._assert_matches_full_solve(solver, market_weights, market_cov, [view_1])
+
+    def test_collinear_views_match_full_solve(self):
+        # arrange
+        market_cov, market_weights = self._get_market_data()
+        solver = IncrementalBLSolver(market_weights, market_cov, 1, 3)
+        view_1 = (np.array([1., -1, 0]), 0.03, 0)
+        view_2 = (np.array([0., 1, -1]), 0.02, 0)
+        view_3 = (np.array([1., 0, -1]), 0.05, 0)
+
+        # act / assert
+        solver.add_view("view_1", *view_1)
+        solver.add_view("view_2", *view_2)
+        solver.add_view("view_3", *view_3)
+        self._assert_matches_full_solve(solver, market_weights, market_cov, [view_1, view_2, view_3])
+
+        solver.remove_view("view_2")
+        solver.update_view_variance("view_3", 0.04)
+        view_3 = (view_3[0], view_3[1], 0.04)
+        self._assert_matches_full_solve(solver, market_weights, market_cov, [view_1, view_3])
+
+
+class TestIncrementalEngine(unittest.TestCase):
+
+    @staticmethod
+    def _get_bl_engine(incremental_updates: bool) -> BLEngine:
+        asset_universe = ["asset_1", "asset_2", "asset_3"]
+        market_cov = pd.DataFrame([[0.18, -0.04, 0], [-0.04, 0.05, 0.07], [0, 0.07, 0.11]],
+                                  index=asset_universe, columns=asset_universe)
+        market_weights = pd.Series([0.3, 0.5, 0.2], index=asset_universe)
+
+        calc_settings = CalculationSettings(1, 3, None, None, asset_universe,
+                                            incremental_updates=incremental_updates)
+        engine = BLEngine(mock.MagicMock(), calc_settings)
+        engine._market_data_engine.get_market_weights.return_value = market_weights
+        engine._market_data_engine.get_annualised_cov_matrix.return_value = market_cov
+        return engine
+
+    def test_incremental_weights_match_full_solve(self):
+        # arrange
+        full_engine = self._get_bl_engine(False)
+        incremental_engine = self._get_bl_engine(True)
+        view_1 = View("view_1", "view_1", 0.14, 0.6, ViewAllocation("asset_1"))
+        view_2 = View("view_2", "view_2", 0.06, 0.3, ViewAllocation("asset_3", "asset_2"))
+        view_2_edited = View("view_2", "view_2", 0.04, 0.7, ViewAllocation("asset_3", "asset_2"))
+        view_2_moved = View("view_2", "view_2", 0.04, 0.7, ViewAllocation("asset_2", "asset_1"))
+        view_3 = View("view_3", "view_3", 0.02, 0, ViewAllocation("asset_2"))
+
+        for views in [[view_1], [view_1, view_2], [view_1, view_2_edited, view_3], [view_2_moved, view_3]]:
+            view_collection = ViewCollection()
+            for view in views:
+                view_collection.add_view(view)
+
+            # act
+            result = incremental_engine.get_black_litterman_weights(view_collection, "2020-01-01", "2020-06-30")
+
+            # assert
+            expected_result = full_engine.get_black_litterman_weights(view_collection, "2020-01-01", "2020-06-30")
+            pd.testing.assert_series_equal(expected_result, result)
+
+    def test_unchanged_views_are_not_recalibrated(self):
+        # arrange
+        engine = self._get_bl_engine(True)
+        view_collection = ViewCollection()
+        view_collection.add_view(View("view_1", "view_1", 0.14, 0.6, ViewAllocation("asset_1")))
+        engine.get_black_litterman_weights(view_collection, "2020-01-01", "2020-06-30")
+        engine._confidence_to_variance = mock.MagicMock(return_value=0.1)
+
+        # act
+        view_collection.add_view(View("view_2", "view_2", 0.06, 0.3, ViewAllocation("asset_3", "asset_2")))
+        engine.get_black_litterman_weights(view_collection, "2020-01-01", "2020-06-30")
+
+        # assert
+        self.assertEqual(1, engine._confidence_to_variance.call_count)
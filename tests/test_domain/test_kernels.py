@@ -0,0 +1,139 @@
+import unittest
+import numpy as np
+from black_litterman.domain import kernels
+from black_litterman.market_data.covariance import FactorCovariance
+
+
+class TestKernels(unittest.TestCase):
+
+    @staticmethod
+    def _get_market_data():
+        market_cov = np.array([[0.18, -0.04, 0], [-0.04, 0.05, 0.07], [0, 0.07, 0.11]])
+        market_weights = np.array([0.3, 0.5, 0.2])
+
+        return market_cov, market_weights
+
+    def test_get_bl_weights_multiple_views(self):
+        # arrange
+        market_cov, market_weights = self._get_market_data()
+        view_matrix = np.array([[0., -1, 1], [1, 0, 0], [-1, 0, 1]])
+        view_cov = np.diag([0.1, 0.05, 0.04])
+        view_outperf = np.array([0.05, 0.09, 0.08])
+
+        # act
+        result = kernels.get_black_litterman_weights(market_weights, market_cov, view_matrix, view_cov,
+                                                     view_outperf, 1, 3)
+
+        # assert
+        np.testing.assert_allclose([0.2982666, 0.6179881, 0.1043762], result, atol=1e-7)
+
+    def test_get_bl_weights_batched(self):
+        # arrange
+        market_cov, market_weights = self._get_market_data()
+        view_matrix = np.array([[[1., 0, 0]], [[0, -1, 1]]])
+        view_cov = np.array([[[0.05]], [[0.1]]])
+        view_outperf = np.array([[0.2], [0.06]])
+
+        # act
+        result = kernels.get_black_litterman_weights(market_weights, market_cov, view_matrix, view_cov,
+                                                     view_outperf, 1, 3)
+
+        # assert
+        expected_result = [[0.442028986, 0.5, 0.2], [0.3, 0.5833333, 0.1166667]]
+        np.testing.assert_allclose(expected_result, result, atol=1e-7)
+
+    def test_get_bl_weights_ignores_infinite_variance_views(self):
+        # arrange
+        market_cov, market_weights = self._get_market_data()
+        view_matrix = np.array([[1., 0, 0], [0, -1, 1]])
+        view_cov = np.diag([0.05, np.inf])
+        view_outperf = np.array([0.2, 0.06])
+
+        # act
+        result = kernels.get_black_litterman_weights(market_weights, market_cov, view_matrix, view_cov,
+                                                     view_outperf, 1, 3)
+
+        # assert
+        np.testing.assert_allclose([0.442028986, 0.5, 0.2], result, atol=1e-7)
+
+    def test_get_view_variances_from_confidences(self):
+        # arrange
+        market_cov, _ = self._get_market_data()
+        view_matrix = np.array([[1., 0, 0], [0, -1, 1], [1, 0, 0], [0, 0, 0]])
+        confidences = np.array([0.5, 0.3, 0, 0.5])
+
+        # act
+        result = kernels.get_view_variances_from_confidences(market_cov, view_matrix, confidences, 1)
+
+        # assert
+        np.testing.assert_allclose([0.18, 0.0466667, np.inf, np.inf], result, atol=1e-6)
+
+    def test_zero_variance_views_are_inert(self):
+        # arrange
+        market_cov = np.array([[0.18, -0.04, 0], [-0.04, 0.05, 0], [0, 0, 0]])
+        market_weights = np.array([0.3, 0.5, 0.2])
+        view_matrix = np.array([[0., 0, 1], [0, 0, 0]])
+
+        # act
+        variances = kernels.get_view_variances_from_confidences(market_cov, view_matrix, np.array([0.6, 1]), 1)
+        iterative_variances = [kernels.get_view_variance_iterative(market_weights, market_cov, view_vector, 0.05,
+                                                                   0.6, 1, 3) for view_vector in view_matrix]
+        result = kernels.get_black_litterman_weights(market_weights, market_cov, view_matrix, np.diag(variances),
+                                                     np.array([0.05, 0.02]), 1, 3)
+
+        # assert
+        np.testing.assert_array_equal([np.inf, np.inf], variances)
+        np.testing.assert_array_equal([np.inf, np.inf], iterative_variances)
+        np.testing.assert_allclose(market_weights, result)
+
+    def test_factor_covariance_matches_dense(self):
+        # arrange
+        random_state = np.random.RandomState(11)
+        factor_cov = FactorCovariance(random_state.normal(0, 0.1, (6, 2)), random_state.uniform(0.01, 0.05, 6))
+        market_weights = np.full(6, 1 / 6)
+        view_matrix = np.array([[[1., -1, 0, 0, 0, 0], [0, 0, 1, 0, 0, 0]], [[0, 0, 0, 1, 0, -1], [0, 1, 0, 0, 0, 0]]])
+        confidences = np.array([[0.4, 0.7], [0.2, 0.9]])
+        view_outperf = np.array([[0.03, 0.05], [0.02, 0.04]])
+
+        # act
+        variances = kernels.get_view_variances_from_confidences(factor_cov, view_matrix, confidences, 0.05)
+        view_cov = np.zeros((2, 2, 2))
+        view_cov[:, [0, 1], [0, 1]] = variances
+        result = kernels.get_black_litterman_weights(market_weights, factor_cov, view_matrix, view_cov,
+                                                     view_outperf, 0.05, 3)
+
+        # assert
+        dense_cov = factor_cov.to_dense()
+        expected_variances = kernels.get_view_variances_from_confidences(dense_cov, view_matrix, confidences, 0.05)
+        expected_result = kernels.get_black_litterman_weights(market_weights, dense_cov, view_matrix, view_cov,
+                                                              view_outperf, 0.05, 3)
+        np.testing.assert_allclose(expected_variances, variances)
+        np.testing.assert_allclose(expected_result, result)
+
+    def test_sparse_views_match_dense(self):
+        # arrange
+        random_state = np.random.RandomState(4)
+        factor_cov = FactorCovariance(random_state.normal(0, 0.1, (8, 2)), random_state.uniform(0.01, 0.05, 8))
+        market_weights = np.full(8, 1 / 8)
+        view_columns = np.array([[0, 5], [3, 0], [7, 2]])
+        view_weights = np.array([[1., -1], [1, 0], [1, -1]])
+        view_matrix = np.zeros((3, 8))
+        np.add.at(view_matrix, (np.repeat(np.arange(3), 2), view_columns.ravel()), view_weights.ravel())
+        confidences = np.array([0.4, 0.7, 0])
+        view_outperf = np.array([0.03, 0.05, 0.01])
+
+        for market_cov in [factor_cov, factor_cov.to_dense()]:
+            # act
+            variances = kernels.get_view_variances_from_confidences_sparse(market_cov, view_columns, view_weights,
+                                                                           confidences, 0.05)
+            result = kernels.get_black_litterman_weights_sparse(market_weights, market_cov, view_columns,
+                                                                view_weights, np.diag(variances), view_outperf,
+                                                                0.05, 3)
+
+            # assert
+            expected_variances = kernels.get_view_variances_from_confidences(market_cov, view_matrix, confidences,
+                                                                             0.05)
+            expected_result = kernels.get_black_litterman_weights(market_weights, market_cov, view_matrix,
+                                                                  np.diag(expected_variances), view_outperf, 0.05, 3)
+            np.testing.assert_allclose(expected_variances, variances)
+            np.testing.assert_allclose(expected_result, result)
@@ -0,0 +1,97 @@
+import unittest
+import numpy as np
+import pandas as pd
+from unittest import mock
+from black_litterman.constants import CovarianceEstimator
+from black_litterman.domain.engine import BLEngine, CalculationSettings
+from black_litterman.domain.views import View, ViewAllocation, ViewCollection
+from black_litterman.market_data.engine import MarketDataEngine
+
+
+class TestRollingWeights(unittest.TestCase):
+
+    @staticmethod
+    def _get_bl_engine(prefix_sum_stride=None, cov_estimator=CovarianceEstimator.SAMPLE) -> BLEngine:
+        asset_universe = ["asset_1", "asset_2", "asset_3"]
+        dates = pd.date_range(start="2019-01-01", periods=120, freq="B")
+        random_state = np.random.RandomState(11)
+        price_data = pd.DataFrame(np.exp(random_state.normal(0, 0.01, (120, 3)).cumsum(axis=0)),
+                                  index=dates, columns=asset_universe)
+        market_cap_data = price_data * [100, 300, 50]
+
+        calc_settings = CalculationSettings(0.05, 3, "2019-01-01", "2019-06-14", asset_universe,
+                                            prefix_sum_stride=prefix_sum_stride, cov_estimator=cov_estimator,
+                                            n_factors=2)
+        mock_data_reader = mock.MagicMock()
+        mock_data_reader.get_market_data_engine.return_value = MarketDataEngine(price_data, market_cap_data,
+                                                                                **calc_settings.get_engine_options())
+        return BLEngine(mock_data_reader, calc_settings)
+
+    @staticmethod
+    def _get_view_collection() -> ViewCollection:
+        view_collection = ViewCollection()
+        view_collection.add_view(View("view_1", "view_1", 0.05, 0.6, ViewAllocation("asset_1")))
+        view_collection.add_view(View("view_2", "view_2", 0.02, 0.3, ViewAllocation("asset_3", "asset_2")))
+        return view_collection
+
+    def test_expanding_window_matches_single_solves(self):
+        # arrange
+        engine = self._get_bl_engine()
+        view_collection = self._get_view_collection()
+        rebalance_dates = ["2019-02-28", "2019-03-29", "2019-04-30", "2019-05-31"]
+
+        # act
+        result = engine.get_rolling_black_litterman_weights(view_collection, rebalance_dates)
+
+        # assert
+        for rebalance_date in rebalance_dates:
+            expected_result = engine.get_black_litterman_weights(view_collection, "2019-01-01", rebalance_date)
+            np.testing.assert_allclose(expected_result.values, result.loc[rebalance_date].values)
+
+    def test_fixed_window_matches_single_solves(self):
+        # arrange
+        view_collection = self._get_view_collection()
+        rebalance_dates = ["2019-02-28", "2019-03-29", "2019-04-30", "2019-05-31"]
+
+        for engine in [self._get_bl_engine(), self._get_bl_engine(prefix_sum_stride=5)]:
+            # act
+            result = engine.get_rolling_black_litterman_weights(view_collection, rebalance_dates, window_length=20)
+
+            # assert
+            for rebalance_date in rebalance_dates:
+                start_date = pd.bdate_range(end=rebalance_date, periods=20)[0]
+                expected_result = engine.get_black_litterman_weights(view_collection, start_date, rebalance_date)
+                np.testing.assert_allclose(expected_result.values, result.loc[rebalance_date].values)
+
+    def test_process_pool_matches_serial(self):
+        # arrange
+        engine = self._get_bl_engine()
+        view_collection = self._get_view_collection()
+        rebalance_dates = ["2019-02-28", "2019-03-29", "2019-04-30", "2019-05-31"]
+        expected_result = engine.get_rolling_black_litterman_weights(view_collection, rebalance_dates,
+                                                                     window_length=30)
+
+        # act
+        result = engine.get_rolling_black_litterman_weights(view_collection, rebalance_dates, window_length=30,
+                                                            n_processes=2)
+
+        # assert
+        pd.testing.assert_frame_equal(expected_result, result)
+
+    def test_factor_model_matches_single_solves(self):
+        # arrange
+        engine = self._get_bl_engine(cov_estimator=CovarianceEstimator.FACTOR)
+        view_collection = self._get_view_collection()
+        rebalance_dates = ["2019-02-28", "2019-03-29", "2019-04-30", "2019-05-31"]
+
+        with mock.patch.object(engine._market_data_engine, "get_rolling_cov_matrices") as get_dense_covs:
+            # act
+            result = engine.get_rolling_black_litterman_weights(view_collection, rebalance_dates, window_length=30)
+
+            # assert
+            get_dense_covs.assert_not_called()
+
+        for rebalance_date in rebalance_dates:
+            start_date = pd.bdate_range(end=rebalance_date, periods=30)[0]
+            expected_result = engine.get_black_litterman_weights(view_collection, start_date, rebalance_date)
+            np.testing.assert_allclose(expected_result.values, result.loc[rebalance_date].values)
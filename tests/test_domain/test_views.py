@@ -104,4 +104,33 @@ class TestViews(unittest.TestCase):
                                        index=["1", "2", "3"], columns=["1", "2", "3"])
         pd.testing.assert_frame_equal(expected_result, result, check_dtype=False)
 
+    def test_get_view_columns(self):
+        # arrange
+        view_collection = self._get_view_collection("")
+        asset_universe = ["asset_1", "asset_2", "asset_3", "asset_4"]
+
+        # act
+        view_columns, view_weights = view_collection.get_view_columns(asset_universe)
+
+        # assert
+        self.assertEqual([[1, 0], [0, 2], [2, 1]], view_columns.tolist())
+        self.assertEqual([[1, 0], [1, -1], [1, -1]], view_weights.tolist())
+
+    def test_get_view_array_absolute_view_in_first_column(self):
+        # arrange
+        view_collection = ViewCollection()
+        view_collection.add_view(View("1", "view_1", 0.06, 0.5, ViewAllocation("asset_1")))
+
+        # act
+        result = view_collection.get_view_array(["asset_1", "asset_2"])
+
+        # assert
+        self.assertEqual([[1., 0.]], result.tolist())
+
+    def test_get_view_matrix_unknown_asset(self):
+        # arrange
+        view_collection = self._get_view_collection("absolute")
 
+        # act / assert
+        with self.assertRaises(ValueError):
+            view_collection.get_view_matrix(["asset_1", "asset_3"])
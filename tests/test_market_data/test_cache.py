@@ -0,0 +1,44 @@
+import unittest
+from black_litterman.market_data.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        # arrange
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+
+        # act
+        cache.put("c", 3)
+
+        # assert
+        self.assertEqual(1, cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(3, cache.get("c"))
+
+    def test_zero_size_disables_cache(self):
+        # arrange
+        cache = LRUCache(0)
+
+        # act
+        cache.put("a", 1)
+
+        # assert
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(0, cache.cache_info().currsize)
+
+    def test_invalidate_with_predicate(self):
+        # arrange
+        cache = LRUCache(4)
+        cache.put(("x", 1), 1)
+        cache.put(("y", 2), 2)
+
+        # act
+        cache.invalidate(lambda key: key[0] == "x")
+
+        # assert
+        self.assertIsNone(cache.get(("x", 1)))
+        self.assertEqual(2, cache.get(("y", 2)))
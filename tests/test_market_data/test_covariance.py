@@ -0,0 +1,174 @@
+import unittest
+import numpy as np
+import pandas as pd
+from black_litterman.constants import CovarianceEstimator
+from black_litterman.market_data.covariance import CovarianceEstimatorFactory, EWMAEstimator, \
+    FactorModelEstimator, LedoitWolfEstimator, OASEstimator, SampleCovarianceEstimator, \
+    get_nearest_psd_matrix
+
+
+class TestCovarianceEstimators(unittest.TestCase):
+
+    @staticmethod
+    def _get_returns() -> np.ndarray:
+
+        return np.random.RandomState(3).normal(0, 0.01, (30, 12))
+
+    def test_sample_matches_numpy(self):
+        # arrange
+        returns = self._get_returns()
+
+        # act
+        result = SampleCovarianceEstimator().estimate(returns)
+
+        # assert
+        np.testing.assert_allclose(np.cov(returns, rowvar=False), result)
+
+    def test_ledoit_wolf_shrinks_towards_scaled_identity(self):
+        # arrange
+        returns = self._get_returns()
+        deviations = returns - returns.mean(axis=0)
+        sample_cov = deviations.T.dot(deviations) / len(returns)
+        target = np.eye(12) * np.trace(sample_cov) / 12
+
+        # act
+        result = LedoitWolfEstimator().estimate(returns)
+
+        # assert
+        shrinkage = (result[0, 1] / sample_cov[0, 1] - 1) * -1
+        self.assertTrue(0 < shrinkage < 1)
+        np.testing.assert_allclose((1 - shrinkage) * sample_cov + shrinkage * target, result)
+
+    def test_shrinkage_improves_conditioning(self):
+        # arrange
+        returns = self._get_returns()
+
+        # act
+        sample_condition = np.linalg.cond(SampleCovarianceEstimator().estimate(returns))
+        ledoit_wolf_condition = np.linalg.cond(LedoitWolfEstimator().estimate(returns))
+        oas_condition = np.linalg.cond(OASEstimator().estimate(returns))
+
+        # assert
+        self.assertLess(ledoit_wolf_condition, sample_condition)
+        self.assertLess(oas_condition, sample_condition)
+
+    def test_shrinkage_ignores_missing_returns(self):
+        # arrange
+        returns = self._get_returns()
+        returns[:5, 0] = np.nan
+
+        # act
+        result = LedoitWolfEstimator().estimate(returns)
+
+        # assert
+        self.assertFalse(np.isnan(result).any())
+
+    def test_ewma_weights_recent_returns(self):
+        # arrange
+        returns = np.array([[0.02, 0.], [0., 0.01]])
+        decay = 0.9
+
+        # act
+        result = EWMAEstimator(decay).estimate(returns)
+
+        # assert
+        expected_result = np.array([[0.1 * 0.9 * 0.02 ** 2, 0.], [0., 0.1 * 0.01 ** 2]]) / (1 - decay ** 2)
+        np.testing.assert_allclose(expected_result, result)
+
+    def test_ewma_update_matches_estimate(self):
+        # arrange
+        returns = self._get_returns()
+        estimator = EWMAEstimator(0.94)
+        covariance = estimator.estimate(returns[:20])
+
+        # act
+        for n_dates in range(20, 30):
+            covariance = estimator.update(covariance, returns[n_dates], n_dates)
+
+        # assert
+        np.testing.assert_allclose(estimator.estimate(returns), covariance)
+
+    def test_ewma_bad_decay(self):
+        # act / assert
+        with self.assertRaises(ValueError):
+            EWMAEstimator(1.5)
+
+    def test_factor_model_keeps_variances(self):
+        # arrange
+        returns = self._get_returns()
+        deviations = returns - returns.mean(axis=0)
+
+        # act
+        result = FactorModelEstimator(3).estimate_factors(returns)
+
+        # assert
+        self.assertEqual((12, 3), result.loadings.shape)
+        np.testing.assert_allclose(np.mean(deviations ** 2, axis=0), np.diag(result.to_dense()))
+
+    def test_factor_model_all_factors_is_sample(self):
+        # arrange
+        returns = self._get_returns()
+        deviations = returns - returns.mean(axis=0)
+
+        # act
+        result = FactorModelEstimator(12).estimate(returns)
+
+        # assert
+        np.testing.assert_allclose(deviations.T.dot(deviations) / len(returns), result, atol=1e-12)
+
+    def test_factor_covariance_dot(self):
+        # arrange
+        factor_cov = FactorModelEstimator(2).estimate_factors(self._get_returns())
+        weights = np.full(12, 1 / 12)
+
+        # act
+        result = factor_cov.dot(weights)
+
+        # assert
+        np.testing.assert_allclose(factor_cov.to_dense().dot(weights), result)
+
+    def test_factory_unknown_estimator(self):
+        # act / assert
+        with self.assertRaises(ValueError):
+            CovarianceEstimatorFactory.get_estimator("not_an_estimator")
+
+    def test_factory_ewma_decay(self):
+        # act
+        result = CovarianceEstimatorFactory.get_estimator(CovarianceEstimator.EWMA, 0.97)
+
+        # assert
+        self.assertIsInstance(result, EWMAEstimator)
+
+    def test_sample_pairwise_complete_matches_pandas(self):
+        # arrange
+        returns = self._get_returns()
+        returns[:10, 0] = np.nan
+        returns[20:, 1] = np.nan
+        returns[5:25, 2] = np.nan
+
+        # act
+        result = SampleCovarianceEstimator().estimate(returns)
+
+        # assert
+        np.testing.assert_allclose(pd.DataFrame(returns).cov().values, result)
+
+    def test_nearest_psd_matrix(self):
+        # arrange
+        covariance = np.array([[1., 0.9, -0.9], [0.9, 1., 0.9], [-0.9, 0.9, 1.]])
+
+        # act
+        result = get_nearest_psd_matrix(covariance)
+
+        # assert
+        self.assertGreaterEqual(np.linalg.eigvalsh(result)[0], -1e-12)
+        np.testing.assert_allclose(result, result.T)
+
+    def test_nearest_psd_matrix_leaves_psd_matrix(self):
+        # arrange
+        covariance = np.array([[1., 0.5, np.nan], [0.5, 1., np.nan], [np.nan, np.nan, np.nan]])
+
+        # act
+        result = get_nearest_psd_matrix(covariance)
+
+        # assert
+        self.assertIs(covariance, result)
@@ -0,0 +1,474 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from unittest import mock
+from black_litterman.constants import Configuration, MarketData
+from black_litterman.market_data.data_readers import DataReaderFactory, LocalDataReader, MmapDataReader, \
+    SqlDataReader, ReutersDataReader
+
+
+class TestLocalDataReader(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._path = os.path.join(self._directory, "market_data.xlsx")
+        with open(self._path, "wb") as workbook:
+            workbook.write(b"workbook contents")
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    @staticmethod
+    def _get_workbook_data():
+        dates = pd.to_datetime(["2020-03-02", "2020-03-03", "2020-03-04", "2020-03-05", "2020-03-06"])
+        price_data = pd.DataFrame({"asset_1": [100., 101, 102, 100, 98], "asset_2": [95., 94, 97, 93, 95]},
+                                  index=dates)
+        market_cap_data = price_data * 1000
+        return {MarketData.PRICE_DATA: price_data, MarketData.MARKET_CAP_DATA: market_cap_data}
+
+    def test_second_read_uses_cache(self):
+        # arrange
+        reader = LocalDataReader(self._path)
+
+        with mock.patch.object(pd, "read_excel", return_value=self._get_workbook_data()) as mock_read_excel:
+            # act
+            first_result = reader._read_raw_data("2020-03-03", "2020-03-05")
+            second_result = LocalDataReader(self._path)._read_raw_data("2020-03-03", "2020-03-05")
+
+        # assert
+        self.assertEqual(1, mock_read_excel.call_count)
+        for data_type in MarketData.get_data_types():
+            self.assertEqual(3, len(second_result[data_type]))
+            pd.testing.assert_frame_equal(first_result[data_type], second_result[data_type])
+
+    def test_changed_workbook_invalidates_cache(self):
+        # arrange
+        reader = LocalDataReader(self._path)
+        with mock.patch.object(pd, "read_excel", return_value=self._get_workbook_data()):
+            reader._read_raw_data("2020-03-02", "2020-03-06")
+
+        with open(self._path, "wb") as workbook:
+            workbook.write(b"new workbook contents")
+
+        with mock.patch.object(pd, "read_excel", return_value=self._get_workbook_data()) as mock_read_excel:
+            # act
+            reader._read_raw_data("2020-03-02", "2020-03-06")
+
+        # assert
+        self.assertEqual(1, mock_read_excel.call_count)
+
+    def test_touched_workbook_with_same_contents_uses_cache(self):
+        # arrange
+        reader = LocalDataReader(self._path)
+        with mock.patch.object(pd, "read_excel", return_value=self._get_workbook_data()):
+            reader._read_raw_data("2020-03-02", "2020-03-06")
+
+        file_stats = os.stat(self._path)
+        os.utime(self._path, ns=(file_stats.st_atime_ns, file_stats.st_mtime_ns + 10 ** 9))
+
+        with mock.patch.object(pd, "read_excel", return_value=self._get_workbook_data()) as mock_read_excel:
+            # act
+            reader._read_raw_data("2020-03-02", "2020-03-06")
+
+        # assert
+        self.assertEqual(0, mock_read_excel.call_count)
+
+    def test_non_numeric_cell_is_reported_by_sheet_and_column(self):
+        # arrange
+        workbook_data = self._get_workbook_data()
+        workbook_data[MarketData.PRICE_DATA]["asset_2"] = workbook_data[MarketData.PRICE_DATA]["asset_2"].astype(object)
+        workbook_data[MarketData.PRICE_DATA].iloc[2, 1] = "n/a"
+        reader = LocalDataReader(self._path, use_cache=False, dtype="float32")
+
+        with mock.patch.object(pd, "read_excel", return_value=workbook_data):
+            # act / assert
+            with self.assertRaisesRegex(ValueError, f"{MarketData.PRICE_DATA}: asset_2"):
+                reader.get_market_data_engine("2020-03-02", "2020-03-06")
+
+    def _write_workbook(self):
+        workbook_data = self._get_workbook_data()
+        workbook_data[MarketData.PRICE_DATA]["asset_3"] = [20., 21, 22, 23, 24]
+        workbook_data[MarketData.MARKET_CAP_DATA]["asset_3"] = [200., 210, 220, 230, 240]
+        with pd.ExcelWriter(self._path) as writer:
+            for data_type, data in workbook_data.items():
+                data.to_excel(writer, sheet_name=data_type)
+
+        return workbook_data
+
+    def test_pushdown_reads_window_and_assets(self):
+        # arrange
+        try:
+            workbook_data = self._write_workbook()
+        except ImportError:
+            self.skipTest("no Excel writer available")
+        reader = LocalDataReader(self._path, use_cache=False, asset_universe=["asset_3", "asset_1"], pushdown=True)
+
+        # act
+        result = reader._read_raw_data("2020-03-03", "2020-03-05")
+
+        # assert
+        for data_type, data in workbook_data.items():
+            expected_result = data.loc["2020-03-03":"2020-03-05", ["asset_3", "asset_1"]]
+            pd.testing.assert_frame_equal(expected_result, result[data_type], check_names=False, check_dtype=False)
+
+    def test_pushdown_does_not_parse_whole_workbook(self):
+        # arrange
+        try:
+            self._write_workbook()
+        except ImportError:
+            self.skipTest("no Excel writer available")
+        reader = LocalDataReader(self._path, use_cache=False, asset_universe=["asset_1"], pushdown=True)
+
+        with mock.patch.object(pd, "read_excel") as mock_read_excel:
+            # act
+            result = reader._read_raw_data("2020-03-02", "2020-03-03")
+
+        # assert
+        self.assertEqual(0, mock_read_excel.call_count)
+        self.assertEqual([100., 101.], result[MarketData.PRICE_DATA]["asset_1"].tolist())
+
+    def test_pushdown_cache_only_serves_covered_windows(self):
+        # arrange
+        try:
+            self._write_workbook()
+        except ImportError:
+            self.skipTest("no Excel writer available")
+        reader = LocalDataReader(self._path, asset_universe=["asset_1"], pushdown=True)
+        reader._read_raw_data("2020-03-03", "2020-03-05")
+
+        with mock.patch.object(reader, "_read_workbook_window",
+                               wraps=reader._read_workbook_window) as mock_read_window:
+            # act
+            covered_result = reader._read_raw_data("2020-03-04", "2020-03-05")
+            covered_calls = mock_read_window.call_count
+            uncovered_result = reader._read_raw_data("2020-03-02", "2020-03-05")
+
+        # assert
+        self.assertEqual(0, covered_calls)
+        self.assertEqual(1, mock_read_window.call_count)
+        self.assertEqual(2, len(covered_result[MarketData.PRICE_DATA]))
+        self.assertEqual(4, len(uncovered_result[MarketData.PRICE_DATA]))
+
+
+class TestMmapDataReader(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        dates = pd.to_datetime(["2020-03-02", "2020-03-03", "2020-03-04", "2020-03-05", "2020-03-06"])
+        self._price_data = pd.DataFrame({"asset_1": [100., 101, 102, 100, 98], "asset_2": [95., 94, 97, 93, 95],
+                                         "asset_3": [20., 20.5, 20.5, 20.5, 19.5]}, index=dates)
+        self._market_cap_data = self._price_data * [1000, 500, 200]
+        MmapDataReader.write_store(self._directory, self._price_data, self._market_cap_data)
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def _get_engine_and_store(self, reader):
+        stores = []
+        open_memmap = np.memmap
+
+        def _open_and_record(*args, **kwargs):
+            stores.append(open_memmap(*args, **kwargs))
+            return stores[-1]
+
+        with mock.patch.object(np, "memmap", side_effect=_open_and_record):
+            engine = reader.get_market_data_engine("2020-03-02", "2020-03-06")
+
+        market_cap_file = os.path.join(self._directory, MarketData.MARKET_CAP_DATA + MmapDataReader.DATA_FILE_SUFFIX)
+        market_cap_store = [store for store in stores if store.filename == os.path.abspath(market_cap_file)][-1]
+        return engine, market_cap_store
+
+    def test_read_raw_data(self):
+        # arrange
+        reader = MmapDataReader(self._directory)
+
+        # act
+        result = reader._read_raw_data("2020-03-03", "2020-03-05")
+
+        # assert
+        pd.testing.assert_frame_equal(self._price_data.loc["2020-03-03":"2020-03-05"],
+                                      result[MarketData.PRICE_DATA])
+        pd.testing.assert_frame_equal(self._market_cap_data.loc["2020-03-03":"2020-03-05"],
+                                      result[MarketData.MARKET_CAP_DATA])
+
+    def test_market_data_engine_is_zero_copy(self):
+        # arrange
+        reader = MmapDataReader(self._directory)
+
+        # act
+        result, market_cap_store = self._get_engine_and_store(reader)
+
+        # assert
+        self.assertTrue(np.shares_memory(market_cap_store, result._market_cap_data.values))
+        pd.testing.assert_series_equal(pd.Series([102000, 48500, 4100], index=["asset_1", "asset_2", "asset_3"],
+                                                 dtype=float) / 154600,
+                                       result.get_market_weights("2020-03-04"), check_names=False)
+
+    def test_refresh_market_data_engine(self):
+        # arrange
+        reader = MmapDataReader(self._directory)
+        engine = reader.get_market_data_engine("2020-03-02", "2020-03-04")
+
+        # act
+        reader.refresh_market_data_engine(engine, "2020-03-06")
+
+        # assert
+        expected_result = reader.get_market_data_engine("2020-03-02", "2020-03-06")
+        self.assertEqual(pd.Timestamp("2020-03-06"), engine.get_last_date())
+        pd.testing.assert_frame_equal(expected_result.get_annualised_cov_matrix("2020-03-02", "2020-03-06"),
+                                      engine.get_annualised_cov_matrix("2020-03-02", "2020-03-06"))
+
+    def test_read_asset_subset(self):
+        # arrange
+        reader = MmapDataReader(self._directory, ["asset_3", "asset_1"])
+
+        # act
+        result = reader._read_raw_data("2020-03-02", "2020-03-06")
+
+        # assert
+        pd.testing.assert_frame_equal(self._price_data[["asset_1", "asset_3"]], result[MarketData.PRICE_DATA])
+
+    def test_factory_reader_is_zero_copy(self):
+        for asset_universe in [["asset_3", "asset_1", "asset_2"], ["asset_3", "asset_1"], ["asset_2"]]:
+            # arrange
+            config = {Configuration.MARKET_DATA: {
+                Configuration.MARKET_DATA_SOURCE: DataReaderFactory.SOURCE_MMAP,
+                Configuration.MARKET_DATA_FILE_PATH: self._directory,
+                Configuration.ASSET_UNIVERSE: {asset: [asset, 1] for asset in asset_universe}}}
+            reader = DataReaderFactory.get_data_reader(config)
+
+            # act
+            result, market_cap_store = self._get_engine_and_store(reader)
+
+            # assert
+            self.assertTrue(np.shares_memory(market_cap_store, result._market_cap_data.values))
+            self.assertEqual(sorted(asset_universe), list(result._market_cap_data.columns))
+
+
+class TestSqlDataReader(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._path = os.path.join(self._directory, "market_data.db")
+        prices = MarketData.PRICE_DATA
+        rows = [("2020-03-02", "asset_1", prices, 100.), ("2020-03-02", "asset_2", prices, 95.),
+                ("2020-03-03", "asset_1", prices, 101.), ("2020-03-03", "asset_2", prices, 94.),
+                ("2020-03-04", "asset_1", prices, 102.), ("2020-03-04", "asset_3", prices, 20.),
+                ("2020-03-05", "asset_1", prices, 100.), ("2020-03-05", "asset_2", prices, 93.),
+                ("2020-03-03", "asset_1", MarketData.MARKET_CAP_DATA, 1010.),
+                ("2020-03-03", "asset_2", MarketData.MARKET_CAP_DATA, 470.),
+                ("2020-03-04", "asset_1", MarketData.MARKET_CAP_DATA, 1020.),
+                ("2020-03-03", "asset_1", "other_data", 1.)]
+        with sqlite3.connect(self._path) as connection:
+            connection.execute("CREATE TABLE market_data (date TEXT, ticker TEXT, data_type TEXT, value REAL)")
+            connection.executemany("INSERT INTO market_data VALUES (?, ?, ?, ?)", rows)
+
+        self._connection_factory = mock.MagicMock(side_effect=lambda: sqlite3.connect(self._path))
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def test_read_raw_data(self):
+        # arrange
+        reader = SqlDataReader(self._connection_factory, ["asset_2", "asset_1"], chunk_size=3)
+
+        # act
+        result = reader._read_raw_data("2020-03-03", "2020-03-04")
+        reader.close()
+
+        # assert
+        dates = pd.to_datetime(["2020-03-03", "2020-03-04"])
+        expected_prices = pd.DataFrame({"asset_2": [94., np.nan], "asset_1": [101., 102.]}, index=dates)
+        expected_market_caps = pd.DataFrame({"asset_2": [470., np.nan], "asset_1": [1010., 1020.]}, index=dates)
+        pd.testing.assert_frame_equal(expected_prices, result[MarketData.PRICE_DATA])
+        pd.testing.assert_frame_equal(expected_market_caps, result[MarketData.MARKET_CAP_DATA])
+
+    def test_read_raw_data_float32(self):
+        # arrange
+        reader = SqlDataReader(self._connection_factory, ["asset_2", "asset_1"], dtype="float32")
+
+        # act
+        result = reader._read_raw_data("2020-03-03", "2020-03-04")
+        reader.close()
+
+        # assert
+        self.assertEqual([np.float32, np.float32], list(result[MarketData.PRICE_DATA].dtypes))
+        np.testing.assert_array_equal([[94., 101.], [np.nan, 102.]], result[MarketData.PRICE_DATA].values)
+
+    def test_connections_are_reused(self):
+        # arrange
+        reader = SqlDataReader(self._connection_factory, ["asset_1", "asset_2"])
+
+        # act
+        reader._read_raw_data("2020-03-02", "2020-03-05")
+        reader._read_raw_data("2020-03-03", "2020-03-04")
+        reader.close()
+
+        # assert
+        self.assertEqual(1, self._connection_factory.call_count)
+
+    def test_read_raw_data_paramstyles(self):
+        # arrange
+        reader = SqlDataReader(self._connection_factory, ["asset_2", "asset_1"])
+        expected_result = reader._read_raw_data("2020-03-03", "2020-03-04")
+        reader.close()
+
+        for paramstyle in ["numeric", "named"]:
+            reader = SqlDataReader(self._connection_factory, ["asset_2", "asset_1"], paramstyle=paramstyle)
+
+            # act
+            result = reader._read_raw_data("2020-03-03", "2020-03-04")
+            reader.close()
+
+            # assert
+            for data_type in MarketData.get_data_types():
+                pd.testing.assert_frame_equal(expected_result[data_type], result[data_type])
+
+    def test_bind_parameters_format_paramstyles(self):
+        # arrange
+        query = "SELECT value FROM market_data WHERE date >= ? AND ticker IN (?, ?)"
+        parameters = ["2020-03-03", "asset_1", "asset_2"]
+
+        # act
+        format_result = SqlDataReader(self._connection_factory, [], paramstyle="format")._bind_parameters(
+            query, parameters)
+        pyformat_result = SqlDataReader(self._connection_factory, [], paramstyle="pyformat")._bind_parameters(
+            query, parameters)
+
+        # assert
+        self.assertEqual(("SELECT value FROM market_data WHERE date >= %s AND ticker IN (%s, %s)", parameters),
+                         format_result)
+        self.assertEqual(("SELECT value FROM market_data WHERE date >= %(p1)s AND ticker IN (%(p2)s, %(p3)s)",
+                          {"p1": "2020-03-03", "p2": "asset_1", "p3": "asset_2"}), pyformat_result)
+
+    def test_invalid_table_name(self):
+        # act / assert
+        for table in ["market_data; DROP TABLE market_data", "market data", "1_market_data"]:
+            with self.assertRaises(ValueError):
+                SqlDataReader(self._connection_factory, ["asset_1"], table)
+
+        with self.assertRaises(ValueError):
+            SqlDataReader(self._connection_factory, ["asset_1"], paramstyle="dollar")
+
+
+class StubMarketDataClient:
+    """
+    stands in for the Reuters MarketDataClient, serving a
+    deterministic value for each ticker, field and business day
+    up to the last published date
+    """
+
+    def __init__(self, request_log, last_published=None):
+        self._request_log = request_log
+        self._last_published = last_published
+        self._requests = []
+
+    @staticmethod
+    def get_reuters_input_headers():
+        return ["ticker", "field", "start", "end"]
+
+    def add_reuters_data(self, requests):
+        self._requests.append(requests)
+        self._request_log.append(requests)
+
+    def get_data_as_dataframe(self):
+        rows = []
+        for requests in self._requests:
+            for _, request in requests.iterrows():
+                end_date = min(filter(None, [request["end"], self._last_published]))
+                for date in pd.bdate_range(request["start"], end_date):
+                    value = 100 + date.day if request["field"] == "PI" else 1000 + date.day
+                    rows.append((request["ticker"], request["field"], date.strftime("%Y-%m-%d"), float(value)))
+        return pd.DataFrame(rows, columns=["ticker", "field", "date", "value"])
+
+
+class TestReutersDataReader(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._store_path = os.path.join(self._directory, "reuters_store.pkl")
+        self._request_log = []
+        self._tickers = {"UK equities": ["FTSE100", 1000], "US equities": ["S&PCOMP", 1000],
+                         "UK gov bonds": ["AUKGVAL", 1]}
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def _get_reader(self, last_published=None, **kwargs) -> ReutersDataReader:
+        return ReutersDataReader({}, self._tickers, self._store_path,
+                                 client_factory=lambda: StubMarketDataClient(self._request_log, last_published),
+                                 **kwargs)
+
+    def _get_requested_ranges(self):
+        requests = pd.concat(self._request_log)
+        return set(zip(requests["start"], requests["end"]))
+
+    def test_requests_are_split_into_blocks(self):
+        # arrange
+        reader = self._get_reader(tickers_per_request=2, days_per_request=7)
+
+        # act
+        result = reader.get_market_data_engine("2020-03-02", "2020-03-13")
+
+        # assert
+        self.assertEqual(8, len(self._request_log))
+        self.assertEqual({("2020-03-02", "2020-03-08"), ("2020-03-09", "2020-03-13")}, self._get_requested_ranges())
+        expected_weights = pd.Series([1013000., 1013000., 1013.], index=list(self._tickers)) / 2027013
+        pd.testing.assert_series_equal(expected_weights.sort_index(),
+                                       result.get_market_weights("2020-03-13").sort_index(), check_names=False)
+
+    def test_only_missing_dates_are_requested(self):
+        # arrange
+        self._get_reader()._read_raw_data("2020-03-02", "2020-03-06")
+        self._request_log.clear()
+
+        # act
+        result = self._get_reader()._read_raw_data("2020-03-04", "2020-03-11")
+
+        # assert
+        self.assertEqual({("2020-03-07", "2020-03-11")}, self._get_requested_ranges())
+        price_data = result[MarketData.PRICE_DATA]
+        self.assertEqual(list(pd.bdate_range("2020-03-04", "2020-03-11")),
+                         sorted(pd.to_datetime(price_data["date"].unique())))
+        self.assertEqual(18, len(price_data))
+
+    def test_covered_dates_make_no_requests(self):
+        # arrange
+        self._get_reader()._read_raw_data("2020-03-02", "2020-03-13")
+        self._request_log.clear()
+
+        # act
+        self._get_reader()._read_raw_data("2020-03-03", "2020-03-10")
+
+        # assert
+        self.assertEqual([], self._request_log)
+
+    def test_gap_between_disjoint_reads_is_requested(self):
+        # arrange
+        reader = self._get_reader()
+        reader._read_raw_data("2020-01-01", "2020-03-31")
+        reader._read_raw_data("2020-06-01", "2020-07-31")
+        self._request_log.clear()
+
+        # act
+        result = reader._read_raw_data("2020-04-01", "2020-05-29")
+
+        # assert
+        self.assertEqual({("2020-04-01", "2020-05-29")}, self._get_requested_ranges())
+        self.assertEqual(3 * len(pd.bdate_range("2020-04-01", "2020-05-29")), len(result[MarketData.PRICE_DATA]))
+
+    def test_unpublished_dates_are_requested_again(self):
+        # arrange
+        self._get_reader(last_published="2020-03-05")._read_raw_data("2020-03-02", "2020-03-06")
+        self._request_log.clear()
+
+        # act
+        result = self._get_reader()._read_raw_data("2020-03-02", "2020-03-09")
+
+        # assert
+        self.assertEqual({("2020-03-06", "2020-03-09")}, self._get_requested_ranges())
+        self.assertEqual(3 * len(pd.bdate_range("2020-03-02", "2020-03-09")), len(result[MarketData.PRICE_DATA]))
@@ -1,6 +1,8 @@
 import unittest
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from unittest import mock
 from black_litterman.market_data.engine import MarketDataEngine
 
 
@@ -82,3 +84,324 @@ class TestMarketDataEngine(unittest.TestCase):
         # assert
         expected_result = pd.Series([0.625, 0.25, 0.125], index=["asset_1", "asset_2", "asset_3"])
         pd.testing.assert_series_equal(expected_result, result, check_names=False)
+
+    def test_get_covariance_is_cached(self):
+        # arrange
+        engine = self._get_market_data_engine()
+
+        # act
+        first_result = engine.get_annualised_cov_matrix("2020-03-01", "2020-03-10")
+        second_result = engine.get_annualised_cov_matrix("2020-03-01", "2020-03-10")
+        engine.get_annualised_cov_matrix("2020-03-01", "2020-03-05")
+
+        # assert
+        self.assertIs(first_result, second_result)
+        cache_info = engine.get_cov_cache_info()
+        self.assertEqual((1, 2, 2), (cache_info.hits, cache_info.misses, cache_info.currsize))
+
+    def test_invalidate_cache(self):
+        # arrange
+        engine = self._get_market_data_engine()
+        first_result = engine.get_annualised_cov_matrix("2020-03-01", "2020-03-10")
+
+        # act
+        engine.invalidate_cache()
+        second_result = engine.get_annualised_cov_matrix("2020-03-01", "2020-03-10")
+
+        # assert
+        self.assertIsNot(first_result, second_result)
+        self.assertEqual(2, engine.get_cov_cache_info().misses)
+
+    def test_get_covariance_unknown_estimator(self):
+        # arrange
+        engine = self._get_market_data_engine()
+
+        # act / assert
+        with self.assertRaises(ValueError):
+            engine.get_annualised_cov_matrix("2020-03-01", "2020-03-10", "not_an_estimator")
+
+    def test_get_covariance_prefix_sums_match_sample(self):
+        # arrange
+        dates = pd.date_range(start=datetime(2019, 1, 1), periods=60, freq="B")
+        price_data = pd.DataFrame(np.exp(np.random.RandomState(7).normal(0, 0.01, (60, 4)).cumsum(axis=0)),
+                                  index=dates, columns=["asset_1", "asset_2", "asset_3", "asset_4"])
+        price_data.iloc[:10, 3] = np.nan
+        market_cap_data = price_data.fillna(1)
+        sample_engine = MarketDataEngine(price_data, market_cap_data)
+        prefix_engines = [MarketDataEngine(price_data, market_cap_data, prefix_sum_stride=stride)
+                          for stride in [1, 7]]
+
+        for start_date, end_date in [("2019-01-01", "2019-03-25"), ("2019-01-09", "2019-01-17"),
+                                     ("2019-02-04", "2019-03-01")]:
+            # act
+            expected_result = sample_engine.get_annualised_cov_matrix(start_date, end_date)
+            results = [engine.get_annualised_cov_matrix(start_date, end_date) for engine in prefix_engines]
+
+            # assert
+            for result in results:
+                pd.testing.assert_frame_equal(expected_result, result)
+
+    def test_append_matches_full_build(self):
+        # arrange
+        dates = pd.date_range(start=datetime(2019, 1, 1), periods=60, freq="B")
+        price_data = pd.DataFrame(np.exp(np.random.RandomState(3).normal(0, 0.01, (60, 3)).cumsum(axis=0)),
+                                  index=dates, columns=["asset_1", "asset_2", "asset_3"])
+        price_data.iloc[38:43, 2] = np.nan
+        market_cap_data = price_data.fillna(1) * 1000
+        full_engines = [MarketDataEngine(price_data, market_cap_data, prefix_sum_stride=stride)
+                        for stride in [None, 1, 7]]
+        engines = [MarketDataEngine(price_data.iloc[:40], market_cap_data.iloc[:40], prefix_sum_stride=stride)
+                   for stride in [None, 1, 7]]
+
+        # act
+        for engine in engines:
+            engine.append(price_data.iloc[35:50], market_cap_data.iloc[35:50])
+            engine.append(price_data.iloc[50:], market_cap_data.iloc[50:])
+
+        # assert
+        for engine, full_engine in zip(engines, full_engines):
+            for start_date, end_date in [("2019-01-01", "2019-03-25"), ("2019-02-20", "2019-03-05")]:
+                np.testing.assert_allclose(full_engine.get_annualised_cov_matrix(start_date, end_date).values,
+                                           engine.get_annualised_cov_matrix(start_date, end_date).values)
+            pd.testing.assert_series_equal(full_engine.get_market_weights("2019-03-25"),
+                                           engine.get_market_weights("2019-03-25"))
+            self.assertEqual(dates[-1], engine.get_last_date())
+
+    def test_append_invalidates_only_affected_windows(self):
+        # arrange
+        engine = self._get_market_data_engine()
+        earlier_window = engine.get_annualised_cov_matrix("2020-03-01", "2020-03-05")
+        latest_window = engine.get_annualised_cov_matrix("2020-03-01", "2020-03-12")
+        dates = pd.to_datetime(["2020-03-11", "2020-03-12"])
+        price_data = pd.DataFrame({"asset_1": [101, 103], "asset_2": [98, 97], "asset_3": [18.5, 18]}, index=dates)
+
+        # act
+        engine.append(price_data, price_data * 1000)
+
+        # assert
+        self.assertIs(earlier_window, engine.get_annualised_cov_matrix("2020-03-01", "2020-03-05"))
+        self.assertIsNot(latest_window, engine.get_annualised_cov_matrix("2020-03-01", "2020-03-12"))
+
+    def test_append_different_assets(self):
+        # arrange
+        engine = self._get_market_data_engine()
+        price_data = pd.DataFrame({"asset_1": [101]}, index=pd.to_datetime(["2020-03-11"]))
+
+        # act / assert
+        with self.assertRaises(ValueError):
+            engine.append(price_data, price_data)
+
+    def test_float32_storage_matches_float64(self):
+        # arrange
+        dates = pd.date_range(start=datetime(2019, 1, 1), periods=500, freq="B")
+        returns = np.random.RandomState(11).normal(0.0003, 0.01, (500, 5))
+        price_data = pd.DataFrame(100 * np.exp(returns.cumsum(axis=0)), index=dates,
+                                  columns=[f"asset_{i}" for i in range(5)])
+        price_data.iloc[:30, 4] = np.nan
+        market_cap_data = price_data.fillna(1) * 1e9
+
+        for stride in [None, 1, 16]:
+            expected_engine = MarketDataEngine(price_data, market_cap_data, prefix_sum_stride=stride)
+            engine = MarketDataEngine(price_data, market_cap_data, prefix_sum_stride=stride, dtype="float32")
+
+            # act
+            expected_cov = expected_engine.get_annualised_cov_matrix("2019-01-01", "2020-11-30")
+            result_cov = engine.get_annualised_cov_matrix("2019-01-01", "2020-11-30")
+            expected_weights = expected_engine.get_market_weights("2020-11-30")
+            result_weights = engine.get_market_weights("2020-11-30")
+
+            # assert
+            self.assertEqual(np.float32, engine._returns_data.values.dtype)
+            self.assertEqual(np.float32, engine._market_cap_data.values.dtype)
+            self.assertEqual(np.float64, result_cov.values.dtype)
+            np.testing.assert_allclose(expected_cov.values, result_cov.values, rtol=1e-5)
+            np.testing.assert_allclose(expected_weights.values, result_weights.values, rtol=1e-6)
+
+    def test_unsupported_storage_dtype(self):
+        # arrange
+        dates = pd.date_range(start=datetime(2020, 3, 2), periods=3, freq="B")
+        price_data = pd.DataFrame({"asset_1": [100, 101, 102]}, index=dates)
+
+        # act / assert
+        with self.assertRaises(ValueError):
+            MarketDataEngine(price_data, price_data, dtype="int32")
+
+    @staticmethod
+    def _get_long_price_data() -> pd.DataFrame:
+
+        dates = pd.date_range(start=datetime(2019, 1, 1), periods=120, freq="B")
+        returns = np.random.RandomState(5).normal(0.0003, 0.01, (120, 4))
+        price_data = pd.DataFrame(100 * np.exp(returns.cumsum(axis=0)), index=dates,
+                                  columns=["asset_1", "asset_2", "asset_3", "asset_4"])
+        price_data.iloc[:25, 3] = np.nan
+        price_data.iloc[50:60, 2] = np.nan
+        return price_data
+
+    def test_lazy_returns_match_eager(self):
+        # arrange
+        price_data = self._get_long_price_data()
+        eager_engine = MarketDataEngine(price_data, price_data.fillna(1))
+        lazy_engine = MarketDataEngine(price_data, price_data.fillna(1), lazy_returns=True)
+        windows = [("2019-01-01", "2019-06-17"), ("2019-03-20", "2019-05-01"), ("2019-02-01", "2019-02-28")]
+
+        for start_date, end_date in windows:
+            # act
+            expected_result = eager_engine.get_annualised_cov_matrix(start_date, end_date)
+            result = lazy_engine.get_annualised_cov_matrix(start_date, end_date)
+
+            # assert
+            np.testing.assert_allclose(expected_result.values, result.values)
+
+        self.assertIsNone(lazy_engine._returns_data)
+
+    def test_lazy_returns_rolling_and_append(self):
+        # arrange
+        price_data = self._get_long_price_data()
+        eager_engine = MarketDataEngine(price_data, price_data.fillna(1))
+        lazy_engine = MarketDataEngine(price_data.iloc[:80], price_data.iloc[:80].fillna(1), lazy_returns=True)
+        end_dates = ["2019-04-30", "2019-05-31", "2019-06-17"]
+
+        # act
+        lazy_engine.append(price_data.iloc[80:], price_data.iloc[80:].fillna(1))
+        expected_result = list(eager_engine.get_rolling_cov_matrices(end_dates, window_length=40))
+        result = list(lazy_engine.get_rolling_cov_matrices(end_dates, window_length=40))
+
+        # assert
+        for (expected_date, expected_cov), (result_date, result_cov) in zip(expected_result, result):
+            self.assertEqual(expected_date, result_date)
+            np.testing.assert_allclose(expected_cov.values, result_cov.values)
+
+    def test_log_returns_and_annualisation_factor(self):
+        # arrange
+        price_data = self._get_long_price_data()
+        engine = MarketDataEngine(price_data, price_data.fillna(1), return_type="log", annualisation_factor=252)
+
+        # act
+        result = engine.get_annualised_cov_matrix("2019-01-01", "2019-06-17")
+
+        # assert
+        expected_result = np.log(price_data.ffill()).diff().cov() * 252
+        np.testing.assert_allclose(expected_result.values, result.values)
+
+    def test_lazy_returns_with_prefix_sums(self):
+        # arrange
+        price_data = self._get_long_price_data()
+
+        # act / assert
+        with self.assertRaises(ValueError):
+            MarketDataEngine(price_data, price_data, prefix_sum_stride=4, lazy_returns=True)
+
+    def test_default_cov_estimator(self):
+        # arrange
+        price_data = self._get_long_price_data()
+        sample_engine = MarketDataEngine(price_data, price_data.fillna(1))
+        shrinkage_engine = MarketDataEngine(price_data, price_data.fillna(1), cov_estimator="ledoit_wolf")
+
+        # act
+        result = shrinkage_engine.get_annualised_cov_matrix("2019-01-01", "2019-06-17")
+        sample_result = shrinkage_engine.get_annualised_cov_matrix("2019-01-01", "2019-06-17", "sample")
+
+        # assert
+        expected_sample_result = sample_engine.get_annualised_cov_matrix("2019-01-01", "2019-06-17")
+        pd.testing.assert_frame_equal(expected_sample_result, sample_result)
+        self.assertLess(np.linalg.cond(result.values), np.linalg.cond(sample_result.values))
+
+    def test_rolling_ewma_expanding_matches_direct(self):
+        # arrange
+        price_data = self._get_long_price_data()
+        engine = MarketDataEngine(price_data, price_data.fillna(1), cov_estimator="ewma", ewma_decay=0.97)
+        end_dates = ["2019-03-01", "2019-04-01", "2019-05-01"]
+
+        # act
+        result = list(engine.get_rolling_cov_matrices(end_dates, start_date="2019-01-01"))
+
+        # assert
+        for end_date, result_cov in result:
+            expected_cov = engine.get_annualised_cov_matrix("2019-01-01", end_date)
+            np.testing.assert_allclose(expected_cov.values, result_cov.values)
+
+    def test_bad_ewma_decay(self):
+        # arrange
+        price_data = self._get_long_price_data()
+
+        # act / assert
+        with self.assertRaises(ValueError):
+            MarketDataEngine(price_data, price_data, cov_estimator="ewma", ewma_decay=0)
+
+    def test_psd_projection(self):
+        # arrange - assets 1 and 2 move together early on and apart
+        # later, while asset 3 only has the later history
+        dates = pd.date_range(start=datetime(2019, 1, 1), periods=9, freq="B")
+        returns = np.array([[0.1, 0.1, 0.], [-0.1, -0.1, 0.], [0.1, 0.1, 0.], [-0.1, -0.1, 0.],
+                            [0.01, -0.01, 0.01], [-0.01, 0.01, -0.01], [0.01, -0.01, 0.01], [-0.01, 0.01, -0.01]])
+        prices = 100 * np.cumprod(np.vstack([np.ones(3), 1 + returns]), axis=0)
+        price_data = pd.DataFrame(prices, index=dates, columns=["asset_1", "asset_2", "asset_3"])
+        price_data.iloc[:4, 2] = np.nan
+        sample_engine = MarketDataEngine(price_data, price_data.fillna(1))
+        projected_engine = MarketDataEngine(price_data, price_data.fillna(1), psd_projection=True)
+
+        # act
+        sample_result = sample_engine.get_annualised_cov_matrix("2019-01-01", "2019-01-11")
+        result = projected_engine.get_annualised_cov_matrix("2019-01-01", "2019-01-11")
+
+        # assert
+        self.assertLess(np.linalg.eigvalsh(sample_result.values)[0], 0)
+        self.assertGreaterEqual(np.linalg.eigvalsh(result.values)[0], -1e-12)
+
+    def test_weekly_covariance_from_compounded_returns(self):
+        # arrange
+        price_data = self._get_long_price_data()
+        engine = MarketDataEngine(price_data, price_data.fillna(1))
+
+        # act
+        result = engine.get_annualised_cov_matrix("2019-01-01", "2019-06-17", frequency="weekly")
+
+        # assert
+        weekly_prices = price_data.ffill().resample("W-FRI").last()
+        expected_result = weekly_prices.pct_change().iloc[1:].cov() * 52
+        np.testing.assert_allclose(expected_result.values, result.values)
+
+    def test_monthly_default_frequency_and_rolling(self):
+        # arrange
+        price_data = self._get_long_price_data()
+        engine = MarketDataEngine(price_data, price_data.fillna(1), frequency="monthly")
+        end_dates = ["2019-04-30", "2019-05-31"]
+
+        # act
+        result = list(engine.get_rolling_cov_matrices(end_dates, window_length=3))
+
+        # assert
+        for end_date, result_cov in result:
+            start_date = (pd.Timestamp(end_date) - pd.offsets.MonthBegin(3)).strftime("%Y-%m-%d")
+            expected_cov = engine.get_annualised_cov_matrix(start_date, end_date)
+            np.testing.assert_allclose(expected_cov.values, result_cov.values)
+
+    def test_unknown_frequency(self):
+        # arrange
+        engine = self._get_market_data_engine()
+
+        # act / assert
+        with self.assertRaises(ValueError):
+            engine.get_annualised_cov_matrix("2020-03-01", "2020-03-10", frequency="hourly")
+
+    def test_factor_model_implied_returns_and_rolling(self):
+        # arrange
+        price_data = self._get_long_price_data()
+        engine = MarketDataEngine(price_data, price_data.fillna(1), cov_estimator="factor", n_factors=2)
+        end_dates = ["2019-03-01", "2019-04-01", "2019-05-01"]
+        dense_cov = engine.get_annualised_cov_matrix("2019-01-01", "2019-05-01")
+        expected_returns = dense_cov.dot(engine.get_market_weights("2019-05-01")) * 3
+
+        with mock.patch.object(engine, "get_annualised_cov_matrix") as get_dense_cov:
+            # act
+            result = engine.get_implied_returns("2019-01-01", "2019-05-01", 3)
+            rolling_result = list(engine.get_rolling_factor_covariances(end_dates, start_date="2019-01-01"))
+
+            # assert
+            get_dense_cov.assert_not_called()
+
+        pd.testing.assert_series_equal(expected_returns, result)
+        for end_date, result_cov in rolling_result:
+            expected_cov = engine.get_annualised_factor_covariance("2019-01-01", end_date)
+            np.testing.assert_allclose(expected_cov.to_dense(), result_cov.to_dense())
+            self.assertIs(engine._assets, result_cov.assets)
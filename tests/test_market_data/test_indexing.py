@@ -0,0 +1,61 @@
+import unittest
+import pandas as pd
+from datetime import datetime
+from black_litterman.market_data.indexing import DateIndex
+
+
+class TestDateIndex(unittest.TestCase):
+
+    @staticmethod
+    def _get_date_index() -> DateIndex:
+
+        dates = pd.date_range(start=datetime(2020, 3, 2), end=datetime(2020, 3, 13), freq="B")
+        return DateIndex(dates)
+
+    def test_get_row_slice(self):
+        # arrange
+        date_index = self._get_date_index()
+
+        # act
+        result = date_index.get_row_slice("2020-03-01", "2020-03-04")
+
+        # assert
+        self.assertEqual(slice(0, 3), result)
+
+    def test_get_row_slice_between_dates(self):
+        # arrange
+        date_index = self._get_date_index()
+
+        # act
+        result = date_index.get_row_slice("2020-03-07", "2020-03-08")
+
+        # assert
+        self.assertEqual(slice(5, 5), result)
+
+    def test_get_last_row_on_or_before(self):
+        # arrange
+        date_index = self._get_date_index()
+
+        # act
+        weekend_result = date_index.get_last_row_on_or_before("2020-03-08")
+        last_result = date_index.get_last_row_on_or_before(pd.Timestamp("2021-01-01"))
+
+        # assert
+        self.assertEqual(4, weekend_result)
+        self.assertEqual(9, last_result)
+
+    def test_get_last_row_before_first_date(self):
+        # arrange
+        date_index = self._get_date_index()
+
+        # act / assert
+        with self.assertRaises(ValueError):
+            date_index.get_last_row_on_or_before("2020-02-28")
+
+    def test_unsorted_dates(self):
+        # arrange
+        dates = pd.DatetimeIndex(["2020-03-03", "2020-03-02"])
+
+        # act / assert
+        with self.assertRaises(ValueError):
+            DateIndex(dates)
@@ -0,0 +1,98 @@
+import unittest
+import numpy as np
+import pandas as pd
+from black_litterman.constants import DataFix, MarketData
+from black_litterman.market_data.validation import MarketDataValidator
+
+
+class TestMarketDataValidator(unittest.TestCase):
+
+    @staticmethod
+    def _get_market_data():
+
+        dates = pd.bdate_range(start="2020-03-02", periods=8)
+        price_data = pd.DataFrame({"asset_1": [100., 101, 102, 100, 98, 99, 100, 101],
+                                   "asset_2": [95., 94, 970, 93, 95, 97, 99, 98],
+                                   "asset_3": [20., 20, 20, 20, 20, 19, 18, 18],
+                                   "asset_4": [np.nan, np.nan, 10, 11, -1, 11, 12, 12]},
+                                  index=dates)
+        market_cap_data = price_data.abs().fillna(1) * 1000
+        return {MarketData.PRICE_DATA: price_data, MarketData.MARKET_CAP_DATA: market_cap_data}
+
+    def test_clean_data(self):
+        # arrange
+        market_data = self._get_market_data()
+        price_data = market_data[MarketData.PRICE_DATA][["asset_1"]]
+        market_data = {MarketData.PRICE_DATA: price_data, MarketData.MARKET_CAP_DATA: price_data * 1000}
+        validator = MarketDataValidator()
+
+        # act
+        result_data, report = validator.validate(market_data)
+
+        # assert
+        self.assertTrue(report.is_clean())
+        self.assertIs(price_data, result_data[MarketData.PRICE_DATA])
+
+    def test_report(self):
+        # arrange
+        market_data = self._get_market_data()
+        validator = MarketDataValidator(stale_run_length=5, max_daily_move=0.5)
+
+        # act
+        _, report = validator.validate(market_data)
+
+        # assert
+        self.assertFalse(report.is_clean())
+        self.assertEqual((8, 4), (report.n_dates, report.n_assets))
+        self.assertEqual(2, report.missing_prices)
+        self.assertEqual(1, report.non_positive_prices)
+        self.assertEqual(1, report.stale_prices)
+        self.assertEqual(4, report.price_jumps)
+        self.assertEqual(("asset_2", "asset_3", "asset_4"), report.flagged_assets)
+
+    def test_misaligned_and_duplicate_dates(self):
+        # arrange
+        market_data = self._get_market_data()
+        market_cap_data = market_data[MarketData.MARKET_CAP_DATA]
+        market_data[MarketData.MARKET_CAP_DATA] = pd.concat([market_cap_data.iloc[:-1], market_cap_data.iloc[[-2]]])
+        validator = MarketDataValidator()
+
+        # act
+        _, report = validator.validate(market_data)
+
+        # assert
+        self.assertEqual(1, report.misaligned_dates)
+        self.assertEqual(1, report.duplicate_dates)
+
+    def test_forward_fill_fix(self):
+        # arrange
+        market_data = self._get_market_data()
+        validator = MarketDataValidator(fix=DataFix.FORWARD_FILL)
+
+        # act
+        result_data, report = validator.validate(market_data)
+
+        # assert
+        price_data = result_data[MarketData.PRICE_DATA]
+        self.assertEqual(2, report.fixed_points)
+        self.assertEqual([95., 94, 94, 93], list(price_data["asset_2"].iloc[:4]))
+        np.testing.assert_array_equal([np.nan, np.nan, 10, 11, 11, 11], price_data["asset_4"].iloc[:6].values)
+
+    def test_drop_fix(self):
+        # arrange
+        market_data = self._get_market_data()
+        validator = MarketDataValidator(fix=DataFix.DROP)
+
+        # act
+        result_data, _ = validator.validate(market_data)
+
+        # assert
+        price_data = result_data[MarketData.PRICE_DATA]
+        self.assertTrue(np.isnan(price_data["asset_2"].iloc[2]))
+        self.assertTrue(np.isnan(price_data["asset_4"].iloc[4]))
+        self.assertEqual(2, int(price_data.isna().sum().sum()) - 2)
+
+    def test_unknown_fix(self):
+        # act / assert
+        with self.assertRaises(ValueError):
+            MarketDataValidator(fix="not_a_fix")